@@ -8,4 +8,10 @@ public class GenerateMusicRequest
     public int Bars { get; set; } = 8;
     public string? RecordingId { get; set; }
     public string Engine { get; set; } = "theory_v1";
+    /// <summary>Optional RNG seed; seeded requests are reproducible and served from the result cache.</summary>
+    public int? Seed { get; set; }
+    /// <summary>Also render one WAV per instrument, downloadable as <c>stem_&lt;name&gt;</c>.</summary>
+    public bool Stems { get; set; }
+    /// <summary>"preview" also produces a quick mono draft (file type <c>preview</c>) before the full render; default "full".</summary>
+    public string Quality { get; set; } = "full";
 }
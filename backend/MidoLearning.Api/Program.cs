@@ -53,8 +53,16 @@ builder.Services.AddScoped<RewardCalculator>();
 // Family Scoreboard Services
 builder.Services.AddScoped<IFamilyScoreboardService, FirebaseScoreboardService>();
 
-// Music Producer Services (Method A: Python subprocess in same container)
-builder.Services.AddSingleton<IPythonSidecarClient, PythonProcessRunner>();
+// Music Producer Services (Method A: Python in same container)
+// MusicProducer:Mode = "process" (one python3 per call, default) | "daemon" (long-lived worker_cli.py)
+if (builder.Configuration["MusicProducer:Mode"] == "daemon")
+{
+    builder.Services.AddSingleton<IPythonSidecarClient, PythonWorkerClient>();
+}
+else
+{
+    builder.Services.AddSingleton<IPythonSidecarClient, PythonProcessRunner>();
+}
 builder.Services.AddSingleton<MusicTaskStore>();
 builder.Services.AddScoped<IMusicProducerService, MusicProducerService>();
 
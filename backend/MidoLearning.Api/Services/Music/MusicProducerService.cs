@@ -57,19 +57,33 @@ public class MusicProducerService : IMusicProducerService
             throw new KeyNotFoundException($"Task {taskId} not found");
 
         var stream = await _sidecar.DownloadFileAsync(sidecarTaskId, fileType, ct);
-        var ext = fileType switch
+        // Per-instrument stems (stem_piano, stem_drums, ...) are WAV files
+        var isStem = fileType.StartsWith("stem_", StringComparison.Ordinal);
+        // Path-mode clients stream the artifact file itself, whose extension is
+        // the real format (a preview may be .ogg, or .wav if encoding failed)
+        var ext = stream is FileStream file
+            ? Path.GetExtension(file.Name).TrimStart('.').ToLowerInvariant()
+            : "";
+        if (ext.Length == 0)
         {
-            "mp3" => "mp3",
-            "wav" => "wav",
-            _ => "mid",
-        };
-        var contentType = fileType switch
+            ext = fileType switch
+            {
+                "mp3" or "preview" => "mp3",
+                "wav" => "wav",
+                _ when isStem => "wav",
+                _ => "mid",
+            };
+        }
+        var contentType = ext switch
         {
             "mp3" => "audio/mpeg",
+            "ogg" => "audio/ogg",
             "wav" => "audio/wav",
-            _ => "audio/midi",
+            "mid" or "midi" => "audio/midi",
+            _ => "application/octet-stream",
         };
-        return (stream, contentType, $"{taskId}.{ext}");
+        var fileName = isStem ? $"{taskId}_{fileType}.{ext}" : $"{taskId}.{ext}";
+        return (stream, contentType, fileName);
     }
 
     private async Task PollTaskAsync(string taskId, string sidecarTaskId)
@@ -1,4 +1,5 @@
 using System.Diagnostics;
+using System.Text;
 using System.Text.Json;
 using MidoLearning.Api.Models.Music;
 
@@ -15,7 +16,15 @@ public class PythonProcessRunner : IPythonSidecarClient
         _logger = logger;
     }
 
-    private async Task<string> RunScriptAsync(string scriptName, string? stdinJson, CancellationToken ct)
+    private Task<string> RunScriptAsync(string scriptName, string? stdinJson, CancellationToken ct) =>
+        RunScriptWithInputAsync(scriptName, stdinJson == null ? null : async (stdin, token) =>
+        {
+            var bytes = Encoding.UTF8.GetBytes(stdinJson);
+            await stdin.WriteAsync(bytes, token);
+        }, ct);
+
+    private async Task<string> RunScriptWithInputAsync(
+        string scriptName, Func<Stream, CancellationToken, Task>? writeStdin, CancellationToken ct)
     {
         var scriptPath = Path.Combine(_scriptsDir, scriptName);
         var psi = new ProcessStartInfo("python3", scriptPath)
@@ -30,15 +39,17 @@ public class PythonProcessRunner : IPythonSidecarClient
         using var process = Process.Start(psi)
             ?? throw new InvalidOperationException($"Cannot start Python script: {scriptName}");
 
-        if (stdinJson != null)
-        {
-            await process.StandardInput.WriteAsync(stdinJson);
-            process.StandardInput.Close();
-        }
-
+        // Start reading before writing so a chatty script can't deadlock a large stdin payload
         var stdoutTask = process.StandardOutput.ReadToEndAsync(ct);
         var stderrTask = process.StandardError.ReadToEndAsync(ct);
 
+        if (writeStdin != null)
+        {
+            await writeStdin(process.StandardInput.BaseStream, ct);
+            await process.StandardInput.BaseStream.FlushAsync(ct);
+        }
+        process.StandardInput.Close();
+
         await Task.WhenAll(stdoutTask, stderrTask);
         await process.WaitForExitAsync(ct);
 
@@ -60,13 +71,16 @@ public class PythonProcessRunner : IPythonSidecarClient
 
     public async Task<AnalysisResult> AnalyzeAudioAsync(Stream audioStream, string fileName, CancellationToken ct = default)
     {
-        using var ms = new MemoryStream();
-        await audioStream.CopyToAsync(ms, ct);
-        var base64Audio = Convert.ToBase64String(ms.ToArray());
+        // Framed stdin: one JSON header line, then the raw audio bytes (no base64)
         var suffix = Path.GetExtension(fileName);
+        long? length = audioStream.CanSeek ? audioStream.Length - audioStream.Position : null;
+        var header = JsonSerializer.Serialize(new { suffix, length }) + "\n";
 
-        var input = JsonSerializer.Serialize(new { audio_b64 = base64Audio, suffix });
-        var output = await RunScriptAsync("analyze_cli.py", input, ct);
+        var output = await RunScriptWithInputAsync("analyze_cli.py", async (stdin, token) =>
+        {
+            await stdin.WriteAsync(Encoding.UTF8.GetBytes(header), token);
+            await audioStream.CopyToAsync(stdin, token);
+        }, ct);
         return JsonSerializer.Deserialize<AnalysisResult>(output) ?? new AnalysisResult();
     }
 
@@ -80,6 +94,9 @@ public class PythonProcessRunner : IPythonSidecarClient
             style = request.Style,
             bars = request.Bars,
             recording_id = request.RecordingId,
+            seed = request.Seed,
+            stems = request.Stems,
+            quality = request.Quality,
         });
 
         var output = await RunScriptAsync("generate_cli.py", input, ct);
@@ -97,11 +114,10 @@ public class PythonProcessRunner : IPythonSidecarClient
 
     public async Task<Stream> DownloadFileAsync(string sidecarTaskId, string fileType, CancellationToken ct = default)
     {
-        var input = JsonSerializer.Serialize(new { task_id = sidecarTaskId, type = fileType });
+        // "path" mode: the script validates the artifact, we stream it from disk
+        var input = JsonSerializer.Serialize(new { task_id = sidecarTaskId, type = fileType, mode = "path" });
         var output = await RunScriptAsync("download_cli.py", input, ct);
-        var doc = JsonSerializer.Deserialize<JsonElement>(output);
-        var base64Data = doc.GetProperty("data").GetString() ?? string.Empty;
-        return new MemoryStream(Convert.FromBase64String(base64Data));
+        return SidecarFile.OpenValidated(JsonSerializer.Deserialize<JsonElement>(output));
     }
 
     public async Task<List<EngineInfo>> GetEnginesAsync(CancellationToken ct = default)
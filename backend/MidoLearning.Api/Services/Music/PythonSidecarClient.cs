@@ -39,6 +39,9 @@ public class PythonSidecarClient : IPythonSidecarClient
             style = request.Style,
             bars = request.Bars,
             recording_id = request.RecordingId,
+            seed = request.Seed,
+            stems = request.Stems,
+            quality = request.Quality,
         };
 
         var response = await _http.PostAsJsonAsync("/generate", payload, ct);
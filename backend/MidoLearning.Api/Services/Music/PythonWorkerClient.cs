@@ -0,0 +1,237 @@
+using System.Collections.Concurrent;
+using System.Diagnostics;
+using System.Text.Json;
+using System.Text.Json.Nodes;
+using MidoLearning.Api.Models.Music;
+
+namespace MidoLearning.Api.Services.Music;
+
+/// <summary>
+/// Talks to a long-lived <c>worker_cli.py</c> daemon over newline-delimited JSON
+/// on stdin/stdout, so numpy / librosa / pretty_midi are imported once instead of
+/// on every call. Requests are tagged with ids and may complete out of order.
+/// </summary>
+public class PythonWorkerClient : IPythonSidecarClient, IDisposable
+{
+    private readonly string _scriptsDir;
+    private readonly TimeSpan _requestTimeout;
+    private readonly ILogger<PythonWorkerClient> _logger;
+
+    private readonly ConcurrentDictionary<string, TaskCompletionSource<JsonElement>> _pending = new();
+    private readonly SemaphoreSlim _startLock = new(1, 1);
+    private readonly SemaphoreSlim _writeLock = new(1, 1);
+    private Process? _process;
+    private long _nextId;
+
+    public PythonWorkerClient(IConfiguration config, ILogger<PythonWorkerClient> logger)
+    {
+        _scriptsDir = config["MusicProducer:ScriptsDir"] ?? "/app/music-producer";
+        _requestTimeout = TimeSpan.FromSeconds(config.GetValue("MusicProducer:RequestTimeoutSeconds", 120));
+        _logger = logger;
+    }
+
+    private async Task<Process> EnsureProcessAsync(CancellationToken ct)
+    {
+        if (_process is { HasExited: false })
+            return _process;
+
+        await _startLock.WaitAsync(ct);
+        try
+        {
+            if (_process is { HasExited: false })
+                return _process;
+
+            var psi = new ProcessStartInfo("python3", Path.Combine(_scriptsDir, "worker_cli.py"))
+            {
+                RedirectStandardInput = true,
+                RedirectStandardOutput = true,
+                RedirectStandardError = true,
+                UseShellExecute = false,
+                WorkingDirectory = _scriptsDir,
+            };
+
+            var process = Process.Start(psi)
+                ?? throw new InvalidOperationException("Cannot start worker_cli.py");
+
+            _ = Task.Run(() => ReadResponsesAsync(process), CancellationToken.None);
+            _ = Task.Run(() => DrainStderrAsync(process), CancellationToken.None);
+
+            _logger.LogInformation("Started Python worker daemon (pid {Pid})", process.Id);
+            _process = process;
+            return process;
+        }
+        finally
+        {
+            _startLock.Release();
+        }
+    }
+
+    private async Task ReadResponsesAsync(Process process)
+    {
+        try
+        {
+            string? line;
+            while ((line = await process.StandardOutput.ReadLineAsync()) != null)
+            {
+                if (string.IsNullOrWhiteSpace(line))
+                    continue;
+
+                JsonElement response;
+                try
+                {
+                    response = JsonSerializer.Deserialize<JsonElement>(line);
+                }
+                catch (JsonException ex)
+                {
+                    _logger.LogWarning(ex, "Unparseable worker response: {Line}", line);
+                    continue;
+                }
+
+                var id = response.TryGetProperty("id", out var idProp) ? idProp.GetString() : null;
+                if (id != null && _pending.TryRemove(id, out var tcs))
+                    tcs.TrySetResult(response);
+            }
+        }
+        catch (Exception ex)
+        {
+            _logger.LogWarning(ex, "Python worker stdout reader stopped");
+        }
+
+        // Process exited: fail everything still waiting; the next call restarts it
+        _logger.LogWarning("Python worker daemon exited");
+        foreach (var id in _pending.Keys)
+        {
+            if (_pending.TryRemove(id, out var tcs))
+                tcs.TrySetException(new InvalidOperationException("Python worker exited"));
+        }
+    }
+
+    private async Task DrainStderrAsync(Process process)
+    {
+        string? line;
+        while ((line = await process.StandardError.ReadLineAsync()) != null)
+            _logger.LogDebug("Python worker stderr: {Line}", line);
+    }
+
+    private async Task<JsonElement> SendAsync(string op, JsonObject? payload, CancellationToken ct)
+    {
+        var process = await EnsureProcessAsync(ct);
+
+        var id = Interlocked.Increment(ref _nextId).ToString();
+        var request = payload ?? new JsonObject();
+        request["id"] = id;
+        request["op"] = op;
+
+        var tcs = new TaskCompletionSource<JsonElement>(TaskCreationOptions.RunContinuationsAsynchronously);
+        _pending[id] = tcs;
+
+        try
+        {
+            await _writeLock.WaitAsync(ct);
+            try
+            {
+                await process.StandardInput.WriteLineAsync(request.ToJsonString());
+                await process.StandardInput.FlushAsync();
+            }
+            finally
+            {
+                _writeLock.Release();
+            }
+
+            var response = await tcs.Task.WaitAsync(_requestTimeout, ct);
+            if (!response.GetProperty("ok").GetBoolean())
+            {
+                var error = response.TryGetProperty("error", out var err) ? err.GetString() : "unknown error";
+                throw new InvalidOperationException($"Worker op {op} failed: {error}");
+            }
+            return response.GetProperty("result");
+        }
+        finally
+        {
+            _pending.TryRemove(id, out _);
+        }
+    }
+
+    public async Task<AnalysisResult> AnalyzeAudioAsync(Stream audioStream, string fileName, CancellationToken ct = default)
+    {
+        // Spool the upload once; the daemon hands the path straight to librosa
+        var tempPath = Path.Combine(Path.GetTempPath(), $"{Guid.NewGuid()}{Path.GetExtension(fileName)}");
+        try
+        {
+            await using (var file = new FileStream(tempPath, FileMode.CreateNew, FileAccess.Write,
+                             FileShare.None, bufferSize: 81920, FileOptions.Asynchronous))
+            {
+                await audioStream.CopyToAsync(file, ct);
+            }
+
+            var result = await SendAsync("analyze", new JsonObject { ["path"] = tempPath }, ct);
+            return result.Deserialize<AnalysisResult>() ?? new AnalysisResult();
+        }
+        finally
+        {
+            File.Delete(tempPath);
+        }
+    }
+
+    public async Task<string> StartGenerationAsync(GenerateMusicRequest request, CancellationToken ct = default)
+    {
+        var result = await SendAsync("generate", new JsonObject
+        {
+            ["engine"] = request.Engine,
+            ["key"] = request.Key,
+            ["bpm"] = request.Bpm,
+            ["style"] = request.Style,
+            ["bars"] = request.Bars,
+            ["recording_id"] = request.RecordingId,
+            ["seed"] = request.Seed,
+            ["stems"] = request.Stems,
+            ["quality"] = request.Quality,
+        }, ct);
+        return result.GetProperty("task_id").GetString()
+            ?? throw new InvalidOperationException("No task_id returned from worker");
+    }
+
+    public async Task<MusicTaskStatus> GetStatusAsync(string sidecarTaskId, CancellationToken ct = default)
+    {
+        var result = await SendAsync("status", new JsonObject { ["task_id"] = sidecarTaskId }, ct);
+        return result.Deserialize<MusicTaskStatus>() ?? new MusicTaskStatus();
+    }
+
+    public async Task<Stream> DownloadFileAsync(string sidecarTaskId, string fileType, CancellationToken ct = default)
+    {
+        var result = await SendAsync("download", new JsonObject
+        {
+            ["task_id"] = sidecarTaskId,
+            ["type"] = fileType,
+            ["mode"] = "path",
+        }, ct);
+        return SidecarFile.OpenValidated(result);
+    }
+
+    public async Task<List<EngineInfo>> GetEnginesAsync(CancellationToken ct = default)
+    {
+        var result = await SendAsync("engines", null, ct);
+        return result.Deserialize<List<EngineInfo>>() ?? new List<EngineInfo>();
+    }
+
+    public void Dispose()
+    {
+        if (_process is { HasExited: false })
+        {
+            try
+            {
+                // Closing stdin lets the daemon finish in-flight requests and exit
+                _process.StandardInput.Close();
+                if (!_process.WaitForExit(5000))
+                    _process.Kill();
+            }
+            catch (Exception ex)
+            {
+                _logger.LogWarning(ex, "Error stopping Python worker daemon");
+            }
+        }
+        _process?.Dispose();
+        _startLock.Dispose();
+        _writeLock.Dispose();
+    }
+}
@@ -0,0 +1,29 @@
+using System.Text.Json;
+
+namespace MidoLearning.Api.Services.Music;
+
+/// <summary>
+/// Opens an artifact described by download_cli.py's "path" mode
+/// (<c>{ path, size, sha256 }</c>) as a file stream, so downloads never
+/// buffer the whole file or round-trip it through base64.
+/// </summary>
+public static class SidecarFile
+{
+    public static Stream OpenValidated(JsonElement info)
+    {
+        var path = info.GetProperty("path").GetString()
+            ?? throw new InvalidOperationException("download_cli.py returned no path");
+        var size = info.GetProperty("size").GetInt64();
+
+        var stream = new FileStream(path, FileMode.Open, FileAccess.Read, FileShare.Read,
+            bufferSize: 81920, FileOptions.Asynchronous | FileOptions.SequentialScan);
+
+        if (stream.Length != size)
+        {
+            stream.Dispose();
+            throw new InvalidOperationException(
+                $"Artifact {path} changed size after validation ({stream.Length} != {size})");
+        }
+        return stream;
+    }
+}
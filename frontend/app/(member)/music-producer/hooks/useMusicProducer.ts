@@ -35,6 +35,9 @@ export interface GenerateOptions {
   bars: number
   engine: string
   recording_id?: string
+  seed?: number
+  stems?: boolean
+  quality?: 'preview' | 'full'
 }
 
 export function useMusicProducer() {
@@ -0,0 +1,97 @@
+"""Shared feature front-end for AudioAnalyst.
+
+AnalysisFeatures holds one decoded recording and computes each derived
+representation at most once, on first use:
+
+    frames          centered frame matrix (a strided view; the YIN tracker's input)
+    frame_dur       frame grid shared by pitch, onset and motif (seconds per hop)
+    stft            complex STFT (N_FFT / HOP_LENGTH)
+    mel_db          log-power mel spectrogram of that STFT
+    onset_envelope  spectral flux of mel_db (what beat_track would compute)
+    pitch(profile)  (f0, voiced_flag) from pitch_tracking
+    tempo           beat_track over the shared onset envelope
+
+Every feature records how long it took in .timings (seconds, in the order
+computed) so slow steps show up in the analysis log.
+
+Only the fast profile shares work: YIN reads the shared frame matrix.
+librosa.pyin takes just the signal and frames it itself, so with the
+accurate profile nothing is computed twice either way; beat tracking
+already built its STFT / mel / onset chain once.
+"""
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+from pitch_tracking import FRAME_LENGTH, HOP_LENGTH, frame_signal, track_pitch
+
+N_FFT = FRAME_LENGTH
+
+
+class AnalysisFeatures:
+    """Lazily computed, cached features of one mono recording."""
+
+    def __init__(self, y: np.ndarray, sr: int, hop_length: int = HOP_LENGTH):
+        self.y = y
+        self.sr = sr
+        self.hop_length = hop_length
+        self.timings: Dict[str, float] = {}
+        self._cache: Dict[str, object] = {}
+
+    def _feature(self, name: str, compute):
+        if name not in self._cache:
+            start = time.perf_counter()
+            self._cache[name] = compute()
+            self.timings[name] = time.perf_counter() - start
+        return self._cache[name]
+
+    @property
+    def frame_dur(self) -> float:
+        """Seconds per analysis frame."""
+        return self.hop_length / self.sr
+
+    @property
+    def frames(self) -> np.ndarray:
+        return self._feature("frames", lambda: frame_signal(
+            np.asarray(self.y, dtype=np.float64), N_FFT, self.hop_length,
+        ))
+
+    @property
+    def stft(self) -> np.ndarray:
+        import librosa
+        return self._feature("stft", lambda: librosa.stft(self.y, n_fft=N_FFT, hop_length=self.hop_length))
+
+    @property
+    def mel_db(self) -> np.ndarray:
+        import librosa
+
+        def compute():
+            mel = librosa.feature.melspectrogram(S=np.abs(self.stft) ** 2, sr=self.sr)
+            return librosa.power_to_db(mel)
+        return self._feature("mel_db", compute)
+
+    @property
+    def onset_envelope(self) -> np.ndarray:
+        import librosa
+        # Median aggregation, as beat_track uses when it computes its own
+        return self._feature("onset_envelope", lambda: librosa.onset.onset_strength(
+            S=self.mel_db, sr=self.sr, hop_length=self.hop_length, aggregate=np.median,
+        ))
+
+    @property
+    def tempo(self) -> float:
+        import librosa
+
+        def compute():
+            tempo, _ = librosa.beat.beat_track(
+                onset_envelope=self.onset_envelope, sr=self.sr, hop_length=self.hop_length,
+            )
+            return float(np.atleast_1d(tempo)[0])
+        return self._feature("tempo", compute)
+
+    def pitch(self, profile: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(f0, voiced_flag) on the shared frame grid."""
+        return self._feature(f"pitch_{profile}", lambda: track_pitch(
+            self.y, self.sr, profile, frames=self.frames if profile == "fast" else None,
+        ))
@@ -0,0 +1,128 @@
+"""Process pool for AudioAnalyst.analyze.
+
+pyin and beat tracking hold a core for seconds; run on the event loop (or
+a thread, under the GIL) they stall every other request. AnalysisPool runs
+them in dedicated worker processes that import librosa once.
+
+Configuration:
+  ANALYSIS_WORKERS    worker processes (default: min(2, cpu count))
+  ANALYSIS_TIMEOUT_S  default wait of a synchronous /analyze request
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(min(2, os.cpu_count() or 1))))
+ANALYSIS_TIMEOUT_S = float(os.getenv("ANALYSIS_TIMEOUT_S", "60"))
+
+
+def analysis_fields(result) -> Dict[str, Any]:
+    """The /analyze response body for an AnalysisResult."""
+    return {
+        "key": result.key,
+        "scale": result.scale,
+        "bpm": result.bpm,
+        "motif_notes": result.motif_notes,
+        "motif_rhythm": result.motif_rhythm,
+        "confidence": result.confidence,
+        "key_changes": result.key_changes,
+    }
+
+
+# -- worker side --
+
+def _init_worker() -> None:
+    import librosa          # noqa: F401
+    import audio_analyzer   # noqa: F401
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Analysis worker %d ready", multiprocessing.current_process().pid)
+
+
+def _analyze_in_worker(audio_path: str, profile: Optional[str]) -> Dict[str, Any]:
+    from audio_analyzer import AudioAnalyst
+
+    analyst = AudioAnalyst(profile) if profile else AudioAnalyst()
+    return analysis_fields(analyst.analyze(audio_path))
+
+
+# -- parent side --
+
+class AnalysisPool:
+    """A lazily started, self-healing ProcessPoolExecutor for analysis jobs."""
+
+    def __init__(self, max_workers: int = ANALYSIS_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.pending = 0     # queued or running
+        self.timed_out = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn (not fork): the parent holds uvicorn / Firestore threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def submit(self, audio_path: str, profile: Optional[str] = None) -> "Future[Dict[str, Any]]":
+        """Queue *audio_path* for analysis; the future yields the response fields.
+
+        *profile* is the pitch-tracking profile (fast | accurate; default
+        ANALYSIS_PROFILE).
+        """
+        with self._lock:
+            try:
+                future = self._pool().submit(_analyze_in_worker, audio_path, profile)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge upload): start a fresh pool
+                logger.warning("Analysis pool broken; restarting it")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                future = self._pool().submit(_analyze_in_worker, audio_path, profile)
+            self.submitted += 1
+            self.pending += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def wait(self, future: Future, timeout: float = ANALYSIS_TIMEOUT_S) -> Dict[str, Any]:
+        """Await a submitted job; raises asyncio.TimeoutError after *timeout* seconds.
+
+        A timed-out job keeps its worker until it finishes; only the wait ends.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "pending": self.pending,
+                "timed_out": self.timed_out,
+            }
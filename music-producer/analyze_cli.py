@@ -1,62 +1,124 @@
 #!/usr/bin/env python3
 """analyze_cli.py - Audio analysis CLI wrapper.
 
-stdin:  JSON { "audio_b64": "<base64>", "suffix": ".webm" }
+stdin, one of:
+  framed:  one JSON header line { "suffix": ".webm", "length": <bytes> }
+           followed by exactly <length> raw audio bytes
+  path:    JSON { "path": "/tmp/already-spooled.webm" }  (file is not deleted)
+  legacy:  JSON { "audio_b64": "<base64>", "suffix": ".webm" }
+  Every form may add "analysis_profile": "fast" | "accurate" (pitch tracker).
 stdout: JSON analysis result
 stderr: logging (ignored by .NET)
+
+The framed and path forms avoid base64 and the in-memory decode: a framed
+upload is copied once, straight from the pipe into the temp file librosa reads.
 """
 import sys
 import json
 import base64
+import shutil
 import tempfile
 import os
+from typing import BinaryIO, Optional
 
-def main():
+CHUNK_SIZE = 256 * 1024
+
+
+def analyze_path(path: str, profile: Optional[str] = None) -> dict:
+    """Analyze an audio file on disk; never raises."""
     try:
-        data = json.loads(sys.stdin.buffer.read())
-        audio_bytes = base64.b64decode(data["audio_b64"])
-        suffix = data.get("suffix", ".webm")
+        from audio_analyzer import AudioAnalyst, default_analysis
+        analyst = AudioAnalyst(profile) if profile else AudioAnalyst()
+        result = analyst.analyze(path)
+        return {
+            "key": result.key,
+            "scale": result.scale,
+            "bpm": result.bpm,
+            "motif_notes": result.motif_notes,
+            "motif_rhythm": result.motif_rhythm,
+            "confidence": result.confidence,
+            "key_changes": result.key_changes,
+        }
+    except Exception as e:
+        from audio_analyzer import default_analysis
+        fallback = default_analysis()
+        return {
+            "key": fallback.key,
+            "scale": fallback.scale,
+            "bpm": fallback.bpm,
+            "motif_notes": fallback.motif_notes,
+            "motif_rhythm": fallback.motif_rhythm,
+            "confidence": 0.0,
+            "key_changes": [],
+            "error": str(e),
+        }
+
+
+def _analyze_spooled(write_audio, suffix: str, profile: Optional[str] = None) -> dict:
+    """Spool audio into a temp file via *write_audio(fh)*, analyze, clean up."""
+    f = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        # Inside the try: a truncated upload must not leak the temp file
+        with f:
+            write_audio(f)
+        return analyze_path(f.name, profile)
+    finally:
+        try:
+            os.unlink(f.name)
+        except Exception:
+            pass
 
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
-            f.write(audio_bytes)
-            path = f.name
 
+def analyze(data: dict) -> dict:
+    """Analyze a JSON request ("path" or legacy "audio_b64")."""
+    profile = data.get("analysis_profile")
+    if data.get("path"):
+        return analyze_path(data["path"], profile)
+
+    audio_bytes = base64.b64decode(data["audio_b64"])
+    return _analyze_spooled(lambda f: f.write(audio_bytes), data.get("suffix", ".webm"), profile)
+
+
+def analyze_framed(header: dict, stream: BinaryIO) -> dict:
+    """Analyze raw audio bytes that follow a framed header on *stream*."""
+    length: Optional[int] = header.get("length")
+
+    def copy(f) -> None:
+        if length is None:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            return
+        remaining = int(length)
+        while remaining > 0:
+            chunk = stream.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise EOFError(f"Audio payload truncated ({remaining} bytes missing)")
+            f.write(chunk)
+            remaining -= len(chunk)
+
+    return _analyze_spooled(copy, header.get("suffix", ".webm"), header.get("analysis_profile"))
+
+
+def main():
+    try:
+        stdin = sys.stdin.buffer
+        first_line = stdin.readline()
         try:
-            from audio_analyzer import AudioAnalyst, default_analysis
-            analyst = AudioAnalyst()
-            result = analyst.analyze(path)
-            output = {
-                "key": result.key,
-                "scale": result.scale,
-                "bpm": result.bpm,
-                "motif_notes": result.motif_notes,
-                "motif_rhythm": result.motif_rhythm,
-                "confidence": result.confidence,
-            }
-        except Exception as e:
-            from audio_analyzer import default_analysis
-            fallback = default_analysis()
-            output = {
-                "key": fallback.key,
-                "scale": fallback.scale,
-                "bpm": fallback.bpm,
-                "motif_notes": fallback.motif_notes,
-                "motif_rhythm": fallback.motif_rhythm,
-                "confidence": 0.0,
-                "error": str(e),
-            }
-        finally:
-            try:
-                os.unlink(path)
-            except Exception:
-                pass
+            data = json.loads(first_line)
+        except ValueError:
+            # Legacy JSON document spread over several lines
+            data = json.loads(first_line + stdin.read())
 
+        if "length" in data:
+            output = analyze_framed(data, stdin)
+        else:
+            output = analyze(data)
         print(json.dumps(output))
         sys.exit(0)
 
     except Exception as e:
         print(json.dumps({"error": str(e), "key": "C", "scale": "major", "bpm": 120.0,
-                          "motif_notes": [], "motif_rhythm": [], "confidence": 0.0}))
+                          "motif_notes": [], "motif_rhythm": [], "confidence": 0.0,
+                          "key_changes": []}))
         sys.exit(0)
 
 
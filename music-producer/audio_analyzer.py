@@ -2,17 +2,24 @@
 
 Extracts musical information from a recorded audio file:
   - Key (Krumhansl-Schmuckler algorithm)
+  - Key changes (Krumhansl-Schmuckler over sliding windows,
+    KEY_WINDOW_S long every KEY_STEP_S seconds)
   - BPM (librosa beat tracker)
   - Melodic motif (first distinctive pitch sequence)
   - Confidence score
 """
 import logging
 import os
+import time
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 
+from analysis_features import AnalysisFeatures
+from pitch_tracking import ANALYSIS_PROFILE, PROFILES
+
 logger = logging.getLogger(__name__)
 
 # -- Krumhansl-Schmuckler Key Profiles --
@@ -34,14 +41,65 @@ SCALE_FOR_MODE = {
 }
 
 
-def _pearson(a: np.ndarray, b: np.ndarray) -> float:
-    """Pearson correlation between two arrays."""
-    ma, mb = a.mean(), b.mean()
-    num = np.sum((a - ma) * (b - mb))
-    den = np.sqrt(np.sum((a - ma) ** 2) * np.sum((b - mb) ** 2))
-    if den == 0:
-        return 0.0
-    return float(num / den)
+# 24 x 12 matrix of every rotated profile, ordered C major, C minor, C#
+# major, ... so that argmax ties resolve the way the sequential search did
+# (major before minor, lower pitch class first). Scaled to integers, so the
+# dot products with count histograms are exact and equal-scoring rotations
+# of one profile tie exactly instead of by rounding noise.
+_KS_PROFILES = np.array([np.roll(profile, pc) for pc in range(12)
+                         for profile in (_KS_MAJOR, _KS_MINOR)])
+_KS_WEIGHTS = np.round(_KS_PROFILES * 100)
+_KS_SUMS = _KS_WEIGHTS.sum(axis=1)
+# Rotation does not change a profile's spread: one value per mode
+_KS_SUM_SQ = np.tile([np.sum((w - w.mean()) ** 2) for w in _KS_WEIGHTS[:2]], 12)
+_KS_MODES = ('major', 'minor')
+
+# Sliding-window key tracking (see track_keys)
+KEY_WINDOW_S = float(os.getenv('KEY_WINDOW_S', '8.0'))
+KEY_STEP_S = float(os.getenv('KEY_STEP_S', '2.0'))
+KEY_SMOOTH_WINDOWS = int(os.getenv('KEY_SMOOTH_WINDOWS', '5'))
+
+
+def pitch_class_histogram(midi_pitches: np.ndarray) -> np.ndarray:
+    """12-bin pitch-class count of integer MIDI pitches."""
+    return np.bincount(np.mod(midi_pitches, 12), minlength=12).astype(np.float64)
+
+
+def _ks_correlations(hist: np.ndarray) -> np.ndarray:
+    """(N, 24) Pearson correlation of each histogram with each _KS_PROFILES row."""
+    # sum((h - mean h) * (w - mean w)) == h . w - sum(h) * sum(w) / 12
+    num = hist @ _KS_WEIGHTS.T - np.outer(hist.sum(axis=1), _KS_SUMS) / 12
+    centered = hist - hist.mean(axis=1, keepdims=True)
+    den = np.sqrt(np.outer(np.sum(centered ** 2, axis=1), _KS_SUM_SQ))
+    # A flat histogram correlates 0 with everything (and lands on C major)
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+
+def _ks_confidence(r: np.ndarray) -> np.ndarray:
+    """Normalize correlation to 0-1 confidence."""
+    return np.clip((r + 1) / 2, 0.0, 1.0)
+
+
+def detect_keys_ks(pitch_class_histograms: np.ndarray) -> List[Tuple[str, str, float]]:
+    """
+    Krumhansl-Schmuckler over a batch of (N, 12) pitch-class histograms.
+
+    Correlating a histogram rotated by -pc with a profile is the same as
+    correlating it with the profile rotated by +pc, so all 24 candidate
+    keys of all N histograms are scored by one (N, 12) x (12, 24) product.
+    Returns one (note_name, mode, confidence) per histogram.
+    """
+    hist = np.atleast_2d(np.asarray(pitch_class_histograms, dtype=np.float64))
+    r = _ks_correlations(hist)
+    best = r.argmax(axis=1)
+    confidence = _ks_confidence(r[np.arange(len(r)), best])
+    empty = hist.sum(axis=1) == 0
+
+    return [
+        ('C', 'major', 0.0) if is_empty
+        else (NOTE_NAMES[k // 2], _KS_MODES[k % 2], float(conf))
+        for k, conf, is_empty in zip(best.tolist(), confidence, empty)
+    ]
 
 
 def detect_key_ks(pitch_class_histogram: np.ndarray) -> Tuple[str, str, float]:
@@ -51,29 +109,74 @@ def detect_key_ks(pitch_class_histogram: np.ndarray) -> Tuple[str, str, float]:
     Returns (note_name, mode, confidence) where confidence is the best
     Pearson correlation value [0, 1].
     """
-    hist = pitch_class_histogram.copy()
-    if hist.sum() == 0:
-        return 'C', 'major', 0.0
+    return detect_keys_ks(pitch_class_histogram)[0]
 
-    best_r = -2.0
-    best_pc = 0
-    best_mode = 'major'
 
-    for pc in range(12):
-        # Rotate the histogram so 'pc' aligns with the profile's root
-        rotated = np.roll(hist, -pc)
-
-        r_major = _pearson(rotated, _KS_MAJOR)
-        r_minor = _pearson(rotated, _KS_MINOR)
-
-        if r_major > best_r:
-            best_r, best_pc, best_mode = r_major, pc, 'major'
-        if r_minor > best_r:
-            best_r, best_pc, best_mode = r_minor, pc, 'minor'
-
-    # Normalize correlation to 0-1 confidence
-    confidence = max(0.0, min(1.0, (best_r + 1) / 2))
-    return NOTE_NAMES[best_pc], best_mode, confidence
+def track_keys(
+    f0: np.ndarray,
+    voiced_flag: np.ndarray,
+    frame_dur: float,
+    window_s: float = KEY_WINDOW_S,
+    step_s: float = KEY_STEP_S,
+) -> List[Dict[str, Any]]:
+    """
+    Follow key changes through a pitch contour.
+
+    Pitch-class histograms of windows of *window_s* seconds every *step_s*
+    seconds come from differences of one cumulative per-frame count, and
+    are scored in a single batch. Each window's key is the majority of the
+    KEY_SMOOTH_WINDOWS windows around it; consecutive windows in the same
+    key merge into one segment, which starts at the center of its first
+    window (the first one at 0). Windows with no voiced frames are skipped.
+    Returns [{start, end, key, mode, confidence}, ...] with times in
+    seconds.
+    """
+    import librosa
+
+    f0 = np.asarray(f0, dtype=np.float64)
+    n_frames = len(f0)
+    valid = np.asarray(voiced_flag, dtype=bool) & np.isfinite(f0) & (f0 > 0)
+    frames = np.flatnonzero(valid)
+    if len(frames) == 0:
+        return []
+    pcs = np.mod(np.round(librosa.hz_to_midi(f0[frames])).astype(np.int64), 12)
+
+    counts = np.zeros((n_frames + 1, 12))
+    counts[frames + 1, pcs] = 1
+    np.cumsum(counts, axis=0, out=counts)
+
+    window = min(n_frames, max(1, int(round(window_s / frame_dur))))
+    step = max(1, int(round(step_s / frame_dur)))
+    starts = np.unique(np.append(np.arange(0, n_frames - window + 1, step), n_frames - window))
+    histograms = counts[starts + window] - counts[starts]
+    voiced_windows = histograms.sum(axis=1) > 0
+    starts, histograms = starts[voiced_windows], histograms[voiced_windows]
+
+    r = _ks_correlations(histograms)
+    labels = r.argmax(axis=1).tolist()
+    # Majority vote over neighbouring windows, so that a brief excursion to
+    # a close key (dominant, relative minor) does not read as a modulation
+    half = KEY_SMOOTH_WINDOWS // 2
+    smoothed = []
+    for i, label in enumerate(labels):
+        votes = Counter(labels[max(0, i - half):i + half + 1])
+        smoothed.append(label if votes[label] == max(votes.values()) else votes.most_common(1)[0][0])
+    confidence = _ks_confidence(r[np.arange(len(r)), smoothed])
+
+    # Runs of windows in one key become segments
+    runs = np.flatnonzero(np.diff(smoothed, prepend=-1))
+    bounds = [0.0] + [round((starts[i] + window / 2) * frame_dur, 2) for i in runs[1:]]
+    bounds.append(round(n_frames * frame_dur, 2))
+    return [
+        {
+            'start': bounds[n],
+            'end': bounds[n + 1],
+            'key': NOTE_NAMES[smoothed[i] // 2],
+            'mode': _KS_MODES[smoothed[i] % 2],
+            'confidence': float(conf.mean()),
+        }
+        for n, (i, conf) in enumerate(zip(runs, np.split(confidence, runs[1:])))
+    ]
 
 
 # -- AnalysisResult dataclass --
@@ -88,6 +191,8 @@ class AnalysisResult:
     confidence: float                 # key-detection confidence 0-1
     source: str = 'recording'         # "recording" | "default"
     analysis_notes: str = ''          # human-readable summary
+    timings: Dict[str, float] = field(default_factory=dict)   # seconds per analysis feature
+    key_changes: List[Dict[str, Any]] = field(default_factory=list)   # track_keys segments
 
 
 # -- Default fallback --
@@ -117,16 +222,25 @@ def default_analysis(key: str = 'C', bpm: float = 120.0, style: str = 'pop') ->
 # -- AudioAnalyst --
 
 class AudioAnalyst:
-    """Analyzes an audio file and returns an AnalysisResult."""
+    """Analyzes an audio file and returns an AnalysisResult.
+
+    *profile* picks the pitch tracker: 'accurate' (pyin) or 'fast'
+    (vectorized YIN); see pitch_tracking.py.
+    """
 
     MIN_CONFIDENCE = 0.4   # Below this we mark the source as 'low_confidence'
 
+    def __init__(self, profile: str = ANALYSIS_PROFILE):
+        if profile not in PROFILES:
+            raise ValueError(f'Unknown analysis profile: {profile}')
+        self.profile = profile
+
     def analyze(self, audio_path: str) -> AnalysisResult:
         """
         Full analysis pipeline:
           1. Load audio with librosa
-          2. Extract pitch contour (pyin)
-          3. Build pitch-class histogram -> Key (KS)
+          2. Extract pitch contour (pyin, or YIN with the fast profile)
+          3. Build pitch-class histogram -> Key (KS), and key changes over time
           4. Beat tracking -> BPM
           5. Extract motif from pitched segments
         """
@@ -141,15 +255,14 @@ class AudioAnalyst:
             raise FileNotFoundError(f'Audio file not found: {audio_path}')
 
         logger.info('AudioAnalyst: loading %s', audio_path)
+        start = time.perf_counter()
         y, sr = librosa.load(audio_path, sr=22050, mono=True, duration=30.0)
+        # STFT, onset envelope and frame grid are computed once and shared
+        features = AnalysisFeatures(y, sr)
+        features.timings['load'] = time.perf_counter() - start
 
-        # -- 1. Pitch extraction (pyin) --
-        f0, voiced_flag, _ = librosa.pyin(
-            y, sr=sr,
-            fmin=librosa.note_to_hz('C2'),
-            fmax=librosa.note_to_hz('C7'),
-            frame_length=2048,
-        )
+        # -- 1. Pitch extraction --
+        f0, voiced_flag = features.pitch(self.profile)
         # Filter to voiced frames only
         voiced_f0 = f0[voiced_flag]
         if len(voiced_f0) == 0:
@@ -165,19 +278,19 @@ class AudioAnalyst:
 
         # -- 2. Pitch-class histogram for Key detection --
         midi_pitches = np.round(librosa.hz_to_midi(voiced_f0)).astype(int)
-        pc_histogram = np.zeros(12)
-        for mp in midi_pitches:
-            pc_histogram[mp % 12] += 1
+        pc_histogram = pitch_class_histogram(midi_pitches)
 
         key_name, mode, confidence = detect_key_ks(pc_histogram)
+        start = time.perf_counter()
+        key_changes = track_keys(f0, voiced_flag, features.frame_dur)
+        features.timings['key_track'] = time.perf_counter() - start
         scale = SCALE_FOR_MODE.get(mode, 'major')
         # Prefer pentatonic for low-confidence detection or cpop context
         if confidence < 0.55:
             scale = 'pentatonic_major'
 
         # -- 3. BPM --
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        bpm = float(np.atleast_1d(tempo)[0])
+        bpm = features.tempo
         # Clamp to sensible range
         while bpm < 60:
             bpm *= 2
@@ -186,7 +299,7 @@ class AudioAnalyst:
         bpm = max(60.0, min(140.0, round(bpm, 1)))
 
         # -- 4. Motif extraction --
-        motif_notes, motif_rhythm = self._extract_motif(f0, voiced_flag, sr)
+        motif_notes, motif_rhythm = self._extract_motif(f0, voiced_flag, sr, features.hop_length)
 
         notes_str = ', '.join([f'{NOTE_NAMES[m % 12]}{m // 12 - 1}' for m in motif_notes])
         source = 'recording' if confidence >= self.MIN_CONFIDENCE else 'low_confidence'
@@ -195,6 +308,8 @@ class AudioAnalyst:
             f'BPM: {bpm}, motif: {notes_str}'
         )
         logger.info('AudioAnalyst: %s', analysis_notes)
+        logger.info('AudioAnalyst timings: %s',
+                    ', '.join(f'{name} {secs * 1000:.0f} ms' for name, secs in features.timings.items()))
 
         return AnalysisResult(
             key=key_name,
@@ -205,6 +320,8 @@ class AudioAnalyst:
             confidence=confidence,
             source=source,
             analysis_notes=analysis_notes,
+            timings=dict(features.timings),
+            key_changes=key_changes,
         )
 
     def _extract_motif(
@@ -212,52 +329,106 @@ class AudioAnalyst:
         f0: np.ndarray,
         voiced_flag: np.ndarray,
         sr: int,
+        hop_length: int = 512,
     ) -> Tuple[List[int], List[float]]:
         """
         Extract a motif: the first 4-8 distinct sustained pitched notes.
         Groups consecutive voiced frames at the same pitch into note events.
         """
-        try:
-            import librosa
-        except ImportError:
-            return [60, 62, 64, 65], [0.5, 0.5, 0.5, 0.5]
-
-        hop_length = 512
-        frame_dur = hop_length / sr   # seconds per frame
-
-        notes: List[Tuple[int, float]] = []   # (midi_pitch, duration_beats)
-        current_pitch: Optional[int] = None
-        current_dur = 0.0
-
-        for i, (voiced, freq) in enumerate(zip(voiced_flag, f0)):
-            if voiced and freq is not None and not np.isnan(freq):
-                midi = int(round(librosa.hz_to_midi(freq)))
-                if midi == current_pitch:
-                    current_dur += frame_dur
-                else:
-                    if current_pitch is not None and current_dur >= 0.1:
-                        notes.append((current_pitch, current_dur))
-                    current_pitch = midi
-                    current_dur = frame_dur
-            else:
-                if current_pitch is not None and current_dur >= 0.1:
-                    notes.append((current_pitch, current_dur))
-                current_pitch = None
-                current_dur = 0.0
-
-        if current_pitch is not None and current_dur >= 0.1:
-            notes.append((current_pitch, current_dur))
-
-        # Take the first 4-8 most prominent notes
-        notes = notes[:8] if len(notes) >= 4 else (notes * 2)[:8]
-        if not notes:
-            return [60, 62, 64, 65], [0.5, 0.5, 0.5, 0.5]
-
-        # Normalise durations to beat fractions (quarter = 1.0)
-        max_dur = max(d for _, d in notes)
-        beat_scale = 1.0 / max(max_dur, 0.25)
-        pitches = [p for p, _ in notes]
-        rhythms = [min(2.0, max(0.25, round(d * beat_scale * 4) / 4))
-                   for _, d in notes]
-
-        return pitches, rhythms
+        return extract_motifs(f0, voiced_flag, sr, hop_length)[0]
+
+
+# -- Motif extraction --
+
+DEFAULT_MOTIF = ([60, 62, 64, 65], [0.5, 0.5, 0.5, 0.5])
+MIN_NOTE_SECONDS = 0.1   # shorter pitch runs are glides / noise, not notes
+
+
+def extract_motifs(
+    f0: np.ndarray,
+    voiced_flag: np.ndarray,
+    sr: int,
+    hop_length: int = 512,
+) -> List[Tuple[List[int], List[float]]]:
+    """
+    Extract motifs from one pitch contour or a batch of them.
+
+    *f0* and *voiced_flag* are 1-D (one recording) or 2-D (recordings x
+    frames; pad shorter contours with NaN / False). Returns one
+    (pitches, rhythms) pair per recording.
+
+    Notes are runs of voiced frames that round to the same MIDI pitch,
+    found with one diff over the whole batch instead of a per-frame loop.
+    A run of n frames lasts cumsum(full(n, frame_dur))[n - 1] seconds,
+    the same float as adding frame_dur n times, so motifs match the
+    frame-by-frame accumulation exactly.
+    """
+    f0 = np.atleast_2d(np.asarray(f0, dtype=np.float64))
+    voiced = np.atleast_2d(np.asarray(voiced_flag)).astype(bool)
+    if f0.shape != voiced.shape:
+        raise ValueError(f'f0 {f0.shape} and voiced_flag {voiced.shape} differ in shape')
+    n_rows, n_frames = f0.shape
+
+    try:
+        import librosa
+    except ImportError:
+        return [_default_motif() for _ in range(n_rows)]
+    if n_frames == 0:
+        return [_default_motif() for _ in range(n_rows)]
+
+    frame_dur = hop_length / sr   # seconds per frame
+
+    # Voiced frames with a usable frequency, and their MIDI pitch
+    valid = voiced & np.isfinite(f0) & (f0 > 0)
+    midi = np.zeros(f0.shape, dtype=np.int64)
+    midi[valid] = np.round(librosa.hz_to_midi(f0[valid]))
+
+    # A run starts where voicing begins or the pitch changes; rows never join
+    valid, midi = valid.ravel(), midi.ravel()
+    prev_valid = np.concatenate(([False], valid[:-1]))
+    prev_valid[::n_frames] = False
+    prev_midi = np.concatenate(([-1], midi[:-1]))
+    starts = valid & (~prev_valid | (midi != prev_midi))
+    continues = np.concatenate((valid & ~starts, [False]))
+    ends = valid & ~continues[1:]
+
+    start_idx = np.flatnonzero(starts)
+    lengths = np.flatnonzero(ends) - start_idx + 1
+    if len(lengths):
+        durations = np.cumsum(np.full(int(lengths.max()), frame_dur))[lengths - 1]
+    else:
+        durations = np.zeros(0)
+
+    keep = durations >= MIN_NOTE_SECONDS
+    note_idx = start_idx[keep]
+    note_rows = note_idx // n_frames
+    splits = np.cumsum(np.bincount(note_rows, minlength=n_rows))[:-1]
+
+    return [
+        _motif_from_notes(pitches.tolist(), durs.tolist())
+        for pitches, durs in zip(np.split(midi[note_idx], splits),
+                                 np.split(durations[keep], splits))
+    ]
+
+
+def _default_motif() -> Tuple[List[int], List[float]]:
+    """Fresh copies of DEFAULT_MOTIF, safe for the caller to modify."""
+    return list(DEFAULT_MOTIF[0]), list(DEFAULT_MOTIF[1])
+
+
+def _motif_from_notes(pitches: List[int], durations: List[float]) -> Tuple[List[int], List[float]]:
+    """Turn note events (MIDI pitch, seconds) into a 4-8 note motif."""
+    # Take the first 4-8 most prominent notes
+    if len(pitches) >= 4:
+        pitches, durations = pitches[:8], durations[:8]
+    else:
+        pitches, durations = (pitches * 2)[:8], (durations * 2)[:8]
+    if not pitches:
+        return _default_motif()
+
+    # Normalise durations to beat fractions (quarter = 1.0)
+    beat_scale = 1.0 / max(max(durations), 0.25)
+    rhythms = [min(2.0, max(0.25, round(d * beat_scale * 4) / 4))
+               for d in durations]
+
+    return pitches, rhythms
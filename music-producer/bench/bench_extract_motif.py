@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Micro-benchmark the vectorized motif extractor against the per-frame loop.
+
+Builds random pitch contours (held notes, glides, unvoiced gaps and NaN
+frames), checks that extract_motifs returns exactly what the original
+frame-by-frame loop returns, one contour at a time and as a batch, then
+times both.
+
+    PYTHONPATH=. python bench/bench_extract_motif.py [--contours 200] [--frames 1300]
+
+Exits 1 on any mismatch.
+"""
+import argparse
+import sys
+import time
+
+import librosa
+import numpy as np
+
+from audio_analyzer import extract_motifs
+
+SR = 22050
+HOP = 512
+
+
+def loop_motif(f0, voiced_flag, sr, hop_length=512):
+    """The original per-frame implementation, kept as the reference."""
+    frame_dur = hop_length / sr
+    notes, current_pitch, current_dur = [], None, 0.0
+    for voiced, freq in zip(voiced_flag, f0):
+        if voiced and freq is not None and not np.isnan(freq):
+            midi = int(round(librosa.hz_to_midi(freq)))
+            if midi == current_pitch:
+                current_dur += frame_dur
+            else:
+                if current_pitch is not None and current_dur >= 0.1:
+                    notes.append((current_pitch, current_dur))
+                current_pitch = midi
+                current_dur = frame_dur
+        else:
+            if current_pitch is not None and current_dur >= 0.1:
+                notes.append((current_pitch, current_dur))
+            current_pitch = None
+            current_dur = 0.0
+    if current_pitch is not None and current_dur >= 0.1:
+        notes.append((current_pitch, current_dur))
+
+    notes = notes[:8] if len(notes) >= 4 else (notes * 2)[:8]
+    if not notes:
+        return [60, 62, 64, 65], [0.5, 0.5, 0.5, 0.5]
+    beat_scale = 1.0 / max(max(d for _, d in notes), 0.25)
+    return ([p for p, _ in notes],
+            [min(2.0, max(0.25, round(d * beat_scale * 4) / 4)) for _, d in notes])
+
+
+def random_contour(rng: np.random.Generator, n_frames: int):
+    """Held notes of 1-60 frames with pitch jitter, gaps and stray NaNs."""
+    f0 = np.empty(n_frames)
+    voiced = np.empty(n_frames, dtype=bool)
+    i = 0
+    while i < n_frames:
+        n = min(int(rng.integers(1, 60)), n_frames - i)
+        if rng.random() < 0.25:
+            f0[i:i + n], voiced[i:i + n] = np.nan, False
+        else:
+            midi = rng.integers(45, 80) + rng.normal(0, 0.2, n)
+            f0[i:i + n], voiced[i:i + n] = librosa.midi_to_hz(midi), True
+        i += n
+    f0[rng.random(n_frames) < 0.01] = np.nan
+    voiced[rng.random(n_frames) < 0.01] = False
+    return f0, voiced
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contours", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=1300)   # ~30 s at 22.05 kHz / 512
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    contours = [random_contour(rng, args.frames) for _ in range(args.contours)]
+    # Edge cases: silent, one long note, very short
+    contours += [(np.full(args.frames, np.nan), np.zeros(args.frames, dtype=bool)),
+                 (np.full(args.frames, 440.0), np.ones(args.frames, dtype=bool)),
+                 (np.array([440.0, 440.0]), np.array([True, True]))]
+
+    start = time.perf_counter()
+    expected = [loop_motif(f0, voiced, SR, HOP) for f0, voiced in contours]
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [extract_motifs(f0, voiced, SR, HOP)[0] for f0, voiced in contours]
+    single_s = time.perf_counter() - start
+
+    batch_f0 = np.full((len(contours), args.frames), np.nan)
+    batch_voiced = np.zeros(batch_f0.shape, dtype=bool)
+    for row, (f0, voiced) in enumerate(contours):
+        batch_f0[row, :len(f0)], batch_voiced[row, :len(voiced)] = f0, voiced
+    start = time.perf_counter()
+    batched = extract_motifs(batch_f0, batch_voiced, SR, HOP)
+    batch_s = time.perf_counter() - start
+
+    mismatches = sum(e != s for e, s in zip(expected, single))
+    mismatches += sum(e != b for e, b in zip(expected, batched))
+    n = len(contours)
+    print(f"{n} contours x {args.frames} frames")
+    print(f"per-frame loop  {loop_s * 1000 / n:8.3f} ms/contour")
+    print(f"vectorized      {single_s * 1000 / n:8.3f} ms/contour ({loop_s / single_s:.0f}x)")
+    print(f"batched         {batch_s * 1000 / n:8.3f} ms/contour ({loop_s / batch_s:.0f}x)")
+    print(f"mismatches      {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
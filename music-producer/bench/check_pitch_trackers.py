@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Check the fast (YIN) analysis profile against the accurate (pyin) one.
+
+Synthesizes a set of sung-like melodies (harmonic tones with vibrato,
+attack / release and a little noise) in different keys and modes, runs
+AudioAnalyst with both profiles and compares key and motif.
+
+    PYTHONPATH=. python bench/check_pitch_trackers.py [--melodies 12]
+
+Exits 1 when agreement drops under the tolerances below.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from audio_analyzer import AudioAnalyst
+
+SR = 22050
+MAJOR = [0, 2, 4, 5, 7, 9, 11]
+MINOR = [0, 2, 3, 5, 7, 8, 10]
+
+MIN_KEY_AGREEMENT = 0.9      # fraction of melodies with the same key and mode
+MIN_MOTIF_AGREEMENT = 0.8    # mean fraction of motif pitches that match
+MAX_RHYTHM_DIFF = 0.25       # beats, per matching motif note
+
+
+def synth_melody(rng: random.Random, tonic: int, scale, n_notes: int = 16) -> np.ndarray:
+    """A stepwise melody around *tonic* (MIDI) with random note lengths."""
+    np_rng = np.random.default_rng(rng.randrange(1 << 30))
+    degree, parts = 0, [np.zeros(int(0.2 * SR))]
+    for _ in range(n_notes):
+        degree = max(-3, min(9, degree + rng.choice([-2, -1, -1, 1, 1, 2, 0])))
+        octave, step = divmod(degree, 7)
+        freq = 440.0 * 2 ** ((tonic + 12 * octave + scale[step] - 69) / 12)
+        seconds = rng.choice([0.25, 0.25, 0.5, 0.5, 0.75, 1.0])
+
+        t = np.arange(int(seconds * SR)) / SR
+        vibrato = 1 + 0.006 * np.sin(2 * np.pi * 5.5 * t)
+        phase = 2 * np.pi * freq * np.cumsum(vibrato) / SR
+        tone = sum(a * np.sin(k * phase) for k, a in ((1, 1.0), (2, 0.5), (3, 0.25), (4, 0.12)))
+        env = np.minimum(1.0, np.minimum(t / 0.03, (seconds - t) / 0.05))
+        parts.append(0.25 * tone * env)
+    y = np.concatenate(parts + [np.zeros(int(0.3 * SR))])
+    return (y + 0.003 * np_rng.standard_normal(len(y))).astype(np.float32)
+
+
+def motif_agreement(a, b) -> float:
+    """Fraction of motif notes with the same pitch and a close rhythm."""
+    n = max(len(a.motif_notes), len(b.motif_notes))
+    same = sum(
+        1 for pa, pb, ra, rb in zip(a.motif_notes, b.motif_notes, a.motif_rhythm, b.motif_rhythm)
+        if pa == pb and abs(ra - rb) <= MAX_RHYTHM_DIFF
+    )
+    return same / n if n else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--melodies", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fast, accurate = AudioAnalyst("fast"), AudioAnalyst("accurate")
+    timings = {"fast": 0.0, "accurate": 0.0}
+    keys_agree, motif_scores = 0, []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.melodies):
+            tonic = rng.randrange(55, 67)
+            mode, scale = rng.choice([("major", MAJOR), ("minor", MINOR)])
+            path = os.path.join(tmp, f"melody{i}.wav")
+            sf.write(path, synth_melody(rng, tonic, scale), SR)
+
+            results = {}
+            for name, analyst in (("fast", fast), ("accurate", accurate)):
+                start = time.perf_counter()
+                results[name] = analyst.analyze(path)
+                timings[name] += time.perf_counter() - start
+
+            f, a = results["fast"], results["accurate"]
+            same_key = (f.key, f.scale) == (a.key, a.scale)
+            keys_agree += same_key
+            motif_scores.append(motif_agreement(f, a))
+            print(f"{i:2d} tonic {tonic} {mode:5s}  accurate {a.key:2s} {a.scale:16s} "
+                  f"fast {f.key:2s} {f.scale:16s} {'ok ' if same_key else 'KEY'}  "
+                  f"motif {motif_scores[-1]:.0%}")
+
+    key_rate = keys_agree / args.melodies
+    motif_rate = float(np.mean(motif_scores))
+    print(f"\nkey agreement   {key_rate:.0%} (min {MIN_KEY_AGREEMENT:.0%})")
+    print(f"motif agreement {motif_rate:.0%} (min {MIN_MOTIF_AGREEMENT:.0%})")
+    print(f"analysis time   accurate {timings['accurate']:.2f} s, fast {timings['fast']:.2f} s "
+          f"({timings['accurate'] / max(timings['fast'], 1e-9):.1f}x)")
+
+    sys.exit(0 if key_rate >= MIN_KEY_AGREEMENT and motif_rate >= MIN_MOTIF_AGREEMENT else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Check that a failed synth-pool render falls back to the fluidsynth CLI.
+
+select_synth wraps the pool in the note cache and loop library, so the
+fallback must look through those wrappers. This swaps in a pool whose
+renders always fail and a CLI renderer that only records the call, then
+renders a melody and a drum track with RENDER_BACKEND=auto.
+
+    PYTHONPATH=. python bench/check_render_fallback.py
+
+Exits 1 when a track is lost instead of re-rendered by the CLI.
+"""
+import os
+import sys
+import tempfile
+
+scratch = tempfile.mkdtemp(prefix="fallback-")
+os.environ["NOTE_CACHE_DIR"] = os.path.join(scratch, "notes")
+os.environ["RENDER_BACKEND"] = "auto"
+
+import numpy as np           # noqa: E402
+import pretty_midi           # noqa: E402
+import soundfile as sf       # noqa: E402
+
+import note_cache            # noqa: E402
+import renderer              # noqa: E402
+import synth_pool            # noqa: E402
+
+
+class FailingPool(synth_pool.SynthPool):
+    """A SynthPool whose renders always fail (no libfluidsynth needed)."""
+
+    def __init__(self, soundfont: str, sample_rate: int = 44100):
+        self.soundfont = soundfont
+        self.sample_rate = sample_rate
+
+    def render(self, midi) -> np.ndarray:
+        raise RuntimeError("synth pool render failed")
+
+
+def track(program: int, is_drum: bool = False) -> pretty_midi.PrettyMIDI:
+    midi = pretty_midi.PrettyMIDI(initial_tempo=120)
+    inst = pretty_midi.Instrument(program=program, is_drum=is_drum)
+    inst.notes = [pretty_midi.Note(100, 36 if is_drum else 60 + i, i * 0.5, i * 0.5 + 0.4) for i in range(4)]
+    midi.instruments.append(inst)
+    return midi
+
+
+def main():
+    soundfont = os.path.join(scratch, "fake.sf2")
+    with open(soundfont, "wb") as f:
+        f.write(b"RIFF")
+    pool = FailingPool(soundfont)
+    cli_calls = []
+
+    def fake_cli(midi, wav_path, soundfont, sample_rate):
+        cli_calls.append(wav_path)
+        sf.write(wav_path, np.zeros((sample_rate, 2), dtype=np.float32), sample_rate)
+        return True
+
+    synth_pool.get_pool = lambda soundfont, sample_rate=44100: pool
+    renderer._midi_object_to_wav_cli = fake_cli
+
+    synth = renderer.select_synth(soundfont)
+    print(f"select_synth: {type(synth).__name__} over {type(note_cache.base_synth(synth)).__name__}")
+    sources, _ = renderer.render_tracks({"melody": track(0), "drums": track(0, is_drum=True)}, soundfont)
+    print(f"rendered {sorted(sources)}, fluidsynth CLI calls: {len(cli_calls)}")
+
+    ok = sorted(sources) == ["drums", "melody"] and len(cli_calls) == 2
+    print("ok" if ok else "FAILED: pool failure did not fall back to the CLI")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,116 @@
 #!/usr/bin/env python3
 """download_cli.py - File download CLI wrapper.
 
-stdin:  JSON { "task_id": "<uuid>", "type": "midi|midi_accomp|mp3|wav" }
-stdout: JSON { "data": "<base64>" }
+stdin:  JSON { "task_id": "<uuid>", "type": "midi|midi_accomp|mp3|wav|stem_<name>|preview",
+               "mode": "b64|path|stream" }
+stdout: mode "b64" (default): JSON { "data": "<base64>" }
+        mode "path":   JSON { "path": "<abs path>", "size": <bytes>, "sha256": "<hex>" }
+                       -- the caller streams the file itself
+        mode "stream": raw file bytes, written in CHUNK_SIZE pieces
+        On error every mode prints JSON { "error": "..." } and exits 1.
 stderr: logging (ignored by .NET)
+
+"path" and "stream" keep peak memory constant regardless of file size.
 """
 import sys
 import json
 import base64
+import hashlib
 import os
 from pathlib import Path
+from typing import BinaryIO
 
 TASKS_DIR = Path(os.getenv("MUSIC_TASKS_DIR", "/tmp/music_tasks"))
 
+CHUNK_SIZE = 256 * 1024
+
 FILE_TYPE_MAP = {
     "midi": "melody_midi",
     "midi_accomp": "accomp_midi",
     "mp3": "mp3",
     "wav": "wav",
+    "preview": "preview",
 }
 
 
-def main():
-    try:
-        data = json.loads(sys.stdin.buffer.read())
-        task_id = data.get("task_id", "")
-        file_type = data.get("type", "")
+class DownloadError(Exception):
+    """Task or file is missing / not ready; message is returned to the caller."""
+
+
+def resolve_file(data: dict) -> str:
+    """Validate a download request and return the artifact path."""
+    task_id = data.get("task_id", "")
+    file_type = data.get("type", "")
+
+    status_path = TASKS_DIR / task_id / "status.json"
+    if not status_path.exists():
+        raise DownloadError("Task not found")
 
-        status_path = TASKS_DIR / task_id / "status.json"
+    status = json.loads(status_path.read_text())
+    # The preview is playable while the full render is still running
+    preview_ready = file_type == "preview" and status.get("preview_ready")
+    if status.get("status") != "completed" and not preview_ready:
+        raise DownloadError("Task not completed")
 
-        if not status_path.exists():
-            print(json.dumps({"error": "Task not found"}))
-            sys.exit(1)
+    # Per-instrument stems are stored under their own type name
+    file_key = file_type if file_type.startswith("stem_") else FILE_TYPE_MAP.get(file_type)
+    if not file_key:
+        raise DownloadError(f"Unknown file type: {file_type}")
 
-        status = json.loads(status_path.read_text())
+    files = status.get("files", {})
+    file_path = files.get(file_key)
+    if not file_path or not os.path.exists(file_path):
+        raise DownloadError(f"File '{file_type}' not available")
 
-        if status.get("status") != "completed":
-            print(json.dumps({"error": "Task not completed"}))
-            sys.exit(1)
+    return file_path
 
-        file_key = FILE_TYPE_MAP.get(file_type)
-        if not file_key:
-            print(json.dumps({"error": f"Unknown file type: {file_type}"}))
-            sys.exit(1)
 
-        files = status.get("files", {})
-        file_path = files.get(file_key)
+def file_info(file_path: str) -> dict:
+    """Path, size and SHA-256 of a file, hashed in CHUNK_SIZE pieces."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return {
+        "path": os.path.abspath(file_path),
+        "size": size,
+        "sha256": digest.hexdigest(),
+    }
 
-        if not file_path or not os.path.exists(file_path):
-            print(json.dumps({"error": f"File '{file_type}' not available"}))
-            sys.exit(1)
 
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
+def stream_file(file_path: str, out: BinaryIO) -> int:
+    """Copy a file to *out* in CHUNK_SIZE pieces; return bytes written."""
+    written = 0
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            out.write(chunk)
+            written += len(chunk)
+    out.flush()
+    return written
 
-        encoded = base64.b64encode(file_bytes).decode("utf-8")
-        print(json.dumps({"data": encoded}))
+
+def download(data: dict) -> dict:
+    """Return a JSON-able result for the "b64" and "path" modes."""
+    file_path = resolve_file(data)
+    if data.get("mode") == "path":
+        return file_info(file_path)
+
+    with open(file_path, "rb") as f:
+        file_bytes = f.read()
+    return {"data": base64.b64encode(file_bytes).decode("utf-8")}
+
+
+def main():
+    try:
+        data = json.loads(sys.stdin.buffer.read())
+        if data.get("mode") == "stream":
+            # Validate first so errors are still reported as JSON
+            file_path = resolve_file(data)
+            stream_file(file_path, sys.stdout.buffer)
+        else:
+            print(json.dumps(download(data)))
         sys.exit(0)
 
     except Exception as e:
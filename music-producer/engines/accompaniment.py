@@ -1,6 +1,6 @@
 """Full accompaniment arranger: piano, strings, bass, drums."""
 import random
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import pretty_midi
 
@@ -14,8 +14,10 @@ def create_bass_line(
     chords: List[Tuple[List[int], float, float]],
     style: str,
     bpm: float,
+    rng: Optional[random.Random] = None,
 ) -> pretty_midi.Instrument:
     """Build a bass line that follows chord roots."""
+    rng = rng or random
     bass = pretty_midi.Instrument(
         program=INSTRUMENTS['bass_electric'],
         name='Bass',
@@ -50,7 +52,7 @@ def create_bass_line(
             beat2_5_start = start + spb * 2.5
             bass.notes.append(pretty_midi.Note(
                 velocity=72,
-                pitch=fifth if random.random() > 0.35 else root,
+                pitch=fifth if rng.random() > 0.35 else root,
                 start=beat2_5_start,
                 end=beat2_5_start + spb - 0.05,
             ))
@@ -145,6 +147,7 @@ def build_full_accompaniment(
     style: str,
     bars: int,
     bpm: float,
+    rng: Optional[random.Random] = None,
 ) -> Tuple[pretty_midi.PrettyMIDI, List[Tuple[List[int], float, float]]]:
     """
     Assemble complete accompaniment MIDI with four tracks:
@@ -153,11 +156,12 @@ def build_full_accompaniment(
       Bass    -- Ch.3 (root-based bass line)
       Drums   -- Ch.10 (GM drum channel)
 
-    Returns (PrettyMIDI, chord_sequence).
+    Returns (PrettyMIDI, chord_sequence). A seeded *rng* makes the
+    arrangement reproducible.
     """
     midi = pretty_midi.PrettyMIDI(initial_tempo=bpm)
 
-    chords = build_chord_sequence(key, style, bars, bpm)
+    chords = build_chord_sequence(key, style, bars, bpm, rng)
 
     # Piano
     piano_pattern = 'broken' if style == 'ballad' else 'arpeggiated'
@@ -175,7 +179,7 @@ def build_full_accompaniment(
     midi.instruments.append(strings)
 
     # Bass
-    bass = create_bass_line(chords, style, bpm)
+    bass = create_bass_line(chords, style, bpm, rng)
     midi.instruments.append(bass)
 
     # Drums
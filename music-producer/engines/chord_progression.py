@@ -1,6 +1,6 @@
 """Chord progression generator for commercial pop styles."""
 import random
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import pretty_midi
 
@@ -10,13 +10,17 @@ from .theory import (
 )
 
 
-def get_progression(style: str) -> List[int]:
-    """Select a chord progression appropriate for the given style."""
+def get_progression(style: str, rng: Optional[random.Random] = None) -> List[int]:
+    """Select a chord progression appropriate for the given style.
+
+    Pass a seeded *rng* for reproducible output; defaults to the global RNG.
+    """
+    rng = rng or random
     choices = STYLE_PROGRESSIONS.get(style, list(PROGRESSIONS.values()))
-    prog_name = random.choice(choices) if isinstance(choices[0], str) else None
+    prog_name = rng.choice(choices) if isinstance(choices[0], str) else None
     if prog_name:
         return PROGRESSIONS[prog_name]
-    return random.choice(list(PROGRESSIONS.values()))
+    return rng.choice(list(PROGRESSIONS.values()))
 
 
 def build_chord_sequence(
@@ -24,14 +28,16 @@ def build_chord_sequence(
     style: str,
     bars: int,
     bpm: float,
+    rng: Optional[random.Random] = None,
 ) -> List[Tuple[List[int], float, float]]:
     """
     Build list of (chord_notes, start_sec, end_sec) -- one chord per bar.
     Chord voicing is in the mid range (around C4).
     """
+    rng = rng or random
     root_midi = get_key_root_midi(key, octave=4)
     scale_intervals = SCALES['major']
-    progression = get_progression(style)
+    progression = get_progression(style, rng)
     seconds_per_bar = (60.0 / bpm) * 4
 
     chords: List[Tuple[List[int], float, float]] = []
@@ -41,7 +47,7 @@ def build_chord_sequence(
         chord_type = MAJOR_SCALE_CHORDS[degree % 7]
 
         # Occasionally add 7th for colour
-        if random.random() < 0.25 and chord_type in ('maj', 'min'):
+        if rng.random() < 0.25 and chord_type in ('maj', 'min'):
             chord_type = 'maj7' if chord_type == 'maj' else 'min7'
 
         # Voicing: put chords one octave below middle to avoid clashing with melody
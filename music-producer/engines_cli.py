@@ -16,7 +16,8 @@ ENGINES_REGISTRY = {
 }
 
 
-def main():
+def list_engines() -> list:
+    """Return engine descriptors, falling back to the static registry."""
     try:
         from engines.theory_composer import MelodyComposer
         engine_instance = MelodyComposer()
@@ -27,11 +28,10 @@ def main():
                 "version": getattr(engine_instance, "version", meta["version"]),
                 "description": getattr(engine_instance, "description", meta["description"]),
             })
-        print(json.dumps(engines))
-        sys.exit(0)
-    except Exception as e:
+        return engines
+    except Exception:
         # Fallback: return static list
-        engines = [
+        return [
             {
                 "name": name,
                 "version": meta["version"],
@@ -39,8 +39,11 @@ def main():
             }
             for name, meta in ENGINES_REGISTRY.items()
         ]
-        print(json.dumps(engines))
-        sys.exit(0)
+
+
+def main():
+    print(json.dumps(list_engines()))
+    sys.exit(0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+"""Execution backends for MusicDirector.produce.
+
+ThreadBackend  -- runs produce() on a thread pool (default; shares the GIL)
+ProcessBackend -- runs produce() on a pre-warmed process pool so concurrent
+                  jobs use every core. Progress callbacks are relayed back to
+                  the parent through a multiprocessing queue.
+
+Select with GEN_EXECUTION_BACKEND=thread|process (see make_backend).
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# on_progress(pct, log_steps) or on_progress(pct, log_steps, fields), where
+# fields are extra task-record updates (e.g. a ready preview)
+ProgressCallback = Callable[..., None]
+
+
+# -- Thread backend --
+
+class ThreadBackend:
+    """Run produce() in-process on a dedicated thread pool."""
+
+    name = "thread"
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="generation",
+        )
+
+    async def produce(
+        self,
+        task_id: str,
+        engine_name: str,
+        produce_kwargs: Dict[str, Any],
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        from production_team import MusicDirector
+
+        director = MusicDirector(engine_name=engine_name)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            lambda: director.produce(**produce_kwargs, on_progress=on_progress),
+        )
+
+    def warm(self) -> None:
+        import renderer
+        renderer.warm_synth_pool()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+# -- Process backend (worker side) --
+
+_worker_progress_queue = None
+
+
+def _init_worker(progress_queue) -> None:
+    """Process-pool initializer: import the heavy modules once per worker."""
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+
+    import librosa          # noqa: F401
+    import pretty_midi      # noqa: F401
+    import production_team  # noqa: F401
+    import renderer
+    from engines import accompaniment, theory_composer  # noqa: F401
+    renderer.warm_synth_pool()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Generation worker %d ready", multiprocessing.current_process().pid)
+
+
+def _ping() -> int:
+    return multiprocessing.current_process().pid
+
+
+def _produce_in_worker(
+    task_id: str,
+    engine_name: str,
+    produce_kwargs: Dict[str, Any],
+) -> Dict[str, Any]:
+    from production_team import MusicDirector
+
+    def on_progress(pct: int, log_steps: List[Dict[str, str]],
+                    fields: Optional[Dict[str, Any]] = None) -> None:
+        _worker_progress_queue.put((task_id, pct, log_steps, fields))
+
+    director = MusicDirector(engine_name=engine_name)
+    return director.produce(**produce_kwargs, on_progress=on_progress)
+
+
+# -- Process backend (parent side) --
+
+class _RelayTarget:
+    """A task's progress callback; once closed it is never called again."""
+
+    def __init__(self, callback: ProgressCallback):
+        self.callback = callback
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def deliver(self, *args) -> None:
+        with self._lock:
+            if not self.closed:
+                self.callback(*args)
+
+    def try_close(self) -> bool:
+        """Close unless an update is being delivered right now."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        self.closed = True
+        self._lock.release()
+        return True
+
+    def close(self) -> None:
+        """Close, waiting for an update in flight to finish."""
+        with self._lock:
+            self.closed = True
+
+
+class ProcessBackend:
+    """Run produce() on a pre-warmed ProcessPoolExecutor."""
+
+    name = "process"
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        # spawn (not fork): the parent holds uvicorn / Firestore threads
+        ctx = multiprocessing.get_context("spawn")
+        self._progress_queue = ctx.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self._progress_queue,),
+        )
+
+        self._callbacks: Dict[str, _RelayTarget] = {}
+        self._callbacks_lock = threading.Lock()
+        self._relay = threading.Thread(
+            target=self._relay_progress, name="progress-relay", daemon=True,
+        )
+        self._relay.start()
+
+    def warm(self) -> None:
+        """Start every worker now instead of on the first job."""
+        futures = [self.executor.submit(_ping) for _ in range(self.max_workers)]
+        pids = {f.result() for f in futures}
+        logger.info("ProcessBackend: %d worker process(es) warm", len(pids))
+
+    async def produce(
+        self,
+        task_id: str,
+        engine_name: str,
+        produce_kwargs: Dict[str, Any],
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Dict[str, Any]:
+        if on_progress:
+            with self._callbacks_lock:
+                self._callbacks[task_id] = _RelayTarget(on_progress)
+        try:
+            future = self.executor.submit(
+                _produce_in_worker, task_id, engine_name, produce_kwargs,
+            )
+            return await asyncio.wrap_future(future)
+        finally:
+            # Once this returns no relayed update can overwrite the caller's
+            # final status write. An update already being written is waited
+            # for off the event loop, so a slow store write stalls only this
+            # task.
+            with self._callbacks_lock:
+                target = self._callbacks.pop(task_id, None)
+            if target is not None and not target.try_close():
+                await asyncio.to_thread(target.close)
+
+    def _relay_progress(self) -> None:
+        while True:
+            try:
+                item = self._progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            task_id, pct, log_steps, fields = item
+            with self._callbacks_lock:
+                target = self._callbacks.get(task_id)
+            if target is None:
+                continue
+            # Called outside _callbacks_lock: the callback does task-store I/O
+            try:
+                if fields:
+                    target.deliver(pct, log_steps, fields)
+                else:
+                    target.deliver(pct, log_steps)
+            except Exception as exc:
+                logger.warning("Progress relay error for %s: %s", task_id, exc)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._progress_queue.put(None)
+
+
+def make_backend(kind: str, max_workers: int):
+    """Return the execution backend named by *kind* ('thread' | 'process')."""
+    if kind == "process":
+        return ProcessBackend(max_workers)
+    if kind != "thread":
+        logger.warning("Unknown execution backend %r, using thread", kind)
+    return ThreadBackend(max_workers)
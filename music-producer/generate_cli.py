@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 """generate_cli.py - Music generation CLI wrapper.
 
-stdin:  JSON { "engine": "theory_v1", "key": "C", "bpm": 120, "style": "pop", "bars": 8, "recording_id": null }
+stdin:  JSON { "engine": "theory_v1", "key": "C", "bpm": 120, "style": "pop", "bars": 8,
+               "recording_id": null, "seed": null, "stems": false,
+               "quality": "preview|full" }
 stdout: JSON { "task_id": "<uuid>" }
 stderr: logging (ignored by .NET)
 
 The generation runs in a background thread. Results are written to:
   /tmp/music_tasks/<task_id>/status.json
   /tmp/music_tasks/<task_id>/<files>
+
+Requests with a "seed" are deterministic; their results are cached under
+MUSIC_CACHE_DIR and repeats are served by linking the cached artifacts.
 """
 import sys
 import json
@@ -15,8 +20,21 @@ import uuid
 import threading
 import os
 from pathlib import Path
+from typing import Optional, Tuple
 
 TASKS_DIR = Path(os.getenv("MUSIC_TASKS_DIR", "/tmp/music_tasks"))
+CACHE_DIR = Path(os.getenv("MUSIC_CACHE_DIR", "/tmp/music_cache"))
+CACHE_MAX_BYTES = int(os.getenv("MUSIC_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+_cache = None
+
+
+def _result_cache():
+    global _cache
+    if _cache is None:
+        from result_cache import ResultCache
+        _cache = ResultCache(CACHE_DIR, CACHE_MAX_BYTES)
+    return _cache
 
 
 def _write_status(task_id: str, data: dict) -> None:
@@ -34,7 +52,8 @@ def _write_status(task_id: str, data: dict) -> None:
 
 
 def _run_generation(task_id: str, engine: str, key: str, bpm: float,
-                    style: str, bars: int, recording_id) -> None:
+                    style: str, bars: int, recording_id, seed=None,
+                    cache_key=None, stems=False, quality="full") -> None:
     try:
         _write_status(task_id, {"status": "processing", "progress": 10, "production_log": []})
 
@@ -53,8 +72,17 @@ def _run_generation(task_id: str, engine: str, key: str, bpm: float,
             bars=bars,
             analysis=None,
             out_dir=str(task_out_dir),
+            seed=seed,
+            stems=stems,
+            quality=quality,
+            on_progress=lambda pct, log, fields=None: _write_status(
+                task_id, {"progress": pct, "production_log": log, **(fields or {})},
+            ),
         )
 
+        if cache_key and result.get("has_audio"):
+            _result_cache().store(cache_key, result)
+
         _write_status(task_id, {
             "status": "completed",
             "progress": 100,
@@ -62,6 +90,7 @@ def _run_generation(task_id: str, engine: str, key: str, bpm: float,
             "has_audio": result.get("has_audio", False),
             "files": result.get("files", {}),
             "out_dir": str(task_out_dir),
+            "quality": result.get("quality", "full"),
         })
 
     except Exception as e:
@@ -72,39 +101,72 @@ def _run_generation(task_id: str, engine: str, key: str, bpm: float,
         })
 
 
+def start_generation(data: dict) -> Tuple[str, Optional[threading.Thread]]:
+    """Create the task record and start generation on a daemon thread.
+
+    Returns (task_id, thread); thread is None when the result came from cache.
+    """
+    engine = data.get("engine", "theory_v1")
+    key = data.get("key", "C")
+    bpm = float(data.get("bpm", 120.0))
+    style = data.get("style", "pop")
+    bars = int(data.get("bars", 8))
+    recording_id = data.get("recording_id")
+    seed = data.get("seed")
+    seed = int(seed) if seed is not None else None
+    stems = bool(data.get("stems", False))
+    quality = "preview" if data.get("quality") == "preview" else "full"
+
+    task_id = str(uuid.uuid4())
+    TASKS_DIR.mkdir(parents=True, exist_ok=True)
+
+    cache_key = None
+    if seed is not None:
+        from engines.theory_composer import MelodyComposer
+        from result_cache import request_key
+        cache_key = request_key({**data, "seed": seed}, MelodyComposer().version)
+        cached = _result_cache().lookup(cache_key, TASKS_DIR / task_id)
+        if cached is not None:
+            _write_status(task_id, {
+                "status": "completed",
+                "progress": 100,
+                "production_log": cached.get("log", []),
+                "has_audio": cached.get("has_audio", False),
+                "files": cached["files"],
+                "out_dir": cached["files"]["task_dir"],
+                "quality": cached.get("quality", "full"),
+                "cached": True,
+            })
+            return task_id, None
+
+    _write_status(task_id, {
+        "status": "pending",
+        "progress": 0,
+        "production_log": [],
+        "has_audio": False,
+        "files": {},
+    })
+
+    thread = threading.Thread(
+        target=_run_generation,
+        args=(task_id, engine, key, bpm, style, bars, recording_id, seed, cache_key, stems, quality),
+        daemon=True,
+    )
+    thread.start()
+    return task_id, thread
+
+
 def main():
     try:
         data = json.loads(sys.stdin.buffer.read())
-        engine = data.get("engine", "theory_v1")
-        key = data.get("key", "C")
-        bpm = float(data.get("bpm", 120.0))
-        style = data.get("style", "pop")
-        bars = int(data.get("bars", 8))
-        recording_id = data.get("recording_id")
-
-        task_id = str(uuid.uuid4())
-
-        TASKS_DIR.mkdir(parents=True, exist_ok=True)
-        _write_status(task_id, {
-            "status": "pending",
-            "progress": 0,
-            "production_log": [],
-            "has_audio": False,
-            "files": {},
-        })
-
-        thread = threading.Thread(
-            target=_run_generation,
-            args=(task_id, engine, key, bpm, style, bars, recording_id),
-            daemon=True,
-        )
-        thread.start()
+        task_id, thread = start_generation(data)
 
         print(json.dumps({"task_id": task_id}))
         sys.stdout.flush()
 
         # Wait for thread so container doesn't exit before write
-        thread.join(timeout=300)
+        if thread is not None:
+            thread.join(timeout=300)
         sys.exit(0)
 
     except Exception as e:
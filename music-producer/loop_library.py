@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Pre-rendered drum and bass loop library.
+
+create_drum_pattern plays the same bar for a given style and bar phase
+(crash every 4 bars, open hat every 2), and create_bass_line follows one
+fixed template per style over each chord root. The offline build step
+renders those bars once per style over a quantized BPM grid:
+
+    python loop_library.py --soundfont soundfonts/GeneralUser.sf2 --bpm 60:180:5 [--bass]
+
+    drums  one-bar loops (one per bar phase) and the four-bar loop
+    bass   one-bar loops for every chord root / template variant (opt-in:
+           ~90 loops per BPM against 15 for drums)
+
+At render time LoopSynth assembles every drum instrument (and bass, with
+LOOP_INSTRUMENTS=drums,bass) by overlap-adding loops at their bar offsets;
+melody, piano and strings are still synthesized live. Loops are
+keyed by their content -- the notes of the bar(s) in MIDI ticks relative
+to the bar start, plus program and tempo -- so a bar that does not match a
+loop exactly (off-grid tempo, changed template) simply renders live.
+
+Layout:
+    <LOOP_LIBRARY_DIR>/<synth id>/<sample rate>/<d|p><program>_<bpm>_<bars>b_<hash>.npy
+"""
+import argparse
+import hashlib
+import io
+import logging
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import note_cache
+
+logger = logging.getLogger(__name__)
+
+LOOP_LIBRARY_DIR = Path(os.getenv("LOOP_LIBRARY_DIR", "loops"))
+LOOP_INSTRUMENTS = set(os.getenv("LOOP_INSTRUMENTS", "drums").split(","))   # drums,bass | '' disables
+STYLES = ("pop", "cpop", "ballad")
+BASS_ROOTS = range(36, 59)     # chord_root - 24 for keys in octave 4 (see build_chord_sequence)
+BEATS_PER_BAR = 4
+
+
+def _is_bass(inst) -> bool:
+    return not inst.is_drum and inst.program // 8 == 4
+
+
+def _loopable(inst) -> bool:
+    if inst.control_changes or inst.pitch_bends:
+        return False
+    return ("drums" in LOOP_INSTRUMENTS and inst.is_drum) or ("bass" in LOOP_INSTRUMENTS and _is_bass(inst))
+
+
+def _tempo(midi) -> Optional[float]:
+    """The single 4/4 tempo of *midi*, or None if it changes tempo or metre."""
+    _, tempi = midi.get_tempo_changes()
+    if len(tempi) > 1:
+        return None
+    if any((ts.numerator, ts.denominator) != (BEATS_PER_BAR, 4) for ts in midi.time_signature_changes):
+        return None
+    return float(tempi[0]) if len(tempi) else 120.0
+
+
+def loop_name(midi, inst, notes, bar_tick: int, bars: int, bpm: float) -> str:
+    """File name of the loop holding *notes* (from *bar_tick*, *bars* long)."""
+    events = sorted(
+        (n.pitch, n.velocity, int(midi.time_to_tick(n.start)) - bar_tick, int(midi.time_to_tick(n.end)) - bar_tick)
+        for n in notes
+    )
+    digest = hashlib.sha1(repr((midi.resolution, events)).encode()).hexdigest()[:16]
+    program = 0 if inst.is_drum else inst.program
+    return f"{'d' if inst.is_drum else 'p'}{program}_{bpm:.2f}_{bars}b_{digest}.npy"
+
+
+def _bars(midi, inst) -> Dict[int, list]:
+    """Notes of *inst* grouped by the bar they start in."""
+    bar_ticks = BEATS_PER_BAR * midi.resolution
+    groups: Dict[int, list] = {}
+    for note in inst.notes:
+        groups.setdefault(int(midi.time_to_tick(note.start)) // bar_ticks, []).append(note)
+    return groups
+
+
+class LoopSynth:
+    """Wraps a synth; drum / bass instruments are tiled from the loop library."""
+
+    def __init__(self, synth, directory: Path):
+        self.synth = synth
+        self.sample_rate = synth.sample_rate
+        self.dir = directory
+        self._names = {p.name for p in directory.glob("*.npy")}
+        self._loaded: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.tiled = 0
+        self.live = 0
+
+    def _loop(self, name: str) -> Optional[np.ndarray]:
+        if name not in self._names:
+            return None
+        with self._lock:
+            if name not in self._loaded:
+                self._loaded[name] = np.load(self.dir / name, mmap_mode="r")
+            return self._loaded[name]
+
+    def tile(self, midi, inst, bpm: float) -> Optional[List[Tuple[int, np.ndarray]]]:
+        """[(start sample, loop)] covering *inst*, or None if any bar has no loop."""
+        bar_ticks = BEATS_PER_BAR * midi.resolution
+        groups = _bars(midi, inst)
+        n_bars = max(groups, default=-1) + 1
+
+        placements = []
+        bar = 0
+        while bar < n_bars:
+            span = 4 if bar % 4 == 0 and bar + 4 <= n_bars else 1
+            if span == 4:
+                notes = [n for b in range(bar, bar + 4) for n in groups.get(b, [])]
+                loop = self._loop(loop_name(midi, inst, notes, bar * bar_ticks, 4, bpm)) if notes else None
+                if loop is None:
+                    span = 1
+            if span == 1:
+                notes = groups.get(bar, [])
+                loop = self._loop(loop_name(midi, inst, notes, bar * bar_ticks, 1, bpm)) if notes else None
+                if notes and loop is None:
+                    return None
+            if loop is not None:
+                start = int(round(midi.tick_to_time(bar * bar_ticks) * self.sample_rate))
+                placements.append((start, loop))
+            bar += span
+        return placements
+
+    def render(self, midi) -> np.ndarray:
+        """Render a PrettyMIDI to float32 (n, 2): tiled loops + live instruments."""
+        import pretty_midi
+
+        bpm = _tempo(midi)
+        placements, live = [], []
+        for inst in midi.instruments:
+            tiles = self.tile(midi, inst, bpm) if bpm and _loopable(inst) else None
+            if tiles is None:
+                live.append(inst)
+            else:
+                placements.extend(tiles)
+        self.tiled += len(midi.instruments) - len(live)
+        self.live += len(live)
+
+        live_audio = None
+        if live or not placements:
+            live_midi = pretty_midi.PrettyMIDI(initial_tempo=bpm or 120.0)
+            live_midi.instruments.extend(live)
+            live_audio = self.synth.render(live_midi)
+
+        length = max([s + len(a) for s, a in placements] + [len(live_audio) if live_audio is not None else 0])
+        out = np.zeros((length, 2), dtype=np.float32)
+        if live_audio is not None:
+            out[:len(live_audio)] += live_audio
+        for start, audio in placements:
+            out[start:start + len(audio)] += audio
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        return {"dir": str(self.dir), "loops": len(self._names), "tiled": self.tiled, "live": self.live}
+
+
+_wrappers: Dict[int, LoopSynth] = {}
+_wrappers_lock = threading.Lock()
+
+
+def wrap(synth, root: Path = LOOP_LIBRARY_DIR):
+    """Return *synth* wrapped in a LoopSynth if a library was built for it."""
+    if synth is None or not LOOP_INSTRUMENTS - {""}:
+        return synth
+    with _wrappers_lock:
+        wrapper = _wrappers.get(id(synth))
+        if wrapper is None:
+            directory = Path(root) / note_cache.synth_id(synth) / str(synth.sample_rate)
+            if not directory.is_dir():
+                return synth
+            wrapper = _wrappers[id(synth)] = LoopSynth(synth, directory)
+        return wrapper
+
+
+# -- offline build --
+
+class _FixedRandom:
+    """Stands in for the arranger's rng to pick one template variant."""
+
+    def __init__(self, value: float):
+        self.value = value
+
+    def random(self) -> float:
+        return self.value
+
+
+def _round_trip(midi):
+    """Write and re-read *midi*, so ticks and tempo match rendered .mid files."""
+    import pretty_midi
+
+    buf = io.BytesIO()
+    midi.write(buf)
+    buf.seek(0)
+    return pretty_midi.PrettyMIDI(buf)
+
+
+def _loop_midis(style: str, bpm: float, bass: bool):
+    """Yield (bars, PrettyMIDI) for every loop of *style* at *bpm*."""
+    import pretty_midi
+    from engines.accompaniment import create_bass_line, create_drum_pattern
+
+    drums = create_drum_pattern(4, bpm, style)
+    bar_seconds = BEATS_PER_BAR * 60.0 / bpm
+    for first, bars in ((0, 4), (0, 1), (1, 1), (2, 1), (3, 1)):
+        midi = pretty_midi.PrettyMIDI(initial_tempo=bpm)
+        part = pretty_midi.Instrument(program=0, is_drum=True, name="Drums")
+        shift = first * bar_seconds
+        part.notes = [
+            pretty_midi.Note(n.velocity, n.pitch, n.start - shift, n.end - shift)
+            for n in drums.notes if first * bar_seconds - 1e-9 <= n.start < (first + bars) * bar_seconds - 1e-9
+        ]
+        midi.instruments.append(part)
+        yield bars, midi
+
+    if not bass:
+        return
+    for root in BASS_ROOTS:
+        for variant in (0.0, 1.0):   # pop: root or fifth on beat 2.5
+            midi = pretty_midi.PrettyMIDI(initial_tempo=bpm)
+            midi.instruments.append(
+                create_bass_line([([root + 12], 0.0, bar_seconds)], style, bpm, _FixedRandom(variant))
+            )
+            yield 1, midi
+
+
+def build_library(
+    synth,
+    bpms: Sequence[float],
+    styles: Sequence[str] = STYLES,
+    bass: bool = False,
+    root: Path = LOOP_LIBRARY_DIR,
+) -> int:
+    """Render every loop for *styles* x *bpms* with *synth*; returns loops written."""
+    directory = Path(root) / note_cache.synth_id(synth) / str(synth.sample_rate)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for bpm in bpms:
+        for style in styles:
+            for bars, midi in _loop_midis(style, bpm, bass):
+                midi = _round_trip(midi)
+                inst = midi.instruments[0]
+                name = loop_name(midi, inst, inst.notes, 0, bars, _tempo(midi))
+                path = directory / name
+                if path.exists():
+                    continue
+                audio = synth.render(midi)
+                loud = np.flatnonzero(np.abs(audio).max(axis=1) > note_cache.SILENCE)
+                audio = np.ascontiguousarray(audio[:loud[-1] + 1 if len(loud) else 0], dtype=np.float32)
+                tmp = directory / f".tmp-{uuid.uuid4().hex}.npy"
+                np.save(tmp, audio)
+                os.replace(tmp, path)
+                written += 1
+        logger.info("Loop library: %g BPM done (%d new loops)", bpm, written)
+    return written
+
+
+def _bpm_grid(spec: str) -> List[float]:
+    """'60:180:5' -> [60, 65, ..., 180]; '90,120' -> [90, 120]."""
+    if ":" in spec:
+        lo, hi, step = (float(v) for v in spec.split(":"))
+        return [float(b) for b in np.arange(lo, hi + step / 2, step)]
+    return [float(b) for b in spec.split(",")]
+
+
+def main():
+    import renderer
+    import numpy_synth
+    import synth_pool
+
+    parser = argparse.ArgumentParser(description="Build the drum / bass loop library.")
+    parser.add_argument("--soundfont", default=str(renderer.SOUNDFONT_PATH))
+    parser.add_argument("--bpm", default="60:180:5", help="lo:hi:step or a comma list")
+    parser.add_argument("--styles", default=",".join(STYLES))
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--backend", choices=("auto", "pool", "numpy"), default="auto")
+    parser.add_argument("--bass", action="store_true", help="also build bass loops")
+    parser.add_argument("--out", default=str(LOOP_LIBRARY_DIR))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    synth = None
+    if args.backend != "numpy" and Path(args.soundfont).exists():
+        synth = synth_pool.get_pool(args.soundfont, args.sample_rate)
+    if synth is None:
+        if args.backend == "pool":
+            sys.exit("SynthPool unavailable (pyfluidsynth / SoundFont missing)")
+        synth = numpy_synth.get_synth(args.sample_rate)
+
+    written = build_library(synth, _bpm_grid(args.bpm), args.styles.split(","),
+                            bass=args.bass, root=Path(args.out))
+    print(f"{written} loop(s) written for {note_cache.synth_id(synth)} @ {args.sample_rate} Hz")
+
+
+if __name__ == "__main__":
+    main()
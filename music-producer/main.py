@@ -1,25 +1,46 @@
 """Music Producer Sidecar - FastAPI Entry Point"""
 import asyncio
+import json
 import logging
 import os
+import re
+import shutil
 import tempfile
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Literal, Optional
 
-from fastapi import BackgroundTasks, FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from audio_analyzer import AudioAnalyst, default_analysis
-from production_team import MusicDirector
+from analysis_pool import ANALYSIS_TIMEOUT_S, AnalysisPool, analysis_fields
+from audio_analyzer import default_analysis
+from execution import make_backend
+from result_cache import ResultCache, request_key
+from scheduler import GenerationScheduler, SchedulerFull
+from singleflight import SingleFlight
+from task_events import TaskEventHub, task_events
+from task_store import BufferedTaskWriter, FirestoreTaskBackend, InMemoryTaskBackend, StatusCache
 from engines.base_composer import CompositionRequest
 from engines.theory_composer import MelodyComposer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Music Producer Sidecar", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Pre-warm generation workers so the first job doesn't pay the imports
+    await asyncio.to_thread(backend.warm)
+    yield
+    backend.shutdown()
+    analysis_pool.shutdown()
+    task_store.close()
+
+
+app = FastAPI(title="Music Producer Sidecar", version="1.0.0", lifespan=lifespan)
 
 # -- Engine Registry --
 ENGINES: Dict[str, MelodyComposer] = {
@@ -28,42 +49,73 @@ ENGINES: Dict[str, MelodyComposer] = {
 }
 
 # -- Task Store (dual-mode: Firestore on Cloud Run, in-memory locally) --
+# Progress updates go through BufferedTaskWriter: coalesced per task within
+# TASK_WRITE_WINDOW_MS, production_log sent as appended steps, batched
+# across tasks; completed / failed are flushed immediately. Reads go through
+# a StatusCache so /status polling rarely reaches Firestore.
 GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 
 if GCP_PROJECT_ID:
-    from google.cloud import firestore as _firestore
-    _db = _firestore.Client(project=GCP_PROJECT_ID)
-    _TASK_COLLECTION = "music_tasks"
-
-    def _task_set(task_id: str, data: dict) -> None:
-        _db.collection(_TASK_COLLECTION).document(task_id).set(data)
+    _store_backend = FirestoreTaskBackend(GCP_PROJECT_ID, "music_tasks")
+    logger.info(f"Task store: Firestore (project={GCP_PROJECT_ID})")
+else:
+    _store_backend = InMemoryTaskBackend()
+    logger.info("Task store: in-memory (local dev mode)")
 
-    def _task_update(task_id: str, data: dict) -> None:
-        _db.collection(_TASK_COLLECTION).document(task_id).update(data)
+# The in-memory backend is already a dict lookup, so caching is off there
+status_cache = StatusCache(
+    running_ttl=float(os.getenv("STATUS_CACHE_RUNNING_TTL_MS", "1000" if GCP_PROJECT_ID else "0")) / 1000,
+    terminal_ttl=float(os.getenv("STATUS_CACHE_TERMINAL_TTL_S", "300")),
+)
+task_store = BufferedTaskWriter(
+    _store_backend,
+    window_seconds=float(os.getenv("TASK_WRITE_WINDOW_MS", "500" if GCP_PROJECT_ID else "0")) / 1000,
+    cache=status_cache,
+)
+_task_get = task_store.get
 
-    def _task_get(task_id: str) -> Optional[dict]:
-        doc = _db.collection(_TASK_COLLECTION).document(task_id).get()
-        return doc.to_dict() if doc.exists else None
+# Every write is also pushed to /status/{task_id}/events and /ws subscribers
+task_events_hub = TaskEventHub()
 
-    logger.info(f"Task store: Firestore (project={GCP_PROJECT_ID})")
-else:
-    _mem: Dict[str, dict] = {}
 
-    def _task_set(task_id: str, data: dict) -> None:
-        _mem[task_id] = data
+def _task_set(task_id: str, data: dict) -> None:
+    task_store.set(task_id, data)
+    task_events_hub.publish(task_id, data)
 
-    def _task_update(task_id: str, data: dict) -> None:
-        if task_id in _mem:
-            _mem[task_id].update(data)
 
-    def _task_get(task_id: str) -> Optional[dict]:
-        return _mem.get(task_id)
+def _task_update(task_id: str, data: dict) -> None:
+    task_store.update(task_id, data)
+    task_events_hub.publish(task_id, data)
 
-    logger.info("Task store: in-memory (local dev mode)")
 
 OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "/app/output"))
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# -- Result Cache (seeded requests only; they are deterministic) --
+result_cache = ResultCache(
+    root=Path(os.getenv("RESULT_CACHE_DIR", str(OUTPUT_DIR / ".cache"))),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# -- Generation Scheduler --
+# GEN_MAX_CONCURRENT:    jobs rendering at once (~ one per vCPU)
+# GEN_MAX_QUEUE:         jobs allowed to wait before /generate answers 429
+# GEN_EXECUTION_BACKEND: "thread" (default) or "process" (one core per job)
+GEN_MAX_CONCURRENT = int(os.getenv("GEN_MAX_CONCURRENT", "2"))
+
+backend = make_backend(os.getenv("GEN_EXECUTION_BACKEND", "thread"), GEN_MAX_CONCURRENT)
+scheduler = GenerationScheduler(
+    max_concurrent=GEN_MAX_CONCURRENT,
+    max_queue=int(os.getenv("GEN_MAX_QUEUE", "8")),
+    default_job_seconds=float(os.getenv("GEN_DEFAULT_JOB_SECONDS", "30")),
+)
+
+# Identical requests arriving while a job runs attach to it (single-flight)
+singleflight = SingleFlight()
+
+# -- Analysis pool: /analyze runs pyin / beat tracking off the event loop --
+analysis_pool = AnalysisPool()
+
 
 # -- Pydantic Models --
 class GenerateRequest(BaseModel):
@@ -73,66 +125,114 @@ class GenerateRequest(BaseModel):
     style: str = "pop"
     bars: int = 8
     recording_id: Optional[str] = None
+    seed: Optional[int] = None
+    stems: bool = False   # also render one WAV per instrument (download type stem_<name>)
+    # preview: a quick mono draft (download type "preview") is offered while
+    # the full render runs; status stays "processing" until that is done
+    quality: Literal["preview", "full"] = "full"
 
 
 # -- Background Task --
-async def run_generation(task_id: str, req: GenerateRequest):
-    """Background task: runs music generation with incremental progress updates."""
+def _flight_update(task_id: str, data: dict) -> None:
+    """Write *data* to a leader task and to every request coalesced onto it."""
+    _task_update(task_id, data)
+    for follower_id in singleflight.followers(task_id):
+        _task_update(follower_id, data)
+
+
+async def run_generation(
+    task_id: str,
+    req: GenerateRequest,
+    cache_key: Optional[str] = None,
+    flight_key: Optional[str] = None,
+):
+    """Background task: runs music generation with incremental progress updates.
+
+    When *cache_key* is given the finished artifacts are added to the result cache.
+    Progress and the final status are mirrored to requests coalesced under
+    *flight_key*.
+    """
     try:
-        _task_update(task_id, {"status": "processing", "progress": 5})
+        _flight_update(task_id, {"status": "processing", "progress": 5})
 
         # Select engine
         engine_name = req.engine if req.engine in ENGINES else "theory_v1"
-        director = MusicDirector(engine_name=engine_name)
 
-        # Callback called from the worker thread after each pipeline step.
+        # Callback called after each pipeline step, from the worker thread or
+        # the progress-relay thread (process backend).
         # _task_update is thread-safe for both in-memory and Firestore modes.
-        def on_progress(pct: int, log_steps: list) -> None:
-            _task_update(task_id, {
+        def on_progress(pct: int, log_steps: list, fields: Optional[Dict[str, Any]] = None) -> None:
+            _flight_update(task_id, {
                 "progress": pct,
                 "production_log": log_steps,
+                **(fields or {}),
             })
             logger.info(f"Task {task_id}: {pct}% — {len(log_steps)} step(s) logged")
 
-        # Run generation in a thread executor so the event loop stays free.
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: director.produce(
+        # Run generation on the execution backend so the event loop stays free.
+        result = await backend.produce(
+            task_id,
+            engine_name,
+            dict(
                 key=req.key,
                 bpm=req.bpm,
                 style=req.style,
                 bars=req.bars,
                 analysis=None,
                 out_dir=str(OUTPUT_DIR / task_id),
-                on_progress=on_progress,
-            )
+                seed=req.seed,
+                stems=req.stems,
+                quality=req.quality,
+            ),
+            on_progress,
         )
 
         task_out_dir = OUTPUT_DIR / task_id
         task_out_dir.mkdir(parents=True, exist_ok=True)
 
-        _task_update(task_id, {
+        if cache_key and result.get("has_audio"):
+            result_cache.store(cache_key, result)
+
+        final = {
             "status": "completed",
             "progress": 100,
             "production_log": result.get("log", []),
             "has_audio": result.get("has_audio", False),
             "files": result.get("files", {}),
             "out_dir": str(task_out_dir),
-        })
+            "quality": result.get("quality", "full"),
+        }
         logger.info(f"Task {task_id} completed")
 
     except Exception as e:
         logger.error(f"Task {task_id} failed: {e}", exc_info=True)
-        _task_update(task_id, {
+        final = {
             "status": "failed",
             "error": str(e),
-        })
+        }
+
+    # Close the flight first so late identical requests start a fresh job
+    # rather than attaching to one that has already finished.
+    followers = singleflight.finish(flight_key, task_id) if flight_key else []
+    _task_update(task_id, {**final, "coalesced_requests": len(followers)})
+    for follower_id in followers:
+        _task_update(follower_id, final)
 
 
 # -- Endpoints --
 @app.get("/health")
 def health():
-    return {"status": "ok", "engines": list(ENGINES.keys())}
+    return {
+        "status": "ok",
+        "engines": list(ENGINES.keys()),
+        "execution_backend": backend.name,
+        "scheduler": scheduler.stats(),
+        "result_cache": result_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "task_store": task_store.stats(),
+        "task_events": task_events_hub.stats(),
+        "analysis_pool": analysis_pool.stats(),
+    }
 
 
 @app.get("/engines")
@@ -148,46 +248,114 @@ def list_engines():
 
 
 @app.post("/analyze")
-async def analyze_audio(file: UploadFile = File(...)):
-    """Analyze uploaded audio file, return key/bpm/motif"""
+async def analyze_audio(
+    file: UploadFile = File(...),
+    run_async: bool = Query(False, alias="async"),
+    timeout: Optional[float] = Query(None, gt=0),
+    analysis_profile: Optional[Literal["fast", "accurate"]] = None,
+):
+    """Analyze uploaded audio file, return key/bpm/motif.
+
+    Analysis runs on the analysis process pool. By default the request waits
+    up to *timeout* seconds (ANALYSIS_TIMEOUT_S) and answers the default
+    analysis if it fails or times out. With ?async=1 it answers {task_id}
+    at once; /status/{task_id} then carries the fields under "result".
+    analysis_profile picks the pitch tracker (fast: YIN, accurate: pyin).
+    """
+    # UploadFile is already spooled; copy it to a named file in chunks
+    # instead of reading the whole recording into memory first.
+    tmp_path = await asyncio.to_thread(_spool_upload, file)
     try:
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-
-        analyst = AudioAnalyst()
-        result = analyst.analyze(tmp_path)
+        future = analysis_pool.submit(tmp_path, analysis_profile)
+    except Exception:
         os.unlink(tmp_path)
+        raise
+    future.add_done_callback(lambda _: Path(tmp_path).unlink(missing_ok=True))
 
-        return {
-            "key": result.key,
-            "scale": result.scale,
-            "bpm": result.bpm,
-            "motif_notes": result.motif_notes,
-            "motif_rhythm": result.motif_rhythm,
-            "confidence": result.confidence,
-        }
+    if run_async:
+        task_id = str(uuid.uuid4())
+        _task_set(task_id, {"status": "processing", "kind": "analysis", "progress": 0})
+        future.add_done_callback(lambda f: _finish_analysis(task_id, f))
+        return {"task_id": task_id, "status": "processing"}
+
+    try:
+        return await analysis_pool.wait(future, timeout or ANALYSIS_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        logger.warning("Analysis timed out, using defaults")
     except Exception as e:
         logger.warning(f"Analysis failed, using defaults: {e}")
-        result = default_analysis()
-        return {
-            "key": result.key,
-            "scale": result.scale,
-            "bpm": result.bpm,
-            "motif_notes": result.motif_notes,
-            "motif_rhythm": result.motif_rhythm,
-            "confidence": 0.0,
-        }
+    return {**analysis_fields(default_analysis()), "confidence": 0.0}
+
+
+def _spool_upload(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp, 256 * 1024)
+        return tmp.name
+
+
+def _finish_analysis(task_id: str, future) -> None:
+    """Done-callback of an async analysis job (runs on the pool's thread)."""
+    try:
+        _task_update(task_id, {"status": "completed", "progress": 100, "result": future.result()})
+    except Exception as e:
+        logger.warning(f"Analysis task {task_id} failed: {e}")
+        _task_update(task_id, {"status": "failed", "error": str(e)})
 
 
 @app.post("/generate")
-async def generate_music(req: GenerateRequest, background_tasks: BackgroundTasks):
-    """Start async music generation, return task_id immediately"""
+async def generate_music(req: GenerateRequest):
+    """Queue async music generation, return task_id immediately.
+
+    Answers 429 with Retry-After when the generation queue is full.
+    """
     if req.engine not in ENGINES:
         req.engine = "theory_v1"
 
     task_id = str(uuid.uuid4())
+
+    # Seeded requests are deterministic: serve repeats straight from the cache
+    engine_version = ENGINES[req.engine].version
+    cache_key = None
+    if req.seed is not None:
+        cache_key = request_key(req.model_dump(), engine_version)
+        cached = result_cache.lookup(cache_key, OUTPUT_DIR / task_id)
+        if cached is not None:
+            _task_set(task_id, {
+                "status": "completed",
+                "progress": 100,
+                "production_log": cached.get("log", []),
+                "has_audio": cached.get("has_audio", False),
+                "files": cached["files"],
+                "out_dir": cached["files"]["task_dir"],
+                "quality": cached.get("quality", "full"),
+                "cached": True,
+            })
+            return {"task_id": task_id, "queue_position": 0}
+
+    # An identical request is already running: share its render
+    flight_key = cache_key or request_key(req.model_dump(), engine_version)
+    leader_id = singleflight.join(flight_key, task_id)
+    if leader_id is not None:
+        leader = dict(_task_get(leader_id) or {})
+        leader.pop("coalesced_requests", None)
+        _task_set(task_id, {**leader, "coalesced_with": leader_id})
+        _task_update(leader_id, {"coalesced_requests": len(singleflight.followers(leader_id))})
+        return {"task_id": task_id, "coalesced_with": leader_id}
+
+    try:
+        position = scheduler.submit(
+            task_id, lambda: run_generation(task_id, req, cache_key, flight_key),
+        )
+    except SchedulerFull as e:
+        singleflight.finish(flight_key, task_id)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # The job cannot start before this handler yields, so the record is
+    # always in place before run_generation's first update.
     _task_set(task_id, {
         "status": "pending",
         "progress": 0,
@@ -196,8 +364,7 @@ async def generate_music(req: GenerateRequest, background_tasks: BackgroundTasks
         "files": {},
     })
 
-    background_tasks.add_task(run_generation, task_id, req)
-    return {"task_id": task_id}
+    return {"task_id": task_id, "queue_position": position}
 
 
 @app.get("/status/{task_id}")
@@ -206,16 +373,69 @@ def get_status(task_id: str):
     task = _task_get(task_id)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    if task.get("status") == "pending":
+        queued_id = task.get("coalesced_with", task_id)
+        task = {**task, **scheduler.status_fields(queued_id)}
     return task
 
 
+@app.get("/status/{task_id}/events")
+async def stream_status(task_id: str):
+    """Server-Sent Events: status snapshot, then progress / log steps, then complete."""
+    events = task_events(task_events_hub, task_id, _task_get)
+    try:
+        first = await anext(events)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def sse():
+        try:
+            yield _sse_frame(*first)
+            async for event, data in events:
+                yield _sse_frame(event, data)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse_frame(event: str, data) -> str:
+    if event == "keepalive":
+        return ": keepalive\n\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.websocket("/status/{task_id}/ws")
+async def stream_status_ws(websocket: WebSocket, task_id: str):
+    """WebSocket variant of /events: one JSON {event, data} message per event."""
+    await websocket.accept()
+    events = task_events(task_events_hub, task_id, _task_get)
+    try:
+        async for event, data in events:
+            if event != "keepalive":
+                await websocket.send_json({"event": event, "data": data})
+        await websocket.close()
+    except KeyError:
+        await websocket.close(code=4404, reason="Task not found")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+
+
 @app.get("/download/{task_id}/{file_type}")
 def download_file(task_id: str, file_type: str):
-    """Download generated file (midi | midi_accomp | mp3 | wav)"""
+    """Download generated file (midi | midi_accomp | mp3 | wav | stem_<name> | preview)"""
     task = _task_get(task_id)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    if task["status"] != "completed":
+    # The preview is playable while the full render is still running
+    preview_ready = file_type == "preview" and task.get("preview_ready")
+    if task["status"] != "completed" and not preview_ready:
         raise HTTPException(status_code=400, detail="Task not completed")
 
     files = task.get("files", {})
@@ -224,9 +444,11 @@ def download_file(task_id: str, file_type: str):
         "midi_accomp": "accomp_midi",
         "mp3": "mp3",
         "wav": "wav",
+        "preview": "preview",
     }
 
-    file_key = file_type_map.get(file_type)
+    # Per-instrument stems are stored under their own type name
+    file_key = file_type if file_type.startswith("stem_") else file_type_map.get(file_type)
     if not file_key or file_key not in files:
         raise HTTPException(status_code=404, detail=f"File type '{file_type}' not available")
 
@@ -234,7 +456,74 @@ def download_file(task_id: str, file_type: str):
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found on disk")
 
-    return FileResponse(file_path, filename=f"{task_id}_{file_type}.{file_type.split('_')[0]}")
+    if file_type.startswith("stem_"):
+        ext = "wav"
+    elif file_type == "preview":
+        ext = Path(file_path).suffix.lstrip(".")
+    else:
+        ext = file_type.split("_")[0]
+    return FileResponse(file_path, filename=f"{task_id}_{file_type}.{ext}")
+
+
+_HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "audio/mp4",
+}
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+@app.get("/download/{task_id}/hls/{name}")
+def download_hls(task_id: str, name: str, request: Request):
+    """HLS playlist (playlist.m3u8) and its segments, with ETags and byte ranges."""
+    task = _task_get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Task not completed")
+
+    playlist = task.get("files", {}).get("hls")
+    if not playlist:
+        raise HTTPException(status_code=404, detail="File type 'hls' not available")
+    media_type = _HLS_MEDIA_TYPES.get(Path(name).suffix)
+    # Only plain file names from the task's own hls/ directory
+    if media_type is None or name != Path(name).name or name.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    path = Path(playlist).parent / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    return _ranged_file_response(request, str(path), media_type)
+
+
+def _ranged_file_response(request: Request, path: str, media_type: str) -> Response:
+    """Serve *path* honouring If-None-Match (304) and a single byte Range (206)."""
+    st = os.stat(path)
+    etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=86400"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    match = _RANGE_RE.match(request.headers.get("range", "").strip())
+    if_range = request.headers.get("if-range")
+    if not match or not any(match.groups()) or (if_range and if_range != etag):
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    first, last = match.groups()
+    size = st.st_size
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1   # suffix range: last N bytes
+    if start >= size or start > end:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(body, status_code=206, media_type=media_type, headers=headers)
 
 
 if __name__ == "__main__":
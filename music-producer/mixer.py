@@ -0,0 +1,294 @@
+"""Streaming NumPy mixer: stems -> gain -> sum -> limiter -> encoder.
+
+Replaces the pydub overlay, which decoded every track into memory as int16
+and clipped on overflow. Tracks are read block by block, scaled by their
+dB offset, summed in float32 (no intermediate clipping), run through a
+peak limiter to a ceiling just under full scale and streamed into the
+encoder, so memory stays bounded by MIX_BLOCK_FRAMES regardless of length.
+
+Sources are WAV paths (read with soundfile) or in-memory (n, channels)
+arrays. Encoders are ffmpeg over a stdin pipe (.mp3 / .ogg / .opus /
+.m4a / .aac, and .m3u8 for an HLS playlist of HLS_SEGMENT_SECONDS
+fragmented-MP4 segments) or soundfile for .wav. One ffmpeg process can
+write several outputs from the same stream.
+"""
+import logging
+import math
+import os
+import subprocess
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MIX_BLOCK_FRAMES = 65536      # ~1.5 s at 44.1 kHz
+CEILING_DB = -1.0             # limiter ceiling, dBFS
+LIMITER_WINDOW = 256          # frames per gain step
+LIMITER_RELEASE_SECONDS = 0.25
+
+MP3_BITRATE = '192k'
+
+HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', '4'))
+HLS_CODEC = os.getenv('HLS_CODEC', 'aac')      # aac | opus
+
+Source = Union[str, np.ndarray]
+
+
+def db_to_gain(db: float) -> float:
+    return 10.0 ** (db / 20.0)
+
+
+# -- Sources --
+
+class _FileSource:
+    def __init__(self, path: str):
+        import soundfile as sf
+        self._file = sf.SoundFile(path)
+        self.sample_rate = self._file.samplerate
+        self.frames = self._file.frames
+
+    def read(self, n: int) -> np.ndarray:
+        return self._file.read(n, dtype='float32', always_2d=True)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArraySource:
+    def __init__(self, audio: np.ndarray, sample_rate: int):
+        self._audio = audio if audio.ndim == 2 else audio[:, None]
+        self.sample_rate = sample_rate
+        self.frames = len(self._audio)
+        self._pos = 0
+
+    def read(self, n: int) -> np.ndarray:
+        block = self._audio[self._pos:self._pos + n]
+        self._pos += len(block)
+        return block
+
+    def close(self) -> None:
+        pass
+
+
+def to_stereo(block: np.ndarray) -> np.ndarray:
+    if block.shape[1] == 2:
+        return block
+    if block.shape[1] == 1:
+        return np.repeat(block, 2, axis=1)
+    return block[:, :2]
+
+
+# -- Limiter --
+
+class PeakLimiter:
+    """Block-vectorized peak limiter.
+
+    The gain is computed once per LIMITER_WINDOW frames: instant attack to
+    ceiling / window peak, exponential release back towards unity, linear
+    ramps between window gains. A final clip catches anything left over
+    from a ramp that starts above the gain a peak needs.
+    """
+
+    def __init__(self, sample_rate: int, ceiling_db: float = CEILING_DB,
+                 window: int = LIMITER_WINDOW, release_seconds: float = LIMITER_RELEASE_SECONDS):
+        self.ceiling = db_to_gain(ceiling_db)
+        self.window = window
+        windows_per_release = max(1.0, release_seconds * sample_rate / window)
+        # Gain recovers by this factor per window (about 1/e of the way back per release time)
+        self._release = math.exp(1.0 / windows_per_release)
+        self._gain = 1.0
+        self.max_reduction_db = 0.0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        n = len(block)
+        if n == 0:
+            return block
+        starts = np.arange(0, n, self.window)
+        peaks = np.maximum.reduceat(np.abs(block).max(axis=1), starts)
+        targets = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9))
+
+        gains = np.empty(len(starts) + 1, dtype=np.float64)
+        gains[0] = g = self._gain
+        for i, target in enumerate(targets):
+            g = target if target < g else min(target, g * self._release)
+            gains[i + 1] = g
+        self._gain = g
+        self.max_reduction_db = min(self.max_reduction_db, 20 * math.log10(max(gains.min(), 1e-9)))
+
+        if gains.min() >= 1.0:
+            out = block
+        else:
+            # Ramp from each window's starting gain to its target across the window
+            ends = np.append(starts[1:], n)
+            points = np.concatenate(([0], ends - 1))
+            per_frame = np.interp(np.arange(n), points, gains).astype(np.float32)
+            out = block * per_frame[:, None]
+        return np.clip(out, -self.ceiling, self.ceiling)
+
+
+# -- Encoders --
+
+_FFMPEG_CODECS = {
+    '.mp3':  ['-c:a', 'libmp3lame', '-b:a', MP3_BITRATE],
+    '.ogg':  ['-c:a', 'libopus', '-b:a', '96k'],
+    '.opus': ['-c:a', 'libopus', '-b:a', '96k'],
+    '.m4a':  ['-c:a', 'aac', '-b:a', '160k'],
+    '.aac':  ['-c:a', 'aac', '-b:a', '160k'],
+}
+
+
+def _hls_args(playlist: str) -> List[str]:
+    """Codec + muxer options for an HLS VOD playlist with fMP4 segments beside it."""
+    codec = ['-c:a', 'libopus', '-b:a', '96k'] if HLS_CODEC == 'opus' else ['-c:a', 'aac', '-b:a', '128k']
+    return [
+        *codec, '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', 'init.mp4',
+        '-hls_segment_filename', os.path.join(os.path.dirname(playlist), 'seg_%05d.m4s'),
+    ]
+
+
+class _FfmpegEncoder:
+    def __init__(self, outputs: List[tuple], sample_rate: int, channels: int):
+        """*outputs* is [(codec_args, path)]; every output encodes the same input."""
+        cmd = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+        ]
+        for codec_args, path in outputs:
+            cmd += [*codec_args, path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, block: np.ndarray) -> None:
+        self._proc.stdin.write(np.ascontiguousarray(block, dtype='<f4').tobytes())
+
+    def close(self) -> None:
+        _, err = self._proc.communicate(timeout=120)
+        if self._proc.returncode != 0:
+            raise RuntimeError(f'ffmpeg failed (rc={self._proc.returncode}): {err.decode()[:400]}')
+
+    def abort(self) -> None:
+        self._proc.kill()
+        self._proc.wait()
+
+
+class _WavEncoder:
+    def __init__(self, path: str, sample_rate: int, channels: int):
+        import soundfile as sf
+        self._file = sf.SoundFile(path, 'w', samplerate=sample_rate, channels=channels, subtype='PCM_16')
+
+    def write(self, block: np.ndarray) -> None:
+        self._file.write(block)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def abort(self) -> None:
+        self._file.close()
+
+
+def open_encoder(path: str, sample_rate: int, channels: int = 2, bitrate: Optional[str] = None,
+                 extra_outputs: Sequence[str] = ()):
+    """Return a streaming encoder for *path*, chosen by its extension.
+
+    *bitrate* (e.g. '48k') overrides the codec's default. *extra_outputs*
+    are encoded by the same ffmpeg process (not possible for .wav).
+    """
+    suffix = path[path.rfind('.'):].lower()
+    if suffix == '.wav' and not extra_outputs:
+        return _WavEncoder(path, sample_rate, channels)
+
+    outputs = []
+    for i, out in enumerate([path, *extra_outputs]):
+        suffix = out[out.rfind('.'):].lower()
+        if suffix == '.m3u8':
+            os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+            outputs.append((_hls_args(out), out))
+        elif suffix in _FFMPEG_CODECS:
+            codec_args = list(_FFMPEG_CODECS[suffix])
+            if bitrate and i == 0:
+                codec_args[-1] = bitrate
+            outputs.append((codec_args, out))
+        else:
+            raise ValueError(f'Unsupported output format: {out}')
+    return _FfmpegEncoder(outputs, sample_rate, channels)
+
+
+# -- Mixing --
+
+def mix(
+    sources: Sequence[Source],
+    output_path: str,
+    db_offsets: Optional[Sequence[float]] = None,
+    sample_rate: Optional[int] = None,
+    channels: int = 2,
+    bitrate: Optional[str] = None,
+    extra_outputs: Sequence[str] = (),
+) -> bool:
+    """
+    Mix *sources* (WAV paths or (n, ch) float arrays) into *output_path*.
+    *db_offsets* gives a dB adjustment per source (missing = 0). Arrays need
+    *sample_rate*; for files it is read from the first one. Shorter sources
+    are padded with silence. *channels* is 2, or 1 to fold the mix to mono.
+    *extra_outputs* (e.g. an HLS .m3u8) are encoded from the same mix.
+    Returns True on success.
+    """
+    if not sources:
+        logger.error('No tracks to mix.')
+        return False
+
+    opened = []
+    try:
+        for src in sources:
+            opened.append(_ArraySource(src, sample_rate) if isinstance(src, np.ndarray)
+                          else _FileSource(src))
+    except Exception as exc:
+        for s in opened:
+            s.close()
+        logger.error('Mixing failed opening sources: %s', exc)
+        return False
+
+    rates = {s.sample_rate for s in opened}
+    if len(rates) != 1 or None in rates:
+        for s in opened:
+            s.close()
+        logger.error('Cannot mix tracks with sample rates %s', sorted(map(str, rates)))
+        return False
+    rate = rates.pop()
+
+    offsets = list(db_offsets or [])
+    gains = [db_to_gain(offsets[i]) if i < len(offsets) else 1.0 for i in range(len(opened))]
+    total = max(s.frames for s in opened)
+    limiter = PeakLimiter(rate)
+
+    encoder = None
+    try:
+        encoder = open_encoder(output_path, rate, channels, bitrate, extra_outputs)
+        done = 0
+        while done < total:
+            n = min(MIX_BLOCK_FRAMES, total - done)
+            acc = np.zeros((n, 2), dtype=np.float32)
+            for src, gain in zip(opened, gains):
+                block = src.read(n)
+                if len(block):
+                    acc[:len(block)] += to_stereo(block) * np.float32(gain)
+            if channels == 1:
+                acc = acc.mean(axis=1, keepdims=True)
+            encoder.write(limiter.process(acc))
+            done += n
+        encoder.close()
+    except Exception as exc:
+        if encoder is not None:
+            encoder.abort()
+        logger.error('Mixing failed: %s', exc, exc_info=True)
+        return False
+    finally:
+        for s in opened:
+            s.close()
+
+    logger.info('Mixed %d track(s) -> %s (%.1f s, limiter max %.1f dB)',
+                len(opened), output_path, total / rate, limiter.max_reduction_db)
+    return True
@@ -0,0 +1,177 @@
+"""Pre-rendered note sample cache.
+
+The arrangements reuse a small set of note events: create_drum_pattern
+fires the same kick / snare / hat every bar, and pads repeat the same
+chords. NoteCacheSynth renders each distinct (program, pitch, velocity,
+duration bucket) once through the underlying synth (SynthPool or
+NumpySynth), keeps it as a .npy file on disk, and assembles tracks by
+adding the memory-mapped samples at each note's start sample.
+
+Layout:
+    <NOTE_CACHE_DIR>/<synth id>/<sample rate>/<key>.npy   float32 (n, 2)
+
+Files are published atomically, so several worker processes can share one
+cache directory; np.load(mmap_mode='r') lets them share the page cache too.
+
+Note durations are quantized to NOTE_CACHE_STEP seconds. Controllers and
+pitch bends are not applied to cached notes, which is why only drums are
+cached by default (RENDER_NOTE_CACHE=drums); 'all' also caches melodic
+instruments without controller / pitch-bend events, 'off' disables it.
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NOTE_CACHE_DIR = Path(os.getenv("NOTE_CACHE_DIR", "/tmp/music_note_cache"))
+NOTE_CACHE_MODE = os.getenv("RENDER_NOTE_CACHE", "drums")   # off | drums | all
+NOTE_CACHE_STEP = 0.025      # seconds per duration bucket
+SILENCE = 1e-4               # trailing samples below this are trimmed
+MAX_LOADED = 4096            # memory-mapped samples kept open per process
+
+NoteKey = Tuple[bool, int, int, int, int]   # (is_drum, program, pitch, velocity, bucket)
+
+
+def base_synth(synth):
+    """The synth under any wrappers (note cache, loop library)."""
+    while hasattr(synth, "synth"):
+        synth = synth.synth
+    return synth
+
+
+def synth_id(synth) -> str:
+    """Stable id of the sound source, so a SoundFont change starts a new cache."""
+    synth = base_synth(synth)
+    soundfont = getattr(synth, "soundfont", None)
+    if soundfont:
+        st = os.stat(soundfont)
+        digest = hashlib.sha1(f"{os.path.abspath(soundfont)}:{st.st_size}:{st.st_mtime_ns}".encode())
+        return f"sf-{digest.hexdigest()[:12]}"
+    return getattr(synth, "cache_tag", type(synth).__name__.lower())
+
+
+class NoteCacheSynth:
+    """Wraps a synth; renders cacheable instruments from per-note samples."""
+
+    def __init__(self, synth, root: Path = NOTE_CACHE_DIR, mode: str = NOTE_CACHE_MODE):
+        self.synth = synth
+        self.sample_rate = synth.sample_rate
+        self.mode = mode
+        self.dir = Path(root) / synth_id(synth) / str(self.sample_rate)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._loaded: Dict[NoteKey, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cacheable(self, inst) -> bool:
+        if self.mode == "all":
+            return not inst.control_changes and not inst.pitch_bends
+        return self.mode == "drums" and inst.is_drum
+
+    def _key(self, inst, note) -> NoteKey:
+        bucket = max(1, int(round((note.end - note.start) / NOTE_CACHE_STEP)))
+        return (inst.is_drum, 0 if inst.is_drum else inst.program, note.pitch, note.velocity, bucket)
+
+    def _render_note(self, key: NoteKey) -> np.ndarray:
+        import pretty_midi
+
+        is_drum, program, pitch, velocity, bucket = key
+        midi = pretty_midi.PrettyMIDI()
+        inst = pretty_midi.Instrument(program=program, is_drum=is_drum)
+        inst.notes.append(pretty_midi.Note(velocity, pitch, 0.0, bucket * NOTE_CACHE_STEP))
+        midi.instruments.append(inst)
+
+        audio = self.synth.render(midi)
+        loud = np.flatnonzero(np.abs(audio).max(axis=1) > SILENCE)
+        return np.ascontiguousarray(audio[:loud[-1] + 1 if len(loud) else 0], dtype=np.float32)
+
+    def sample(self, key: NoteKey) -> np.ndarray:
+        """Memory-mapped sample for *key*, rendering and storing it on a miss."""
+        with self._lock:
+            cached = self._loaded.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        is_drum, program, pitch, velocity, bucket = key
+        path = self.dir / f"{'d' if is_drum else 'p'}{program}_{pitch}_{velocity}_{bucket}.npy"
+        try:
+            audio = np.load(path, mmap_mode="r")
+            self.hits += 1
+        except (OSError, ValueError):
+            self.misses += 1
+            rendered = self._render_note(key)
+            tmp = path.with_name(f".tmp-{uuid.uuid4().hex}.npy")
+            np.save(tmp, rendered)
+            os.replace(tmp, path)
+            # Empty arrays cannot be memory-mapped
+            audio = np.load(path, mmap_mode="r") if len(rendered) else rendered
+
+        with self._lock:
+            if len(self._loaded) >= MAX_LOADED:
+                self._loaded.clear()
+            self._loaded[key] = audio
+        return audio
+
+    def render(self, midi) -> np.ndarray:
+        """Render a PrettyMIDI to float32 (n, 2): cached notes + live instruments."""
+        import pretty_midi
+
+        cached = [i for i in midi.instruments if self._cacheable(i)]
+        live = [i for i in midi.instruments if not self._cacheable(i)]
+
+        placements = []
+        for inst in cached:
+            for note in inst.notes:
+                start = int(round(note.start * self.sample_rate))
+                placements.append((start, self.sample(self._key(inst, note))))
+
+        live_audio = None
+        if live or not cached:
+            live_midi = pretty_midi.PrettyMIDI()
+            live_midi.instruments.extend(live)
+            live_audio = self.synth.render(live_midi)
+
+        length = max([s + len(a) for s, a in placements] + [len(live_audio) if live_audio is not None else 0])
+        out = np.zeros((length, 2), dtype=np.float32)
+        if live_audio is not None:
+            out[:len(live_audio)] += live_audio
+        for start, audio in placements:
+            out[start:start + len(audio)] += audio
+        return out
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "mode": self.mode,
+            "dir": str(self.dir),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loaded": len(self._loaded),
+        }
+
+
+_wrappers: Dict[int, NoteCacheSynth] = {}
+_wrappers_lock = threading.Lock()
+
+
+def wrap(synth):
+    """Return *synth* wrapped in its shared NoteCacheSynth, or as is when off."""
+    if NOTE_CACHE_MODE == "off" or synth is None:
+        return synth
+    with _wrappers_lock:
+        wrapper = _wrappers.get(id(synth))
+        if wrapper is None:
+            try:
+                wrapper = _wrappers[id(synth)] = NoteCacheSynth(synth)
+            except OSError as exc:
+                logger.warning("Note cache unavailable (%s); rendering live", exc)
+                return synth
+        return wrapper
@@ -0,0 +1,181 @@
+"""Dependency-free NumPy synthesizer.
+
+A small wavetable / ADSR synth that renders PrettyMIDI objects straight to
+NumPy arrays, for machines without fluidsynth or a SoundFont (dev boxes,
+CI, benchmarks) and as the fast preview renderer.
+
+Melodic instruments use one patch per General MIDI program family
+(program // 8): a single-cycle wavetable built from a few harmonics plus an
+ADSR envelope, optionally with an exponential decay for struck / plucked
+sounds. Drums map the engines.theory.DRUM_NOTES kit onto synthesized
+one-shots (sine sweeps and filtered noise), rendered once per sample rate.
+
+Every note is synthesized as one vectorized block and added at its start
+sample. Pitch bends and controllers are ignored. Output matches
+SynthPool.render: float32 (n_samples, 2).
+"""
+import functools
+import threading
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from engines.theory import DRUM_NOTES
+
+TABLE_SIZE = 2048
+RELEASE_TAIL_SECONDS = 1.0
+MASTER_GAIN = 0.18          # per voice at full velocity; keeps dense chords in range
+NOISE_SEED = 1234           # drum noise is deterministic
+
+
+@dataclass(frozen=True)
+class Patch:
+    harmonics: Tuple[float, ...]    # amplitude of partials 1, 2, 3, ...
+    attack: float                   # seconds
+    decay: float                    # seconds to fall to sustain
+    sustain: float                  # level 0..1
+    release: float                  # seconds
+    fade: float = 0.0               # exponential decay time constant while held (0 = none)
+    gain: float = 1.0
+
+
+# GM program family (program // 8) -> patch
+FAMILY_PATCHES: Dict[int, Patch] = {
+    0:  Patch((1.0, 0.5, 0.25, 0.12, 0.06), 0.005, 0.3, 0.4, 0.3, fade=1.2),      # piano
+    1:  Patch((1.0, 0.0, 0.4, 0.0, 0.2), 0.002, 0.2, 0.2, 0.4, fade=0.6),         # chromatic perc
+    2:  Patch((1.0, 0.8, 0.6, 0.4, 0.3, 0.2), 0.01, 0.05, 0.9, 0.08),             # organ
+    3:  Patch((1.0, 0.6, 0.3, 0.2, 0.1), 0.003, 0.2, 0.3, 0.2, fade=0.9),         # guitar
+    4:  Patch((1.0, 0.35, 0.1), 0.005, 0.15, 0.7, 0.1, gain=1.3),                 # bass
+    5:  Patch((1.0, 0.5, 0.33, 0.25, 0.2, 0.16), 0.12, 0.2, 0.8, 0.35, gain=0.7), # strings
+    6:  Patch((1.0, 0.5, 0.33, 0.25, 0.2), 0.25, 0.3, 0.85, 0.5, gain=0.6),       # ensemble
+    7:  Patch((1.0, 0.7, 0.5, 0.35, 0.25, 0.15), 0.04, 0.1, 0.8, 0.15),           # brass
+    8:  Patch((1.0, 0.1, 0.5, 0.05, 0.3), 0.03, 0.1, 0.8, 0.12),                  # reed
+    9:  Patch((1.0, 0.15, 0.05), 0.05, 0.1, 0.8, 0.15),                           # pipe
+    10: Patch((1.0, 0.5, 0.33, 0.25, 0.2, 0.17, 0.14), 0.01, 0.1, 0.8, 0.1),      # synth lead
+    11: Patch((1.0, 0.4, 0.2, 0.1), 0.3, 0.4, 0.8, 0.6, gain=0.6),                # synth pad
+}
+DEFAULT_PATCH = FAMILY_PATCHES[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _wavetable(harmonics: Tuple[float, ...]) -> np.ndarray:
+    phase = np.arange(TABLE_SIZE) * (2 * np.pi / TABLE_SIZE)
+    table = sum(a * np.sin((k + 1) * phase) for k, a in enumerate(harmonics))
+    return (table / np.abs(table).max()).astype(np.float32)
+
+
+def _envelope(patch: Patch, n_on: int, n_release: int, sample_rate: int) -> np.ndarray:
+    t = np.arange(n_on + n_release, dtype=np.float32) / sample_rate
+    env = np.interp(
+        t, [0.0, patch.attack, patch.attack + patch.decay], [0.0, 1.0, patch.sustain],
+    ).astype(np.float32)
+    if patch.fade:
+        env *= np.exp(-t / patch.fade)
+    off_level = env[n_on - 1] if n_on else 0.0
+    env[n_on:] = off_level * np.linspace(1.0, 0.0, n_release, dtype=np.float32)
+    return env
+
+
+def _voice(patch: Patch, pitch: int, n_on: int, sample_rate: int) -> np.ndarray:
+    n_release = int(patch.release * sample_rate)
+    freq = 440.0 * 2.0 ** ((pitch - 69) / 12.0)
+    step = freq * TABLE_SIZE / sample_rate
+    idx = (np.arange(n_on + n_release) * step).astype(np.int64) % TABLE_SIZE
+    return _wavetable(patch.harmonics)[idx] * _envelope(patch, n_on, n_release, sample_rate)
+
+
+# -- drum kit --
+
+def _decay(n: int, seconds: float, sample_rate: int) -> np.ndarray:
+    return np.exp(-np.arange(n) / (seconds * sample_rate)).astype(np.float32)
+
+
+def _sweep(f_start: float, f_end: float, seconds: float, sample_rate: int) -> np.ndarray:
+    n = int(seconds * sample_rate)
+    freq = f_end + (f_start - f_end) * _decay(n, seconds / 6, sample_rate)
+    return np.sin(2 * np.pi * np.cumsum(freq) / sample_rate).astype(np.float32)
+
+
+def _noise(seconds: float, sample_rate: int, bright: bool = False) -> np.ndarray:
+    rng = np.random.default_rng(NOISE_SEED)
+    noise = rng.uniform(-1.0, 1.0, int(seconds * sample_rate)).astype(np.float32)
+    # First difference: a cheap high-pass for cymbal-like brightness
+    return np.diff(noise, prepend=0.0).astype(np.float32) * 0.5 if bright else noise
+
+
+@functools.lru_cache(maxsize=None)
+def _drum_sample(note: int, sample_rate: int) -> np.ndarray:
+    sr = sample_rate
+    if note == DRUM_NOTES['kick']:
+        s = _sweep(150, 48, 0.45, sr)
+        return s * _decay(len(s), 0.12, sr)
+    if note in (DRUM_NOTES['snare'], DRUM_NOTES['clap']):
+        noise = _noise(0.25, sr) * _decay(int(0.25 * sr), 0.05, sr)
+        tone = _sweep(220, 180, 0.25, sr) * _decay(int(0.25 * sr), 0.04, sr)
+        return 0.7 * noise + 0.5 * tone
+    if note == DRUM_NOTES['rimshot']:
+        s = _sweep(1800, 1200, 0.05, sr)
+        return s * _decay(len(s), 0.008, sr)
+    if note == DRUM_NOTES['hihat_closed']:
+        s = _noise(0.08, sr, bright=True)
+        return s * _decay(len(s), 0.015, sr)
+    if note == DRUM_NOTES['hihat_open']:
+        s = _noise(0.4, sr, bright=True)
+        return s * _decay(len(s), 0.12, sr)
+    if note in (DRUM_NOTES['crash'], DRUM_NOTES['ride']):
+        seconds = 1.5 if note == DRUM_NOTES['crash'] else 0.8
+        s = _noise(seconds, sr, bright=True)
+        return 0.8 * s * _decay(len(s), seconds / 4, sr)
+    toms = {DRUM_NOTES['tom_low']: 90, DRUM_NOTES['tom_mid']: 130, DRUM_NOTES['tom_high']: 180}
+    if note in toms:
+        s = _sweep(toms[note] * 1.6, toms[note], 0.4, sr)
+        return s * _decay(len(s), 0.1, sr)
+    # Anything else on the drum channel: a short generic click
+    s = _noise(0.06, sr)
+    return 0.5 * s * _decay(len(s), 0.01, sr)
+
+
+# -- synth --
+
+class NumpySynth:
+    """Stateless renderer with the SynthPool.render interface."""
+
+    cache_tag = "numpy-1"   # bump when the sound changes (names the note_cache directory)
+
+    def __init__(self, sample_rate: int = 44100):
+        self.sample_rate = sample_rate
+
+    def render(self, midi) -> np.ndarray:
+        """Render a PrettyMIDI to a float32 (n_samples, 2) buffer."""
+        sr = self.sample_rate
+        voices = []
+        for inst in midi.instruments:
+            patch = FAMILY_PATCHES.get(inst.program // 8, DEFAULT_PATCH)
+            for note in inst.notes:
+                start = int(round(note.start * sr))
+                gain = MASTER_GAIN * (note.velocity / 127.0) ** 1.5
+                if inst.is_drum:
+                    audio = _drum_sample(note.pitch, sr)
+                else:
+                    n_on = max(1, int(round(note.end * sr)) - start)
+                    audio = _voice(patch, note.pitch, n_on, sr)
+                    gain *= patch.gain
+                voices.append((start, audio, gain))
+
+        length = max((s + len(a) for s, a, _ in voices), default=0)
+        out = np.zeros(length + int(RELEASE_TAIL_SECONDS * sr), dtype=np.float32)
+        for start, audio, gain in voices:
+            out[start:start + len(audio)] += audio * np.float32(gain)
+        return np.repeat(out[:, None], 2, axis=1)
+
+
+_synths: Dict[int, NumpySynth] = {}
+_synths_lock = threading.Lock()
+
+
+def get_synth(sample_rate: int = 44100) -> NumpySynth:
+    with _synths_lock:
+        if sample_rate not in _synths:
+            _synths[sample_rate] = NumpySynth(sample_rate)
+        return _synths[sample_rate]
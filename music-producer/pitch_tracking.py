@@ -0,0 +1,134 @@
+"""Pitch-tracking backends for AudioAnalyst.
+
+    accurate  librosa.pyin: probabilistic YIN + HMM Viterbi decoding over
+              many pitch candidates. Robust, but the slowest analysis step.
+    fast      vectorized YIN: the cumulative mean normalized difference of
+              every frame from batched NumPy FFT cross-correlations, then the
+              first dip under YIN_THRESHOLD, refined by parabolic interpolation.
+
+Both return (f0, voiced_flag) on the same frame grid (centered frames,
+FRAME_LENGTH / HOP_LENGTH), f0 in Hz with NaN where unvoiced, so the key
+and motif extractors need not care which one ran.
+
+Select with analysis_profile=fast|accurate (default ANALYSIS_PROFILE).
+bench/check_pitch_trackers.py checks that both agree on key and motif.
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+ANALYSIS_PROFILE = os.getenv("ANALYSIS_PROFILE", "accurate")
+PROFILES = ("fast", "accurate")
+
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512        # pyin's default, frame_length // 4
+FMIN = 65.41            # C2
+FMAX = 2093.0           # C7
+
+YIN_THRESHOLD = 0.1     # first CMND dip under this is the period
+VOICED_THRESHOLD = 0.25 # frames whose best dip stays above this are unvoiced
+SILENCE_DB = -50.0      # frames this far below the loudest one are unvoiced
+FRAME_BATCH = 512       # frames per FFT batch (bounds memory on long input)
+
+
+def frame_signal(y: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """Centered, zero-padded frames (n_frames, frame_length), as pyin frames them."""
+    padded = np.pad(y, frame_length // 2)
+    return np.lib.stride_tricks.sliding_window_view(padded, frame_length)[::hop_length]
+
+
+def _cmnd(frames: np.ndarray, max_lag: int) -> np.ndarray:
+    """YIN cumulative mean normalized difference, (n, max_lag + 1), for a batch."""
+    n_frames, frame_length = frames.shape
+    win = frame_length - max_lag
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + win)))
+
+    # acf[t] = sum_j x[j] x[j + t] over the integration window, for every lag at once
+    spectrum = np.fft.rfft(frames, n_fft) * np.conj(np.fft.rfft(frames[:, :win], n_fft))
+    acf = np.fft.irfft(spectrum, n_fft)[:, :max_lag + 1]
+
+    energy = np.cumsum(np.pad(frames ** 2, ((0, 0), (1, 0))), axis=1)
+    lags = np.arange(max_lag + 1)
+    e_lag = energy[:, lags + win] - energy[:, lags]     # window energy at each lag
+    diff = np.maximum(e_lag[:, :1] + e_lag - 2 * acf, 0.0)
+
+    cmnd = np.ones_like(diff)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmnd[:, 1:] = diff[:, 1:] * lags[1:] / np.maximum(running, 1e-12)
+    return cmnd
+
+
+def yin(
+    y: np.ndarray,
+    sr: int,
+    fmin: float = FMIN,
+    fmax: float = FMAX,
+    frame_length: int = FRAME_LENGTH,
+    hop_length: int = HOP_LENGTH,
+    frames: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized YIN. Returns (f0 Hz with NaN when unvoiced, voiced_flag).
+
+    *frames* is frame_signal(y) when the caller already has it.
+    """
+    if frames is None:
+        frames = frame_signal(np.asarray(y, dtype=np.float64), frame_length, hop_length)
+    min_lag = max(1, int(np.floor(sr / fmax)))
+    max_lag = min(int(np.ceil(sr / fmin)), frame_length // 2)
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    loud = 20 * np.log10(np.maximum(rms, 1e-10) / max(rms.max(), 1e-10)) > SILENCE_DB
+
+    f0 = np.full(len(frames), np.nan)
+    voiced = np.zeros(len(frames), dtype=bool)
+    rows = np.arange(min(FRAME_BATCH, len(frames)))
+    for start in range(0, len(frames), FRAME_BATCH):
+        cmnd = _cmnd(frames[start:start + FRAME_BATCH], max_lag)
+        n = len(cmnd)
+        search = cmnd[:, min_lag:max_lag]
+
+        # First local minimum under the threshold; else the global minimum
+        is_dip = (search < YIN_THRESHOLD) & (search <= cmnd[:, min_lag + 1:max_lag + 1])
+        first = np.argmax(is_dip, axis=1)
+        lag = np.where(is_dip.any(axis=1), first, np.argmin(search, axis=1)) + min_lag
+        best = cmnd[rows[:n], lag]
+
+        # Parabolic interpolation around the chosen lag
+        left = cmnd[rows[:n], np.maximum(lag - 1, 0)]
+        right = cmnd[rows[:n], np.minimum(lag + 1, max_lag)]
+        denom = left - 2 * best + right
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1, denom), 0.0)
+        period = lag + np.clip(shift, -1.0, 1.0)
+
+        ok = (best < VOICED_THRESHOLD) & loud[start:start + n]
+        voiced[start:start + n] = ok
+        f0[start:start + n] = np.where(ok, sr / period, np.nan)
+    return f0, voiced
+
+
+def pyin(y: np.ndarray, sr: int) -> Tuple[np.ndarray, np.ndarray]:
+    import librosa
+
+    f0, voiced_flag, _ = librosa.pyin(
+        y, sr=sr,
+        fmin=librosa.note_to_hz("C2"),
+        fmax=librosa.note_to_hz("C7"),
+        frame_length=FRAME_LENGTH,
+    )
+    return f0, voiced_flag
+
+
+def track_pitch(
+    y: np.ndarray,
+    sr: int,
+    profile: str = ANALYSIS_PROFILE,
+    frames: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(f0, voiced_flag) of *y* with the tracker for *profile* (fast | accurate).
+
+    *frames* (frame_signal(y)) is reused by the fast tracker; pyin frames itself.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown analysis profile: {profile}")
+    return yin(y, sr, frames=frames) if profile == "fast" else pyin(y, sr)
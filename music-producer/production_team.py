@@ -8,6 +8,7 @@ from __future__ import annotations
 
 import logging
 import os
+import random
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple
@@ -17,7 +18,7 @@ import pretty_midi
 from audio_analyzer import AnalysisResult, AudioAnalyst, default_analysis
 from engines.theory_composer import MelodyComposer
 from engines.accompaniment import build_full_accompaniment
-from renderer import render_all
+from renderer import render_all, render_preview
 
 logger = logging.getLogger(__name__)
 
@@ -87,24 +88,40 @@ class MusicDirector:
         out_dir: Optional[str] = None,
         output_dir: Optional[str] = None,
         soundfont: str = 'soundfonts/GeneralUser.sf2',
-        on_progress: Optional[Callable[[int, List[Dict[str, str]]], None]] = None,
+        on_progress: Optional[Callable[..., None]] = None,
+        seed: Optional[int] = None,
+        stems: bool = False,
+        quality: str = 'full',
     ) -> Dict[str, Any]:
         """Run full production pipeline and return result dict.
 
         on_progress(progress_pct, log_steps) is called after each step so the
         caller can push incremental updates to the task store without waiting
         for the whole pipeline to finish.
+
+        With a *seed* the arrangement is fully reproducible, which is what
+        makes generation results cacheable. With *stems* every instrument is
+        also rendered to its own WAV (files 'stem_<name>').
+
+        With quality='preview' a quick low-rate mono draft is rendered before
+        the full render; on_progress is then called once with a third
+        argument, {'preview_ready': True, 'files': {...}}, so the caller can
+        offer it while the full render runs.
         """
+        rng = random.Random(seed) if seed is not None else None
         # Support both out_dir and output_dir parameter names
         final_output_dir = out_dir or output_dir or '/app/output/default'
 
         log = ProductionLog()
         Path(final_output_dir).mkdir(parents=True, exist_ok=True)
 
-        def _notify(pct: int) -> None:
+        def _notify(pct: int, fields: Optional[Dict[str, Any]] = None) -> None:
             if on_progress:
                 try:
-                    on_progress(pct, log.to_list())
+                    if fields:
+                        on_progress(pct, log.to_list(), fields)
+                    else:
+                        on_progress(pct, log.to_list())
                 except Exception as exc:
                     logger.warning('on_progress callback error: %s', exc)
 
@@ -128,7 +145,7 @@ class MusicDirector:
         _notify(45)
 
         # -- Step 3: Arrangement (accompaniment) (45 → 60 %) --
-        accomp_midi, chord_seq = self._arrange(effective_key, style, bars, effective_bpm, log)
+        accomp_midi, chord_seq = self._arrange(effective_key, style, bars, effective_bpm, log, rng)
         _notify(60)
 
         # -- Step 4: Build main melody MIDI (60 → 65 %) --
@@ -139,18 +156,29 @@ class MusicDirector:
         db_offsets = self._producer_mix(bars, style, analysis, log)
         _notify(70)
 
+        # -- Step 5b: Preview draft (70 → 75 %) --
+        files: Dict[str, str] = {}
+        if quality == 'preview':
+            preview = self._render_preview(
+                main_midi, accomp_midi, final_output_dir, soundfont, db_offsets, log,
+            )
+            if preview:
+                files['preview'] = preview
+                _notify(75, {'preview_ready': True, 'files': dict(files)})
+
         # -- Step 6: Render (70 → 95 %) — slowest step (FluidSynth) --
         logger.info('Starting render (FluidSynth MIDI→WAV→MP3) — this may take 10-60 s ...')
-        files = self._render(
+        files.update(self._render(
             main_midi, accomp_midi,
-            final_output_dir, soundfont, db_offsets, log,
-        )
+            final_output_dir, soundfont, db_offsets, log, stems,
+        ))
         _notify(95)
 
         return {
             'files': files,
             'log': log.to_list(),
-            'has_audio': bool(files.get('mp3') or files.get('main_wav')),
+            'has_audio': bool(files.get('mp3') or files.get('wav') or files.get('main_wav')),
+            'quality': quality,
             'analysis': {
                 'key': analysis.key,
                 'scale': analysis.scale,
@@ -240,8 +268,9 @@ class MusicDirector:
         bars: int,
         bpm: float,
         log: ProductionLog,
+        rng: Optional[random.Random] = None,
     ) -> Tuple[pretty_midi.PrettyMIDI, Any]:
-        accomp_midi, chord_seq = build_full_accompaniment(key, style, bars, bpm)
+        accomp_midi, chord_seq = build_full_accompaniment(key, style, bars, bpm, rng)
 
         log.add(
             'Arranger', '🎸',
@@ -296,6 +325,23 @@ class MusicDirector:
         )
         return {'melody': melody_db, 'accompaniment': accomp_db}
 
+    def _render_preview(
+        self,
+        main_midi: pretty_midi.PrettyMIDI,
+        accomp_midi: pretty_midi.PrettyMIDI,
+        output_dir: str,
+        soundfont: str,
+        db_offsets: Dict[str, float],
+        log: ProductionLog,
+    ) -> Optional[str]:
+        preview = render_preview(main_midi, accomp_midi, output_dir, soundfont, db_offsets)
+        log.add(
+            'Render Engineer', '⚡',
+            '快速試聽版',
+            f'Mono preview {Path(preview).name} — 完整版渲染中' if preview else '試聽版生成失敗，繼續完整渲染',
+        )
+        return preview
+
     def _render(
         self,
         main_midi: pretty_midi.PrettyMIDI,
@@ -304,6 +350,7 @@ class MusicDirector:
         soundfont: str,
         db_offsets: Dict[str, float],
         log: ProductionLog,
+        stems: bool = False,
     ) -> Dict[str, str]:
         out = Path(output_dir)
 
@@ -326,6 +373,8 @@ class MusicDirector:
             accomp_midi_path=accomp_path,
             output_dir=output_dir,
             soundfont=soundfont,
+            stems=stems,
+            db_offsets=db_offsets,
         )
 
         files: Dict[str, str] = {
@@ -1,9 +1,29 @@
-"""MIDI -> WAV/MP3 renderer via FluidSynth CLI + pydub mixer."""
+"""MIDI -> WAV/MP3 renderer via FluidSynth + streaming NumPy mixer.
+
+MIDI is rendered by a resident in-process synthesizer pool (synth_pool.py)
+when pyfluidsynth is available, by the fluidsynth CLI otherwise, and by the
+built-in NumPy synth (numpy_synth.py) when there is no SoundFont or
+fluidsynth at all. In-process synths are wrapped by the per-note sample
+cache (note_cache.py) and, where a library was built, tile drums and bass
+from pre-rendered loops (loop_library.py). Tracks are mixed and encoded by
+mixer.py.
+"""
 import logging
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+import loop_library
+import mixer
+import note_cache
+import numpy_synth
+import segments
+import synth_pool
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +41,29 @@ SOUNDFONT_DOWNLOAD_URLS = [
 
 MIN_SF2_SIZE = 100 * 1024   # 100 KB sanity check (auto-download detection)
 
+# Concurrent MIDI renders per job (tracks or stems); pool renders and CLI
+# subprocesses both run outside the GIL
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(max(2, synth_pool.POOL_SIZE))))
+
+# render_all default: keep per-track WAVs (main.wav / accompaniment.wav) on
+# disk, or pipe synth buffers straight through the mixer into the encoder
+KEEP_WAVS = os.getenv('RENDER_KEEP_WAVS', '0') == '1'
+
+# Tracks longer than this many bars are rendered as concurrent segments
+# (0 disables segmenting)
+SEGMENT_BARS = int(os.getenv('RENDER_SEGMENT_BARS', '8'))
+
+# Also write the master as an HLS playlist + short segments (hls/) for
+# progressive playback; see mixer.HLS_SEGMENT_SECONDS / HLS_CODEC
+RENDER_HLS = os.getenv('RENDER_HLS', '1') == '1'
+
+# Preview tier: low rate, mono, optionally a lighter SoundFont, small file
+PREVIEW_RENDERER = os.getenv('PREVIEW_RENDERER', 'numpy')     # numpy | auto (SoundFont)
+PREVIEW_SOUNDFONT = os.getenv('PREVIEW_SOUNDFONT')           # default: the full one
+PREVIEW_SAMPLE_RATE = int(os.getenv('PREVIEW_SAMPLE_RATE', '22050'))
+PREVIEW_FORMAT = os.getenv('PREVIEW_FORMAT', 'mp3')           # mp3 | ogg (Opus)
+PREVIEW_BITRATE = os.getenv('PREVIEW_BITRATE', '48k')
+
 
 def download_soundfont(path: Path = SOUNDFONT_PATH) -> bool:
     """
@@ -80,6 +123,58 @@ def check_fluidsynth() -> bool:
 
 # -- MIDI rendering --
 
+def warm_synth_pool(soundfont: str = str(SOUNDFONT_PATH), sample_rate: int = 44100) -> None:
+    """Load the SoundFont into the synth pool now instead of on the first render."""
+    if Path(soundfont).exists():
+        synth_pool.get_pool(soundfont, sample_rate)
+
+
+def render_midi(midi, soundfont: str = str(SOUNDFONT_PATH), sample_rate: int = 44100):
+    """
+    Render a PrettyMIDI object to a float32 (n_samples, 2) NumPy buffer with
+    the in-process synth chosen by select_synth. Returns None if there is
+    none (CLI-only setups).
+    """
+    synth = select_synth(soundfont, sample_rate)
+    return synth.render(midi) if synth is not None else None
+
+
+_fluidsynth_cli: Optional[bool] = None
+
+
+def select_synth(soundfont: str, sample_rate: int = 44100, backend: Optional[str] = None):
+    """
+    Pick the in-process synth for a render, per *backend* (default
+    RENDER_BACKEND): the SoundFont synth pool, the NumPy synth, or None to
+    use the fluidsynth CLI. 'auto' falls back to the NumPy synth when there
+    is neither a SoundFont nor fluidsynth to render with. The synth is
+    wrapped by note_cache unless RENDER_NOTE_CACHE=off, and by loop_library
+    when a loop library exists for it.
+    """
+    return loop_library.wrap(note_cache.wrap(_base_synth(soundfont, sample_rate, backend)))
+
+
+def _base_synth(soundfont: str, sample_rate: int, backend: Optional[str]):
+    global _fluidsynth_cli
+    backend = backend or synth_pool.RENDER_BACKEND
+    if backend == 'numpy':
+        return numpy_synth.get_synth(sample_rate)
+
+    if Path(soundfont).exists():
+        pool = synth_pool.get_pool(soundfont, sample_rate)
+        if pool is not None or backend != 'auto':
+            return pool
+        if _fluidsynth_cli is None:
+            _fluidsynth_cli = check_fluidsynth()
+        if _fluidsynth_cli:
+            return None
+    elif backend != 'auto':
+        return None
+
+    logger.info('No SoundFont / fluidsynth available: rendering with the NumPy synth')
+    return numpy_synth.get_synth(sample_rate)
+
+
 def midi_to_wav(
     midi_path: str,
     wav_path: str,
@@ -87,13 +182,53 @@ def midi_to_wav(
     sample_rate: int = 44100,
 ) -> bool:
     """
-    Render *midi_path* -> *wav_path* using FluidSynth CLI.
-    Returns True on success.
+    Render *midi_path* -> *wav_path*, through the synth pool when available
+    and the FluidSynth CLI otherwise. Returns True on success.
     """
     if not Path(soundfont).exists():
         logger.error('SoundFont not found: %s', soundfont)
         return False
 
+    pool = synth_pool.get_pool(soundfont, sample_rate)
+    if pool is not None:
+        import pretty_midi
+        if _render_with_pool(pool, pretty_midi.PrettyMIDI(midi_path), wav_path):
+            return True
+        if synth_pool.RENDER_BACKEND == 'pool':
+            return False
+
+    return _midi_to_wav_cli(midi_path, wav_path, soundfont, sample_rate)
+
+
+def _midi_object_to_wav_cli(midi, wav_path: str, soundfont: str, sample_rate: int) -> bool:
+    midi_path = str(Path(wav_path).with_suffix('.mid'))
+    midi.write(midi_path)
+    try:
+        return _midi_to_wav_cli(midi_path, wav_path, soundfont, sample_rate)
+    finally:
+        Path(midi_path).unlink(missing_ok=True)
+
+
+def _render_with_pool(pool, midi, wav_path: str) -> bool:
+    try:
+        import soundfile as sf
+
+        audio = pool.render(midi)
+        sf.write(wav_path, audio, pool.sample_rate, subtype='PCM_16')
+        logger.info('Rendered MIDI -> WAV (synth pool): %s', wav_path)
+        return True
+    except Exception as exc:
+        logger.warning('Synth pool render failed for %s: %s', wav_path, exc)
+        return False
+
+
+def _midi_to_wav_cli(
+    midi_path: str,
+    wav_path: str,
+    soundfont: str,
+    sample_rate: int,
+) -> bool:
+    """Render with the FluidSynth CLI (one process and SoundFont load per call)."""
     # FluidSynth 2.x: flags (-F, -r) must come BEFORE soundfont and midi arguments
     cmd = [
         'fluidsynth',
@@ -127,93 +262,324 @@ def mix_wav_files(
     db_offsets: Optional[List[float]] = None,
 ) -> bool:
     """
-    Overlay multiple WAV files and export as MP3 192 kbps.
+    Mix multiple WAV files and export (MP3 192 kbps for a .mp3 path).
     *db_offsets* is a list of dB adjustments per track (0 = unchanged).
-    Returns True on success.
+    Streams block by block through mixer.mix. Returns True on success.
     """
-    try:
-        from pydub import AudioSegment
-    except ImportError:
-        logger.error('pydub not installed. Run: pip install pydub')
+    valid = [
+        (w, db_offsets[i] if db_offsets and i < len(db_offsets) else 0.0)
+        for i, w in enumerate(wav_files)
+        if Path(w).exists() and Path(w).stat().st_size > 0
+    ]
+    if not valid:
+        logger.error('No valid WAV files found.')
         return False
 
-    if not wav_files:
-        logger.error('No WAV files to mix.')
-        return False
+    return mixer.mix([w for w, _ in valid], output_path, [db for _, db in valid])
 
-    valid_wavs = [w for w in wav_files if Path(w).exists() and Path(w).stat().st_size > 0]
-    if not valid_wavs:
-        logger.error('No valid WAV files found.')
-        return False
 
-    try:
-        mixed: AudioSegment = AudioSegment.from_wav(valid_wavs[0])
-        if db_offsets and db_offsets[0] != 0:
-            mixed = mixed + db_offsets[0]
-
-        for i, wav_path in enumerate(valid_wavs[1:], start=1):
-            seg = AudioSegment.from_wav(wav_path)
-            if db_offsets and i < len(db_offsets) and db_offsets[i] != 0:
-                seg = seg + db_offsets[i]
-            # Pad shorter track to match length
-            if len(seg) < len(mixed):
-                seg = seg + AudioSegment.silent(duration=len(mixed) - len(seg))
-            elif len(mixed) < len(seg):
-                mixed = mixed + AudioSegment.silent(duration=len(seg) - len(mixed))
-            mixed = mixed.overlay(seg)
-
-        mixed.export(output_path, format='mp3', bitrate='192k')
-        logger.info('Exported MP3: %s', output_path)
-        return True
+# -- Stems --
 
-    except Exception as exc:
-        logger.error('Mixing failed: %s', exc, exc_info=True)
-        return False
+def split_stems(midi) -> Dict[str, object]:
+    """
+    Split a PrettyMIDI into one single-instrument PrettyMIDI per instrument,
+    keyed by a slug of the instrument name ('piano', 'strings', 'drums', ...).
+    """
+    import pretty_midi
+
+    _, tempi = midi.get_tempo_changes()
+    tempo = float(tempi[0]) if len(tempi) else 120.0
+
+    stems: Dict[str, object] = {}
+    for inst in midi.instruments:
+        base = re.sub(r'[^a-z0-9]+', '_', inst.name.lower()).strip('_')
+        if not base:
+            base = 'drums' if inst.is_drum else f'program_{inst.program}'
+        name, n = base, 2
+        while name in stems:
+            name, n = f'{base}_{n}', n + 1
+
+        stem = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+        stem.instruments.append(inst)
+        stems[name] = stem
+    return stems
+
+
+def render_stems(
+    stems: Dict[str, object],
+    output_dir: str,
+    soundfont: str = str(SOUNDFONT_PATH),
+) -> Dict[str, str]:
+    """
+    Render each stem to <output_dir>/<name>.wav concurrently.
+    Returns {name: wav_path} for the stems that rendered.
+    """
+    _, wavs = render_tracks(stems, soundfont, wav_dir=output_dir)
+    return wavs
+
+
+def render_tracks(
+    tracks: Dict[str, object],
+    soundfont: str = str(SOUNDFONT_PATH),
+    wav_dir: Optional[str] = None,
+    sample_rate: int = 44100,
+    segment_bars: int = SEGMENT_BARS,
+    backend: Optional[str] = None,
+) -> Tuple[Dict[str, mixer.Source], Dict[str, str]]:
+    """
+    Render PrettyMIDI *tracks* concurrently into mixer sources.
+
+    Tracks longer than *segment_bars* bars are cut into segments at bar
+    boundaries (segments.py); every segment of every track is a separate
+    job on the RENDER_WORKERS pool, and each track is stitched back by
+    sample-accurate overlap-add.
+
+    The synth comes from select_synth(*backend*). With an in-process synth
+    (pool or NumPy) a source is the in-memory buffer and nothing touches the
+    disk unless *wav_dir* is given, in which case <wav_dir>/<name>.wav is
+    written as well. CLI renders go through a temporary directory.
+
+    Returns ({name: array | wav_path}, {name: kept wav_path}) for the tracks
+    that rendered.
+    """
+    import soundfile as sf
+
+    synth = select_synth(soundfont, sample_rate, backend)
+    if synth is None and not Path(soundfont).exists():
+        logger.error('SoundFont not found: %s', soundfont)
+        return {}, {}
+    if wav_dir:
+        os.makedirs(wav_dir, exist_ok=True)
+
+    jobs = [
+        (name, index, offset, segment)
+        for name, midi in tracks.items()
+        for index, (offset, segment) in enumerate(segments.split_segments(midi, segment_bars, sample_rate))
+    ]
+    segmented = {name for name, index, _, _ in jobs if index > 0}
+
+    with tempfile.TemporaryDirectory(prefix='render-') as scratch:
+        def render_job(job):
+            name, index, _, midi = job
+            if synth is not None:
+                try:
+                    return synth.render(midi)
+                except Exception as exc:
+                    logger.warning('Synth render failed for %s[%d]: %s', name, index, exc)
+                    # Only a failed SoundFont pool falls back to the CLI, not
+                    # the NumPy synth; look through the cache wrappers for it
+                    base = note_cache.base_synth(synth)
+                    if not isinstance(base, synth_pool.SynthPool) or synth_pool.RENDER_BACKEND == 'pool':
+                        return None
+
+            # An unsegmented track with a wav_dir is rendered straight into place
+            direct = bool(wav_dir) and name not in segmented
+            wav_path = (os.path.join(wav_dir, f'{name}.wav') if direct
+                        else os.path.join(scratch, f'{name}.{index}.wav'))
+            if not _midi_object_to_wav_cli(midi, wav_path, soundfont, sample_rate):
+                return None
+            return wav_path if direct else sf.read(wav_path, dtype='float32', always_2d=True)[0]
+
+        with ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='render') as pool:
+            rendered = list(pool.map(render_job, jobs))
+
+    sources: Dict[str, mixer.Source] = {}
+    for name in tracks:
+        pieces = [(offset, out) for (n, _, offset, _), out in zip(jobs, rendered) if n == name]
+        if not pieces or any(out is None for _, out in pieces):
+            logger.error('Render failed for track %s', name)
+            continue
+        if name in segmented:
+            sources[name] = segments.overlap_add([(o, mixer.to_stereo(a)) for o, a in pieces])
+        else:
+            sources[name] = pieces[0][1]
+        if wav_dir and not isinstance(sources[name], str):
+            sf.write(os.path.join(wav_dir, f'{name}.wav'), sources[name], sample_rate, subtype='PCM_16')
+
+    kept = {name: os.path.join(wav_dir, f'{name}.wav') for name in sources} if wav_dir else {}
+    return sources, kept
 
 
 # -- High-level render pipeline --
 
+# Used when the caller passes no producer mix decisions
+DEFAULT_DB_OFFSETS = {'melody': 0.0, 'accompaniment': -3.0}
+
+
 def render_all(
     main_midi_path: str,
     accomp_midi_path: str,
     output_dir: str,
     soundfont: str = str(SOUNDFONT_PATH),
+    stems: bool = False,
+    db_offsets: Optional[Dict[str, float]] = None,
+    keep_wavs: Optional[bool] = None,
 ) -> Dict[str, Optional[str]]:
     """
     Full render pipeline:
-      1. MIDI -> WAV for each track
-      2. Mix WAV tracks -> MP3
+      1. MIDI -> audio for each track, rendered concurrently
+      2. Mix tracks -> MP3
+
+    With *keep_wavs* (default: RENDER_KEEP_WAVS) each track is also written
+    to main.wav / accompaniment.wav. Otherwise synthesized
+    PCM goes straight through the mixer into the encoder and only the MP3 is
+    written (output.wav instead if the encoder is unavailable). With
+    RENDER_HLS the same mix is also written as hls/playlist.m3u8 plus short
+    segments (returned as 'hls').
+
+    With *stems* every instrument is rendered to its own WAV under
+    <output_dir>/stems/ (returned as 'stem_<name>') and the MP3 is mixed
+    from the stems.
+
+    *db_offsets* ({'melody': dB, 'accompaniment': dB}, from the producer's
+    mix decisions) sets the level of each track in the mix.
 
     Returns a dict of {label: file_path | None}.
     """
     os.makedirs(output_dir, exist_ok=True)
+    levels = {**DEFAULT_DB_OFFSETS, **(db_offsets or {})}
+    keep = KEEP_WAVS if keep_wavs is None else keep_wavs
+    if stems:
+        return _render_all_stems(main_midi_path, accomp_midi_path, output_dir, soundfont, levels)
+    if not keep:
+        return _render_all_piped(main_midi_path, accomp_midi_path, output_dir, soundfont, levels)
+
     results: Dict[str, Optional[str]] = {
         'main_wav':   None,
         'accomp_wav': None,
         'mp3':        None,
     }
 
-    wav_files: List[str] = []
-    db_offsets: List[float] = []
-
-    # Render main melody
-    main_wav = os.path.join(output_dir, 'main.wav')
-    if midi_to_wav(main_midi_path, main_wav, soundfont):
-        results['main_wav'] = main_wav
-        wav_files.append(main_wav)
-        db_offsets.append(0.0)
-
-    # Render accompaniment
-    accomp_wav = os.path.join(output_dir, 'accompaniment.wav')
-    if midi_to_wav(accomp_midi_path, accomp_wav, soundfont):
-        results['accomp_wav'] = accomp_wav
-        wav_files.append(accomp_wav)
-        db_offsets.append(-3.0)   # -3 dB -- slightly behind melody
-
-    # Mix everything to MP3
-    if wav_files:
-        mp3_path = os.path.join(output_dir, 'output.mp3')
-        if mix_wav_files(wav_files, mp3_path, db_offsets):
-            results['mp3'] = mp3_path
+    import pretty_midi
+    tracks = {
+        'main': pretty_midi.PrettyMIDI(main_midi_path),
+        'accompaniment': pretty_midi.PrettyMIDI(accomp_midi_path),
+    }
+    sources, wavs = render_tracks(tracks, soundfont, wav_dir=output_dir)
+    results['main_wav'] = wavs.get('main')
+    results['accomp_wav'] = wavs.get('accompaniment')
+
+    # Mix everything to MP3, from the in-memory buffers where there are any
+    if sources:
+        track_db = [levels['melody'] if name == 'main' else levels['accompaniment'] for name in sources]
+        results.update(_mix_master(sources, output_dir, track_db))
 
     return results
+
+
+def render_preview(
+    main_midi,
+    accomp_midi,
+    output_dir: str,
+    soundfont: str = str(SOUNDFONT_PATH),
+    db_offsets: Optional[Dict[str, float]] = None,
+) -> Optional[str]:
+    """
+    Quick draft of the mix from in-memory PrettyMIDI objects: rendered at
+    PREVIEW_SAMPLE_RATE by PREVIEW_RENDERER (the NumPy synth by default, or
+    the SoundFont path using PREVIEW_SOUNDFONT if set), folded to mono and
+    encoded as a small PREVIEW_FORMAT file. Returns its path, or None.
+    """
+    levels = {**DEFAULT_DB_OFFSETS, **(db_offsets or {})}
+    preview_sf = PREVIEW_SOUNDFONT if PREVIEW_SOUNDFONT and Path(PREVIEW_SOUNDFONT).exists() else soundfont
+    tracks = {'melody': main_midi, 'accompaniment': accomp_midi}
+
+    sources, _ = render_tracks(tracks, preview_sf, sample_rate=PREVIEW_SAMPLE_RATE,
+                               segment_bars=0, backend=PREVIEW_RENDERER)
+    if not sources:
+        return None
+
+    track_db = [levels[name] for name in sources]
+    suffix = 'ogg' if PREVIEW_FORMAT in ('ogg', 'opus') else 'mp3'
+    path = os.path.join(output_dir, f'preview.{suffix}')
+    if mixer.mix(list(sources.values()), path, track_db, sample_rate=PREVIEW_SAMPLE_RATE,
+                 channels=1, bitrate=PREVIEW_BITRATE):
+        return path
+
+    # Encoder unavailable: a low-rate mono WAV is still small and playable
+    path = os.path.join(output_dir, 'preview.wav')
+    if mixer.mix(list(sources.values()), path, track_db, sample_rate=PREVIEW_SAMPLE_RATE, channels=1):
+        return path
+    return None
+
+
+def _render_all_piped(
+    main_midi_path: str,
+    accomp_midi_path: str,
+    output_dir: str,
+    soundfont: str,
+    levels: Dict[str, float],
+) -> Dict[str, Optional[str]]:
+    """Synth buffers -> mixer -> encoder pipe; no WAV files are kept."""
+    import pretty_midi
+
+    tracks = {
+        'melody': pretty_midi.PrettyMIDI(main_midi_path),
+        'accompaniment': pretty_midi.PrettyMIDI(accomp_midi_path),
+    }
+    results: Dict[str, Optional[str]] = {'mp3': None}
+
+    sources, _ = render_tracks(tracks, soundfont)
+    if not sources:
+        return results
+
+    track_db = [levels[name] for name in sources]
+    results.update(_mix_master(sources, output_dir, track_db))
+    return results
+
+
+def _render_all_stems(
+    main_midi_path: str,
+    accomp_midi_path: str,
+    output_dir: str,
+    soundfont: str,
+    levels: Dict[str, float],
+) -> Dict[str, Optional[str]]:
+    import pretty_midi
+
+    melody = pretty_midi.PrettyMIDI(main_midi_path)
+    accomp_stems = split_stems(pretty_midi.PrettyMIDI(accomp_midi_path))
+    all_stems = {'melody': melody}
+    for name, stem in accomp_stems.items():
+        all_stems[name if name not in all_stems else f'accomp_{name}'] = stem
+
+    sources, stem_wavs = render_tracks(all_stems, soundfont, wav_dir=os.path.join(output_dir, 'stems'))
+
+    results: Dict[str, Optional[str]] = {
+        'main_wav': stem_wavs.get('melody'),
+        'mp3':      None,
+    }
+    results.update({f'stem_{name}': path for name, path in stem_wavs.items()})
+
+    # Same balance as the two-track mix: every accompaniment stem at its level.
+    # Mixed from the in-memory buffers when the synth pool produced them.
+    track_db = [levels['melody'] if name == 'melody' else levels['accompaniment']
+                for name in sources]
+    if sources:
+        results.update(_mix_master(sources, output_dir, track_db))
+
+    return results
+
+
+def _mix_master(sources: Dict[str, mixer.Source], output_dir: str, track_db: List[float]) -> Dict[str, str]:
+    """
+    Mix *sources* to output.mp3 and, with RENDER_HLS, an HLS playlist of
+    short segments under hls/ encoded from the same stream. Falls back to
+    output.wav when the encoder is unavailable.
+    """
+    mp3_path = os.path.join(output_dir, 'output.mp3')
+    if RENDER_HLS:
+        playlist = os.path.join(output_dir, 'hls', 'playlist.m3u8')
+        if mixer.mix(list(sources.values()), mp3_path, track_db, sample_rate=44100,
+                     extra_outputs=[playlist]):
+            return {'mp3': mp3_path, 'hls': playlist}
+        shutil.rmtree(os.path.dirname(playlist), ignore_errors=True)
+
+    if mixer.mix(list(sources.values()), mp3_path, track_db, sample_rate=44100):
+        return {'mp3': mp3_path}
+
+    # Encoder unavailable: keep the mix playable as a WAV instead
+    wav_path = os.path.join(output_dir, 'output.wav')
+    if mixer.mix(list(sources.values()), wav_path, track_db, sample_rate=44100):
+        return {'wav': wav_path}
+    return {}
@@ -0,0 +1,171 @@
+"""Content-addressed cache of finished generation results.
+
+A seeded generation request is deterministic, so its artifacts can be
+reused. Entries are keyed by a SHA-256 of the normalized request plus the
+engine version and CACHE_VERSION, and laid out as:
+
+    <root>/<key>/meta.json     -- result dict with file paths made relative
+    <root>/<key>/<artifacts>   -- main.mid, output.mp3, ...
+    <root>/<key>/hls/          -- an HLS playlist is stored with its whole
+                                  directory (init.mp4, seg_*.m4s)
+
+A hit hard-links the artifacts into the new task directory (copy fallback
+across filesystems). The cache is size-bounded with LRU eviction by the
+meta.json mtime, which every hit refreshes.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the render / mix pipeline changes output for the same request
+# (2: HLS playlists are cached with their segments)
+CACHE_VERSION = 2
+
+
+def request_key(params: Dict[str, Any], engine_version: str) -> str:
+    """Hash a normalized generation request into a cache key."""
+    normalized = {
+        "engine": params.get("engine") or "theory_v1",
+        "engine_version": engine_version,
+        "cache_version": CACHE_VERSION,
+        "key": params.get("key", "C"),
+        "bpm": round(float(params.get("bpm", 120.0)), 3),
+        "style": params.get("style", "pop"),
+        "bars": int(params.get("bars", 8)),
+        "seed": params.get("seed"),
+        "stems": bool(params.get("stems", False)),
+        "quality": params.get("quality") or "full",
+        "recording_id": params.get("recording_id"),
+    }
+    blob = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link_tree(src: Path, dst: Path) -> None:
+    dst.mkdir()
+    for child in src.iterdir():
+        _link_or_copy(child, dst / child.name)
+
+
+class ResultCache:
+    """Size-bounded on-disk LRU of generation artifacts."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: str, out_dir: Path) -> Optional[Dict[str, Any]]:
+        """Materialize a cached result into *out_dir*, or return None."""
+        entry = self.root / key
+        meta_path = entry / "meta.json"
+        try:
+            meta = json.loads(meta_path.read_text())
+            out_dir = Path(out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+
+            files: Dict[str, str] = {"task_dir": str(out_dir)}
+            for label, name in meta["files"].items():
+                dst = out_dir / name
+                if not dst.exists():
+                    if "/" in name:   # a playlist: bring its segments along
+                        subdir = name.split("/")[0]
+                        _link_tree(entry / subdir, out_dir / subdir)
+                    else:
+                        _link_or_copy(entry / name, dst)
+                files[label] = str(dst)
+            os.utime(meta_path)   # LRU touch
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        logger.info("ResultCache: hit %s", key[:12])
+        return {**meta["result"], "files": files}
+
+    def store(self, key: str, result: Dict[str, Any]) -> None:
+        """Copy a finished result's artifacts into the cache."""
+        entry = self.root / key
+        if entry.exists():
+            return
+
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            tmp.mkdir()
+            rel_files: Dict[str, str] = {}
+            stored: Dict[Path, str] = {}   # resolved source -> name in the entry
+            for label, path in result.get("files", {}).items():
+                src = Path(path)
+                if not src.is_file():
+                    continue   # e.g. task_dir
+                source = src.resolve()
+                if source in stored:
+                    # Several labels can name one file (stems: main_wav and
+                    # stem_melody); store it once and share the entry
+                    rel_files[label] = stored[source]
+                    continue
+                if src.suffix == ".m3u8":
+                    # The playlist is useless without its init / media segments
+                    _link_tree(src.parent, tmp / src.parent.name)
+                    rel = f"{src.parent.name}/{src.name}"
+                else:
+                    rel = src.name
+                    if (tmp / rel).exists():   # same name, different directory
+                        rel = f"{label}-{src.name}"
+                    _link_or_copy(src, tmp / rel)
+                stored[source] = rel_files[label] = rel
+
+            meta = {
+                "files": rel_files,
+                "result": {k: v for k, v in result.items() if k != "files"},
+            }
+            (tmp / "meta.json").write_text(json.dumps(meta))
+            # Atomic publish; a concurrent store of the same key wins harmlessly
+            os.rename(tmp, entry)
+        except OSError as exc:
+            logger.warning("ResultCache: store %s failed: %s", key[:12], exc)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in self.root.iterdir():
+                meta_path = entry / "meta.json"
+                if entry.name.startswith(".tmp-") or not meta_path.exists():
+                    continue
+                size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+                entries.append((meta_path.stat().st_mtime, size, entry))
+                total += size
+
+            entries.sort()   # oldest first
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                logger.info("ResultCache: evicted %s", entry.name[:12])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "max_bytes": self.max_bytes}
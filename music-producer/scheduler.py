@@ -0,0 +1,158 @@
+"""Generation scheduler with admission control.
+
+Runs at most ``max_concurrent`` generation jobs at a time and keeps at most
+``max_queue`` jobs waiting. When the queue is full ``submit`` raises
+SchedulerFull so the endpoint can answer 429 / Retry-After instead of
+letting FluidSynth renders pile up on the same vCPUs.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class SchedulerFull(Exception):
+    """Raised by GenerationScheduler.submit when the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class GenerationScheduler:
+    """Bounded FIFO of generation jobs served by a fixed number of workers."""
+
+    # Exponential moving average weight for observed job durations
+    _EMA_ALPHA = 0.3
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_queue: int = 8,
+        default_job_seconds: float = 30.0,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.avg_job_seconds = default_job_seconds
+
+        self._pending: Deque[Tuple[str, Job]] = deque()
+        self._running: Dict[str, float] = {}   # task_id -> start time
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: list = []
+        self.completed_total = 0
+        self.rejected_total = 0
+
+    # -- admission --
+
+    def submit(self, task_id: str, job: Job) -> int:
+        """Queue *job* for *task_id*; return its 1-based queue position.
+
+        Must be called from the event loop. Raises SchedulerFull when
+        ``max_queue`` jobs are already waiting.
+        """
+        self._ensure_workers()
+        free_slots = max(0, self.max_concurrent - len(self._running))
+        if len(self._pending) >= self.max_queue + free_slots:
+            self.rejected_total += 1
+            raise SchedulerFull(self.retry_after())
+
+        self._pending.append((task_id, job))
+        asyncio.get_running_loop().create_task(self._notify())
+        return len(self._pending)
+
+    def retry_after(self) -> int:
+        """Seconds until the next queue slot is expected to free up."""
+        slot_wait = self.avg_job_seconds / self.max_concurrent
+        return max(1, int(round(slot_wait)))
+
+    # -- introspection --
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """1-based position of a waiting task, or None if not waiting."""
+        for idx, (tid, _) in enumerate(self._pending):
+            if tid == task_id:
+                return idx + 1
+        return None
+
+    def estimated_start(self, task_id: str) -> Optional[float]:
+        """Unix timestamp at which a waiting task is expected to start."""
+        position = self.queue_position(task_id)
+        if position is None:
+            return None
+
+        now = time.time()
+        # Simulate the slots draining: each slot frees up when its current
+        # job finishes, then takes the next waiting job for avg_job_seconds.
+        slots = [
+            max(0.0, self.avg_job_seconds - (now - started))
+            for started in self._running.values()
+        ]
+        slots += [0.0] * (self.max_concurrent - len(slots))
+        heapq.heapify(slots)
+        for _ in range(position - 1):
+            heapq.heappush(slots, heapq.heappop(slots) + self.avg_job_seconds)
+        return now + slots[0]
+
+    def status_fields(self, task_id: str) -> Dict[str, Any]:
+        """Extra fields merged into /status while a task is still queued."""
+        position = self.queue_position(task_id)
+        if position is None:
+            return {}
+        return {
+            "queue_position": position,
+            "estimated_start_at": self.estimated_start(task_id),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": len(self._running),
+            "queued": len(self._pending),
+            "avg_job_seconds": round(self.avg_job_seconds, 2),
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+        }
+
+    # -- workers --
+
+    def _ensure_workers(self) -> None:
+        if self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Condition()
+        self._workers = [
+            loop.create_task(self._worker(i)) for i in range(self.max_concurrent)
+        ]
+        logger.info("GenerationScheduler: %d worker(s), queue limit %d",
+                    self.max_concurrent, self.max_queue)
+
+    async def _notify(self) -> None:
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    async def _worker(self, idx: int) -> None:
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: bool(self._pending))
+                task_id, job = self._pending.popleft()
+
+            started = time.time()
+            self._running[task_id] = started
+            try:
+                await job()
+            except Exception as exc:
+                logger.error("Generation worker %d: job %s raised: %s", idx, task_id, exc)
+            finally:
+                self._running.pop(task_id, None)
+                elapsed = time.time() - started
+                self.avg_job_seconds = (
+                    (1 - self._EMA_ALPHA) * self.avg_job_seconds + self._EMA_ALPHA * elapsed
+                )
+                self.completed_total += 1
@@ -0,0 +1,91 @@
+"""Time-segmented rendering helpers.
+
+A long track is cut at bar boundaries into segments that can be rendered
+concurrently. Segments partition the notes by onset: every note belongs to
+the segment it starts in and keeps its full length, so a segment's audio
+runs on past the cut with the ringing notes' release tails. Controller and
+pitch-bend state at the cut is carried into the next segment.
+
+Stitching then overlap-adds each segment at its exact sample offset. The
+region past a cut holds the previous segment's tails plus the next
+segment's onsets, i.e. the same sum of voices a single pass would produce,
+so no fade is applied to any note.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+Segment = Tuple[int, object]   # (offset in samples, PrettyMIDI shifted to start at 0)
+
+
+def _carry_state(events, key, shift: float, tail_end: float, make):
+    """Last event per *key* before *shift* (moved to 0), then those up to *tail_end*."""
+    state = {}
+    for ev in sorted(events, key=lambda e: e.time):
+        if ev.time < shift:
+            state[key(ev)] = ev
+    carried = [make(ev, 0.0) for ev in state.values()]
+    carried += [make(ev, ev.time - shift) for ev in events if shift <= ev.time < tail_end]
+    return carried
+
+
+def split_segments(midi, segment_bars: int, sample_rate: int) -> List[Segment]:
+    """
+    Cut *midi* every *segment_bars* bars. Returns [(offset_samples, segment)];
+    a single (0, midi) when the piece is too short to cut or segmenting is off.
+    """
+    import pretty_midi
+
+    if segment_bars <= 0:
+        return [(0, midi)]
+
+    end = midi.get_end_time()
+    downbeats = midi.get_downbeats()
+    cuts = [int(round(t * sample_rate)) for t in downbeats[segment_bars::segment_bars] if t < end]
+    if not cuts:
+        return [(0, midi)]
+
+    _, tempi = midi.get_tempo_changes()
+    tempo = float(tempi[0]) if len(tempi) else 120.0
+
+    segments: List[Segment] = []
+    for index, (start, stop) in enumerate(zip([0] + cuts, cuts + [None])):
+        # Shift by the offset's exact time so event samples land on the same
+        # sample they would in a single pass.
+        shift = start / sample_rate
+        t_stop = stop / sample_rate if stop is not None else float('inf')
+
+        seg = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+        has_notes = False
+        for inst in midi.instruments:
+            # Keep every instrument so channel assignment matches the full track
+            part = pretty_midi.Instrument(program=inst.program, is_drum=inst.is_drum, name=inst.name)
+            notes = [n for n in inst.notes if n.start < t_stop and (index == 0 or n.start >= shift)]
+            if notes:
+                has_notes = True
+                tail_end = max(n.end for n in notes)
+                part.notes = [
+                    pretty_midi.Note(n.velocity, n.pitch, n.start - shift, n.end - shift)
+                    for n in notes
+                ]
+                part.control_changes = _carry_state(
+                    inst.control_changes, lambda c: c.number, shift, tail_end,
+                    lambda c, t: pretty_midi.ControlChange(c.number, c.value, t),
+                )
+                part.pitch_bends = _carry_state(
+                    inst.pitch_bends, lambda b: 0, shift, tail_end,
+                    lambda b, t: pretty_midi.PitchBend(b.pitch, t),
+                )
+            seg.instruments.append(part)
+        if has_notes:
+            segments.append((start, seg))
+    return segments
+
+
+def overlap_add(pieces: List[Tuple[int, np.ndarray]], channels: int = 2) -> np.ndarray:
+    """Sum (offset_samples, (n, channels) audio) pieces into one buffer."""
+    total = max(offset + len(audio) for offset, audio in pieces)
+    out = np.zeros((total, channels), dtype=np.float32)
+    for offset, audio in pieces:
+        out[offset:offset + len(audio)] += audio
+    return out
@@ -0,0 +1,57 @@
+"""Single-flight coalescing of identical in-flight generation requests.
+
+The first request for a normalized key becomes the leader and actually
+runs; identical requests that arrive while it is running attach to it as
+followers and receive the leader's progress and output files instead of
+starting their own render.
+"""
+import threading
+from typing import Dict, List, Optional
+
+
+class SingleFlight:
+    """Tracks one leader task per request key and the followers attached to it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leaders: Dict[str, str] = {}            # key -> leader task_id
+        self._followers: Dict[str, List[str]] = {}    # leader task_id -> follower ids
+        self.coalesced_total = 0
+
+    def join(self, key: str, task_id: str) -> Optional[str]:
+        """Attach *task_id* to the in-flight leader for *key*.
+
+        Returns the leader's task_id, or None when *task_id* has become the
+        leader itself and must run the job.
+        """
+        with self._lock:
+            leader = self._leaders.get(key)
+            if leader is None:
+                self._leaders[key] = task_id
+                self._followers[task_id] = []
+                return None
+            self._followers[leader].append(task_id)
+            self.coalesced_total += 1
+            return leader
+
+    def followers(self, leader_id: str) -> List[str]:
+        with self._lock:
+            return list(self._followers.get(leader_id, ()))
+
+    def finish(self, key: str, leader_id: str) -> List[str]:
+        """Close the flight and return its followers.
+
+        Call before writing the leader's final status: requests arriving
+        afterwards start a new flight instead of joining a finished one.
+        """
+        with self._lock:
+            if self._leaders.get(key) == leader_id:
+                del self._leaders[key]
+            return self._followers.pop(leader_id, [])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._leaders),
+                "coalesced_total": self.coalesced_total,
+            }
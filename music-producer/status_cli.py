@@ -13,19 +13,20 @@ from pathlib import Path
 TASKS_DIR = Path(os.getenv("MUSIC_TASKS_DIR", "/tmp/music_tasks"))
 
 
-def main():
-    try:
-        data = json.loads(sys.stdin.buffer.read())
-        task_id = data.get("task_id", "")
+def get_status(data: dict) -> dict:
+    """Return the status.json of a task, or {"status": "not_found"}."""
+    task_id = data.get("task_id", "")
+    status_path = TASKS_DIR / task_id / "status.json"
 
-        status_path = TASKS_DIR / task_id / "status.json"
+    if not status_path.exists():
+        return {"status": "not_found"}
+    return json.loads(status_path.read_text())
 
-        if not status_path.exists():
-            print(json.dumps({"status": "not_found"}))
-            sys.exit(0)
 
-        status = json.loads(status_path.read_text())
-        print(json.dumps(status))
+def main():
+    try:
+        data = json.loads(sys.stdin.buffer.read())
+        print(json.dumps(get_status(data)))
         sys.exit(0)
 
     except Exception as e:
@@ -0,0 +1,178 @@
+"""Resident FluidSynth synthesizers for in-process MIDI rendering.
+
+The fluidsynth CLI reparses and reloads the whole SoundFont on every call.
+SynthPool instead keeps a few libfluidsynth synthesizers (via pyfluidsynth,
+``import fluidsynth``) with the SoundFont already loaded. A render checks
+one out, resets it, feeds it the MIDI events and pulls the samples straight
+into a NumPy buffer.
+
+Configuration:
+  SYNTH_POOL_SIZE   instances per process (default: min(4, cpu count))
+  RENDER_BACKEND    auto (pool, then CLI, then NumPy synth) | pool | cli | numpy
+
+renderer keeps the CLI path as the fallback whenever pyfluidsynth /
+libfluidsynth is unavailable (see renderer.select_synth).
+"""
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("SYNTH_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "auto")
+
+RELEASE_TAIL_SECONDS = 1.0   # let the last notes ring out
+DRUM_CHANNEL = 9
+DRUM_BANK = 128
+
+# Event kinds, in the order they are applied when they share a sample:
+# setup first, then note-offs before note-ons so repeated pitches retrigger.
+_CC, _BEND, _NOTE_OFF, _NOTE_ON = 0, 1, 2, 3
+
+
+def pyfluidsynth_available() -> bool:
+    """Return True if pyfluidsynth and libfluidsynth can be imported."""
+    try:
+        import fluidsynth  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def _channel_map(instruments) -> List[int]:
+    """Assign a MIDI channel per instrument; drums always get channel 10."""
+    melodic = [c for c in range(16) if c != DRUM_CHANNEL]
+    channels, next_melodic = [], 0
+    for inst in instruments:
+        if inst.is_drum:
+            channels.append(DRUM_CHANNEL)
+        else:
+            channels.append(melodic[next_melodic % len(melodic)])
+            next_melodic += 1
+    return channels
+
+
+def midi_events(midi, sample_rate: int) -> List[Tuple[int, int, int, int, int]]:
+    """Flatten a PrettyMIDI into sorted (sample, kind, channel, a, b) events."""
+    events = []
+    for inst, chan in zip(midi.instruments, _channel_map(midi.instruments)):
+        for cc in inst.control_changes:
+            events.append((round(cc.time * sample_rate), _CC, chan, cc.number, cc.value))
+        for bend in inst.pitch_bends:
+            events.append((round(bend.time * sample_rate), _BEND, chan, bend.pitch, 0))
+        for note in inst.notes:
+            events.append((round(note.start * sample_rate), _NOTE_ON, chan, note.pitch, note.velocity))
+            events.append((round(note.end * sample_rate), _NOTE_OFF, chan, note.pitch, 0))
+    events.sort()
+    return events
+
+
+class SynthPool:
+    """A fixed set of fluidsynth.Synth instances sharing one SoundFont file."""
+
+    def __init__(self, soundfont: str, size: int = POOL_SIZE, sample_rate: int = 44100):
+        import fluidsynth
+
+        self.soundfont = soundfont
+        self.size = size
+        self.sample_rate = sample_rate
+        self._idle: "queue.Queue[Tuple[object, int]]" = queue.Queue()
+        for _ in range(size):
+            synth = fluidsynth.Synth(samplerate=float(sample_rate))
+            sfid = synth.sfload(soundfont)
+            if sfid < 0:
+                raise RuntimeError(f"fluidsynth could not load SoundFont {soundfont}")
+            self._idle.put((synth, sfid))
+        self.renders = 0
+        logger.info("SynthPool: %d synth(s) loaded %s @ %d Hz", size, soundfont, sample_rate)
+
+    @contextmanager
+    def checkout(self) -> Iterator[Tuple[object, int]]:
+        """Borrow an idle (synth, sfid), reset to a clean state."""
+        synth, sfid = self._idle.get()
+        try:
+            synth.system_reset()
+            yield synth, sfid
+        finally:
+            self._idle.put((synth, sfid))
+
+    def render(self, midi) -> np.ndarray:
+        """Render a PrettyMIDI to a float32 (n_samples, 2) buffer in [-1, 1]."""
+        with self.checkout() as (synth, sfid):
+            for inst, chan in zip(midi.instruments, _channel_map(midi.instruments)):
+                bank = DRUM_BANK if inst.is_drum else 0
+                synth.program_select(chan, sfid, bank, 0 if inst.is_drum else inst.program)
+
+            chunks: List[np.ndarray] = []
+            cursor = 0
+            for sample, kind, chan, a, b in midi_events(midi, self.sample_rate):
+                if sample > cursor:
+                    chunks.append(synth.get_samples(sample - cursor))
+                    cursor = sample
+                if kind == _NOTE_ON:
+                    synth.noteon(chan, a, b)
+                elif kind == _NOTE_OFF:
+                    synth.noteoff(chan, a)
+                elif kind == _CC:
+                    synth.cc(chan, a, b)
+                else:
+                    synth.pitch_bend(chan, a)
+            chunks.append(synth.get_samples(int(RELEASE_TAIL_SECONDS * self.sample_rate)))
+
+        self.renders += 1
+        # get_samples returns interleaved stereo int16
+        pcm = np.concatenate(chunks).reshape(-1, 2)
+        return pcm.astype(np.float32) / 32768.0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "renders": self.renders,
+            "sample_rate": self.sample_rate,
+        }
+
+
+# -- process-wide pools, one per (soundfont, sample rate) --
+
+_pools: Dict[Tuple[str, int], SynthPool] = {}
+_pools_lock = threading.Lock()
+_pool_unavailable = False
+
+
+def get_pool(soundfont: str, sample_rate: int = 44100) -> Optional[SynthPool]:
+    """Return the shared pool for *soundfont*, creating it on first use.
+
+    Returns None when the pool backend is disabled or cannot be created, in
+    which case callers fall back to the fluidsynth CLI.
+    """
+    global _pool_unavailable
+    if RENDER_BACKEND == "cli" or _pool_unavailable:
+        return None
+
+    key = (os.path.abspath(soundfont), sample_rate)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+        if not pyfluidsynth_available():
+            logger.info("SynthPool: pyfluidsynth not available, using fluidsynth CLI")
+            _pool_unavailable = True
+            return None
+        try:
+            pool = _pools[key] = SynthPool(soundfont, POOL_SIZE, sample_rate)
+        except Exception as exc:
+            logger.warning("SynthPool: init failed (%s), using fluidsynth CLI", exc)
+            return None
+        return pool
+
+
+def pool_stats() -> List[Dict[str, object]]:
+    with _pools_lock:
+        return [{"soundfont": sf, **p.stats()} for (sf, _), p in _pools.items()]
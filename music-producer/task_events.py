@@ -0,0 +1,114 @@
+"""In-process fan-out of task updates to live subscribers.
+
+Every write the sidecar makes to a task record is published here; the
+/status/{task_id}/events (SSE) and /status/{task_id}/ws (WebSocket)
+endpoints subscribe and turn the raw updates into events:
+
+    status    -- snapshot of the record when the stream opens
+    progress  -- {"progress": pct, "status": ...}
+    log       -- one new ProductionLog step
+    preview   -- {"files": {...}} once a preview-quality draft is playable
+    complete  -- final record (status completed / failed); stream ends
+
+Updates arrive from worker / relay threads, so publish() hands them to
+each subscriber's event loop with call_soon_threadsafe.
+"""
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from task_store import TERMINAL_STATUSES
+
+_Subscriber = Tuple[asyncio.AbstractEventLoop, asyncio.Queue]
+
+
+class TaskEventHub:
+    """Per-task subscriber lists fed by publish()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[_Subscriber]] = {}
+        self.published = 0
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """Register a queue on the running loop that receives *task_id*'s updates."""
+        sub = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(sub)
+        return sub[1]
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subs = [s for s in self._subscribers.get(task_id, []) if s[1] is not queue]
+            if subs:
+                self._subscribers[task_id] = subs
+            else:
+                self._subscribers.pop(task_id, None)
+
+    def publish(self, task_id: str, data: dict) -> None:
+        """Deliver an update to every subscriber of *task_id*; thread-safe."""
+        with self._lock:
+            subs = list(self._subscribers.get(task_id, ()))
+        if not subs:
+            return
+        self.published += 1
+        for loop, queue in subs:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, dict(data))
+            except RuntimeError:
+                pass   # subscriber's loop already closed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published,
+            }
+
+
+async def task_events(
+    hub: TaskEventHub,
+    task_id: str,
+    get_task: Callable[[str], Optional[dict]],
+    keepalive_seconds: float = 15.0,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield (event, data) pairs for one task until it completes.
+
+    Yields ("keepalive", None) when nothing happened for *keepalive_seconds*.
+    Raises KeyError when the task does not exist.
+    """
+    # Subscribe before reading the snapshot so no update falls in between
+    queue = hub.subscribe(task_id)
+    try:
+        task = await asyncio.to_thread(get_task, task_id)
+        if task is None:
+            raise KeyError(task_id)
+
+        yield "status", task
+        sent_steps = len(task.get("production_log") or [])
+        progress = task.get("progress")
+
+        while task.get("status") not in TERMINAL_STATUSES:
+            try:
+                update = await asyncio.wait_for(queue.get(), keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield "keepalive", None
+                continue
+
+            task = {**task, **update}
+            log = update.get("production_log")
+            if log is not None:
+                for step in log[sent_steps:]:
+                    yield "log", step
+                sent_steps = max(sent_steps, len(log))
+            if task.get("status") in TERMINAL_STATUSES:
+                break
+            if update.get("preview_ready"):
+                yield "preview", {"files": task.get("files", {})}
+            if update.get("progress", progress) != progress or "status" in update:
+                progress = task.get("progress")
+                yield "progress", {"progress": progress, "status": task.get("status")}
+
+        yield "complete", task
+    finally:
+        hub.unsubscribe(task_id, queue)
@@ -0,0 +1,343 @@
+"""Task store for the sidecar: backends plus a debouncing writer.
+
+InMemoryTaskBackend  -- local dev / tests
+FirestoreTaskBackend -- Cloud Run (collection "music_tasks")
+BufferedTaskWriter   -- wraps either backend behind the set / update / get
+                        interface main.py uses. Progress updates are
+                        coalesced per task within a window, production_log
+                        is sent as appended steps only, pending writes for
+                        all tasks go out as one batch, and terminal states
+                        (completed / failed) are flushed immediately.
+                        A failed batch is retried task by task, so one bad
+                        document cannot hold back the others.
+StatusCache          -- read-through cache of backend documents for /status
+                        polling: short TTL while a task runs, long TTL once
+                        it is terminal; the writer invalidates it on its
+                        own writes.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class TaskMissing(Exception):
+    """Raised by a backend's write_batch when a task document does not exist."""
+
+
+@dataclass
+class TaskWrite:
+    task_id: str
+    fields: Dict[str, Any]                                     # plain overwrites
+    appended_log: List[dict] = field(default_factory=list)     # production_log delta
+
+
+# -- Backends --
+
+class InMemoryTaskBackend:
+    """Process-local dict store."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._mem: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def set(self, task_id: str, data: dict) -> None:
+        with self._lock:
+            self._mem[task_id] = dict(data)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            doc = self._mem.get(task_id)
+            return dict(doc) if doc is not None else None
+
+    def write_batch(self, writes: List[TaskWrite]) -> None:
+        with self._lock:
+            for w in writes:
+                doc = self._mem.get(w.task_id)
+                if doc is None:
+                    continue
+                doc.update(w.fields)
+                if w.appended_log:
+                    doc["production_log"] = list(doc.get("production_log", [])) + w.appended_log
+
+
+class FirestoreTaskBackend:
+    """Firestore documents, one per task."""
+
+    name = "firestore"
+
+    def __init__(self, project_id: str, collection: str = "music_tasks"):
+        from google.api_core import exceptions
+        from google.cloud import firestore
+        self._not_found = exceptions.NotFound
+        self._firestore = firestore
+        self._db = firestore.Client(project=project_id)
+        self._collection = collection
+
+    def _doc(self, task_id: str):
+        return self._db.collection(self._collection).document(task_id)
+
+    def set(self, task_id: str, data: dict) -> None:
+        self._doc(task_id).set(data)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        doc = self._doc(task_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def write_batch(self, writes: List[TaskWrite]) -> None:
+        batch = self._db.batch()
+        for w in writes:
+            fields = dict(w.fields)
+            if w.appended_log:
+                # Log steps are distinct dicts, so ArrayUnion's de-duplication
+                # does not drop anything; it appends without resending the list.
+                fields["production_log"] = self._firestore.ArrayUnion(w.appended_log)
+            batch.update(self._doc(w.task_id), fields)
+        try:
+            batch.commit()
+        except self._not_found as exc:
+            raise TaskMissing(str(exc)) from exc
+
+
+# -- Status cache --
+
+class StatusCache:
+    """TTL cache of task documents as stored in the backend.
+
+    Running tasks expire after ``running_ttl`` seconds so updates written by
+    other sidecar instances show up quickly; completed / failed documents no
+    longer change and live for ``terminal_ttl``. Bounded to ``max_entries``
+    with LRU eviction. ``running_ttl == 0`` disables the cache.
+    """
+
+    def __init__(self, running_ttl: float = 1.0, terminal_ttl: float = 300.0,
+                 max_entries: int = 4096):
+        self.running_ttl = running_ttl
+        self.terminal_ttl = terminal_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()   # task_id -> (expires, doc)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.running_ttl > 0
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, task_id: str, doc: dict) -> None:
+        terminal = doc.get("status") in TERMINAL_STATUSES
+        expires = time.monotonic() + (self.terminal_ttl if terminal else self.running_ttl)
+        with self._lock:
+            self._entries[task_id] = (expires, dict(doc))
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, task_id: str) -> None:
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "running_ttl": self.running_ttl,
+                "terminal_ttl": self.terminal_ttl,
+            }
+
+
+# -- Buffered writer --
+
+class BufferedTaskWriter:
+    """Debounced, delta-based writer in front of a task backend.
+
+    With ``window_seconds == 0`` every update is written through at once.
+    Reads go through *cache* (a StatusCache) when one is given. A write that
+    keeps failing is retried with later flushes up to ``max_retries`` times;
+    a write for a task the backend does not have is dropped at once.
+    """
+
+    def __init__(self, backend, window_seconds: float = 0.5,
+                 cache: Optional[StatusCache] = None, max_retries: int = 5):
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self.max_retries = max_retries
+        self.cache = cache if cache is not None and cache.enabled else None
+
+        self._state_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, dict] = {}        # task_id -> merged fields
+        self._writing: Dict[str, dict] = {}        # snapshot being flushed
+        self._flushed_log: Dict[str, int] = {}     # task_id -> steps persisted
+        self._failures: Dict[str, int] = {}        # task_id -> failed attempts in a row
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.writes_requested = 0
+        self.batches_committed = 0
+        self.writes_dropped = 0
+
+        self._thread: Optional[threading.Thread] = None
+        if window_seconds > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="task-store-writer", daemon=True,
+            )
+            self._thread.start()
+
+    # -- set / update / get (the _task_* interface) --
+
+    def set(self, task_id: str, data: dict) -> None:
+        """Create or replace a task record; always written through."""
+        with self._flush_lock:
+            with self._state_lock:
+                self._pending.pop(task_id, None)
+                self._flushed_log[task_id] = len(data.get("production_log", []))
+            self.backend.set(task_id, data)
+            if self.cache:
+                self.cache.put(task_id, data)
+
+    def update(self, task_id: str, data: dict) -> None:
+        with self._state_lock:
+            self.writes_requested += 1
+            self._pending.setdefault(task_id, {}).update(data)
+        if self.window_seconds <= 0 or data.get("status") in TERMINAL_STATUSES:
+            self.flush([task_id])
+        else:
+            self._wakeup.set()
+
+    def get(self, task_id: str) -> Optional[dict]:
+        doc = self.cache.get(task_id) if self.cache else None
+        if doc is None:
+            doc = self.backend.get(task_id)
+            if doc is not None and self.cache:
+                self.cache.put(task_id, doc)
+        with self._state_lock:
+            overlay = {**self._writing.get(task_id, {}), **self._pending.get(task_id, {})}
+        if doc is None:
+            return None
+        return {**doc, **overlay} if overlay else doc
+
+    # -- flushing --
+
+    def flush(self, task_ids: Optional[List[str]] = None) -> None:
+        """Write pending updates (all tasks, or just *task_ids*) in one batch."""
+        with self._flush_lock:
+            with self._state_lock:
+                ids = list(self._pending) if task_ids is None else [
+                    t for t in task_ids if t in self._pending
+                ]
+                if not ids:
+                    return
+                self._writing = {t: self._pending.pop(t) for t in ids}
+                writes = [self._to_write(t, fields) for t, fields in self._writing.items()]
+
+            failed = self._write(writes)
+
+            retry = False
+            with self._state_lock:
+                for t, fields in self._writing.items():
+                    if self.cache:
+                        self.cache.invalidate(t)
+                    exc = failed.get(t)
+                    if exc is None:
+                        self._failures.pop(t, None)
+                        if fields.get("status") in TERMINAL_STATUSES:
+                            self._flushed_log.pop(t, None)
+                        elif "production_log" in fields:
+                            self._flushed_log[t] = len(fields["production_log"])
+                        continue
+
+                    attempts = self._failures[t] = self._failures.get(t, 0) + 1
+                    if isinstance(exc, TaskMissing) or attempts > self.max_retries:
+                        logger.error("Task store: dropping update of %s after %d attempt(s): %s",
+                                     t, attempts, exc)
+                        self._failures.pop(t, None)
+                        if isinstance(exc, TaskMissing):
+                            self._flushed_log.pop(t, None)
+                        self.writes_dropped += 1
+                    else:
+                        # Retry with the next flush; newer pending values win
+                        self._pending[t] = {**fields, **self._pending.get(t, {})}
+                        retry = True
+                self._writing = {}
+        if retry:
+            self._wakeup.set()
+
+    def _write(self, writes: List[TaskWrite]) -> Dict[str, Exception]:
+        """Write *writes* as one batch, else one by one; return the failures."""
+        try:
+            self.backend.write_batch(writes)
+            self.batches_committed += 1
+            return {}
+        except Exception as exc:
+            if len(writes) == 1:
+                logger.warning("Task store write of %s failed: %s", writes[0].task_id, exc)
+                return {writes[0].task_id: exc}
+            logger.warning("Task store batch of %d write(s) failed (%s); writing them one by one",
+                           len(writes), exc)
+
+        failed: Dict[str, Exception] = {}
+        for w in writes:
+            try:
+                self.backend.write_batch([w])
+                self.batches_committed += 1
+            except Exception as exc:
+                logger.warning("Task store write of %s failed: %s", w.task_id, exc)
+                failed[w.task_id] = exc
+        return failed
+
+    def _to_write(self, task_id: str, fields: dict) -> TaskWrite:
+        """Turn merged fields into a TaskWrite, sending only new log steps."""
+        fields = dict(fields)
+        log = fields.get("production_log")
+        sent = self._flushed_log.get(task_id, 0)
+        if log is None or len(log) < sent:
+            return TaskWrite(task_id, fields)   # no log, or it shrank: overwrite
+
+        # Callers always pass the full, append-only log
+        del fields["production_log"]
+        return TaskWrite(task_id, fields, appended_log=list(log[sent:]))
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                break
+            # Let more updates arrive and merge before writing
+            time.sleep(self.window_seconds)
+            self.flush()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "window_seconds": self.window_seconds,
+            "writes_requested": self.writes_requested,
+            "batches_committed": self.batches_committed,
+            "writes_dropped": self.writes_dropped,
+            "status_cache": self.cache.stats() if self.cache else None,
+        }
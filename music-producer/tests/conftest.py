@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The sidecar modules live at the top level of music-producer/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,60 @@
+from result_cache import ResultCache
+
+
+def _write(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_stems_result_with_shared_file_is_cached(tmp_path):
+    task = tmp_path / "task1"
+    melody = _write(task / "stems" / "melody.wav", b"melody")
+    files = {
+        "task_dir": str(task),
+        "main_wav": melody,
+        "stem_melody": melody,
+        "stem_drums": _write(task / "stems" / "drums.wav", b"drums"),
+        "mp3": _write(task / "output.mp3", b"mp3"),
+    }
+    cache = ResultCache(tmp_path / "cache", 10 ** 6)
+    cache.store("k", {"status": "completed", "files": files})
+
+    hit = cache.lookup("k", tmp_path / "task2")
+    assert hit is not None
+    assert hit["files"]["main_wav"] == hit["files"]["stem_melody"]
+    with open(hit["files"]["main_wav"], "rb") as f:
+        assert f.read() == b"melody"
+    with open(hit["files"]["stem_drums"], "rb") as f:
+        assert f.read() == b"drums"
+
+
+def test_same_name_in_different_directories(tmp_path):
+    task = tmp_path / "task1"
+    files = {
+        "main_wav": _write(task / "melody.wav", b"main"),
+        "stem_melody": _write(task / "stems" / "melody.wav", b"stem"),
+    }
+    cache = ResultCache(tmp_path / "cache", 10 ** 6)
+    cache.store("k", {"files": files})
+
+    hit = cache.lookup("k", tmp_path / "task2")
+    assert hit is not None
+    with open(hit["files"]["main_wav"], "rb") as f:
+        assert f.read() == b"main"
+    with open(hit["files"]["stem_melody"], "rb") as f:
+        assert f.read() == b"stem"
+
+
+def test_hls_playlist_is_cached_with_segments(tmp_path):
+    task = tmp_path / "task1"
+    for name in ("init.mp4", "seg_00000.m4s", "playlist.m3u8"):
+        _write(task / "hls" / name)
+    cache = ResultCache(tmp_path / "cache", 10 ** 6)
+    cache.store("k", {"files": {"hls": str(task / "hls" / "playlist.m3u8")}})
+
+    hit = cache.lookup("k", tmp_path / "task2")
+    assert hit is not None
+    assert sorted(p.name for p in (tmp_path / "task2" / "hls").iterdir()) == [
+        "init.mp4", "playlist.m3u8", "seg_00000.m4s",
+    ]
@@ -0,0 +1,87 @@
+import time
+
+from task_store import BufferedTaskWriter, InMemoryTaskBackend, TaskMissing
+
+
+class FlakyBackend(InMemoryTaskBackend):
+    """Fails any batch that touches a task in ``fail`` (task_id -> exception)."""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = {}
+        self.batches = []
+
+    def write_batch(self, writes):
+        self.batches.append([w.task_id for w in writes])
+        for w in writes:
+            if w.task_id in self.fail:
+                raise self.fail[w.task_id]
+        super().write_batch(writes)
+
+
+def _writer(backend, **kwargs):
+    writer = BufferedTaskWriter(backend, window_seconds=60, **kwargs)   # flushed by hand
+    for task_id in ("a", "b", "c"):
+        writer.set(task_id, {"status": "processing", "progress": 0})
+    return writer
+
+
+def test_one_failing_task_does_not_block_the_others():
+    backend = FlakyBackend()
+    writer = _writer(backend)
+    backend.fail["b"] = RuntimeError("backend down for b")
+    for task_id in ("a", "b", "c"):
+        writer.update(task_id, {"progress": 50})
+
+    writer.flush()
+
+    assert backend.get("a")["progress"] == 50
+    assert backend.get("c")["progress"] == 50
+    assert backend.get("b")["progress"] == 0
+    assert writer.get("b")["progress"] == 50     # still pending, retried later
+
+
+def test_missing_task_is_dropped_not_retried():
+    backend = FlakyBackend()
+    writer = _writer(backend)
+    backend.fail["b"] = TaskMissing("no document b")
+    writer.update("a", {"progress": 10})
+    writer.update("b", {"progress": 10})
+    writer.flush()
+
+    backend.batches.clear()
+    writer.update("a", {"status": "completed", "progress": 100})   # flushed at once
+
+    assert backend.batches == [["a"]]
+    assert backend.get("a")["status"] == "completed"
+    assert writer.writes_dropped == 1
+
+
+def test_retries_are_capped():
+    backend = FlakyBackend()
+    writer = _writer(backend, max_retries=2)
+    backend.fail["b"] = RuntimeError("still failing")
+    writer.update("b", {"progress": 10})
+
+    for _ in range(5):
+        writer.flush()
+
+    assert sum(batch == ["b"] for batch in backend.batches) == 3   # first try + 2 retries
+    assert writer.writes_dropped == 1
+
+
+def test_failed_write_is_retried_without_another_update():
+    backend = FlakyBackend()
+    writer = BufferedTaskWriter(backend, window_seconds=0.05, max_retries=100)
+    writer.set("a", {"status": "processing", "progress": 0})
+    backend.fail["a"] = RuntimeError("transient")
+    writer.update("a", {"progress": 40})
+
+    time.sleep(0.2)                  # at least one failed attempt
+    del backend.fail["a"]
+    deadline = time.monotonic() + 2
+    while backend.get("a")["progress"] != 40 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    writer.close()
+
+    assert backend.get("a")["progress"] == 40
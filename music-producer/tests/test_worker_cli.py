@@ -0,0 +1,30 @@
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import worker_cli
+
+
+def test_serve_stream_returns_after_all_responses(monkeypatch):
+    monkeypatch.setitem(worker_cli.OPS, "slow", lambda data: time.sleep(0.2) or {"n": data["n"]})
+    requests = b"".join(
+        (json.dumps({"id": str(n), "op": "slow", "n": n}) + "\n").encode() for n in range(3)
+    )
+    writer = io.BytesIO()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        worker_cli.serve_stream(io.BytesIO(requests), writer, pool)
+        # The transport closes its output as soon as serve_stream returns
+        responses = [json.loads(line) for line in writer.getvalue().decode().splitlines()]
+
+    assert sorted(r["id"] for r in responses) == ["0", "1", "2"]
+    assert all(r["ok"] for r in responses)
+
+
+def test_download_rejects_stream_mode():
+    response = worker_cli.handle_line(json.dumps(
+        {"id": "d", "op": "download", "task_id": "t", "type": "mp3", "mode": "stream"}
+    ))
+    assert not response["ok"]
+    assert "path" in response["error"]
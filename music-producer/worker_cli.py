@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""worker_cli.py - Long-lived worker daemon for the .NET backend.
+
+Replaces one python3 spawn per call (analyze_cli / generate_cli / status_cli /
+download_cli / engines_cli) with a single process that keeps numpy, librosa
+and pretty_midi loaded.
+
+Protocol: newline-delimited JSON, one request / response per line.
+  request:  { "id": "<req id>", "op": "analyze|generate|status|download|engines", ...payload }
+  response: { "id": "<req id>", "ok": true,  "result": {...} }
+            { "id": "<req id>", "ok": false, "error": "<message>" }
+
+Requests run concurrently, so responses may come back out of order; the
+caller matches them by id.
+
+download supports "mode": "path" (artifact path, size and sha256; the
+caller streams the file itself) and the legacy base64 mode. "stream" is
+rejected: raw bytes cannot travel on the line protocol, and base64 would
+hold the whole file in memory. Use path mode.
+
+Transport:
+  python3 worker_cli.py                   # stdin / stdout (default)
+  python3 worker_cli.py --socket PATH     # Unix socket, one stream per client
+stderr: logging (ignored by .NET)
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Set
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+logger = logging.getLogger("worker_cli")
+
+WORKER_THREADS = int(os.getenv("MUSIC_WORKER_THREADS", "4"))
+
+
+# -- Operations --
+
+def _op_analyze(data: dict) -> Any:
+    from analyze_cli import analyze
+    return analyze(data)
+
+
+def _op_generate(data: dict) -> Any:
+    from generate_cli import start_generation
+    # The daemon outlives the job, so there is no need to join the thread
+    task_id, _ = start_generation(data)
+    return {"task_id": task_id}
+
+
+def _op_status(data: dict) -> Any:
+    from status_cli import get_status
+    return get_status(data)
+
+
+def _op_download(data: dict) -> Any:
+    from download_cli import download
+    if data.get("mode") == "stream":
+        raise ValueError('download mode "stream" is not supported by the worker daemon; use "path" mode')
+    return download(data)
+
+
+def _op_engines(data: dict) -> Any:
+    from engines_cli import list_engines
+    return list_engines()
+
+
+OPS: Dict[str, Callable[[dict], Any]] = {
+    "analyze": _op_analyze,
+    "generate": _op_generate,
+    "status": _op_status,
+    "download": _op_download,
+    "engines": _op_engines,
+}
+
+
+def warm_up() -> None:
+    """Import the heavy modules once so the first request is fast."""
+    import numpy            # noqa: F401
+    import librosa          # noqa: F401
+    import pretty_midi      # noqa: F401
+    import audio_analyzer   # noqa: F401
+    import production_team  # noqa: F401
+    import analyze_cli, download_cli, engines_cli, generate_cli, status_cli  # noqa: F401,E401
+    logger.info("worker_cli: modules loaded")
+
+
+def handle_line(line: str) -> dict:
+    """Run one request line and build its response; never raises."""
+    req_id = None
+    try:
+        request = json.loads(line)
+        req_id = request.get("id")
+        op = OPS.get(request.get("op", ""))
+        if op is None:
+            return {"id": req_id, "ok": False, "error": f"Unknown op: {request.get('op')}"}
+        return {"id": req_id, "ok": True, "result": op(request)}
+    except Exception as e:
+        logger.warning("Request %s failed: %s", req_id, e)
+        return {"id": req_id, "ok": False, "error": str(e)}
+
+
+def serve_stream(reader, writer, pool: ThreadPoolExecutor) -> None:
+    """Read request lines from *reader* and write responses to *writer*.
+
+    Returns once the reader is at EOF and every response has been written,
+    so a client that half-closes after its last request still gets them all.
+    """
+    write_lock = threading.Lock()
+    in_flight: Set[Future] = set()
+    in_flight_lock = threading.Lock()
+
+    def respond(line: str) -> None:
+        response = json.dumps(handle_line(line)) + "\n"
+        try:
+            with write_lock:
+                writer.write(response.encode("utf-8"))
+                writer.flush()
+        except Exception as e:
+            logger.warning("Could not write response: %s", e)
+
+    def done(future: Future) -> None:
+        with in_flight_lock:
+            in_flight.discard(future)
+
+    for raw in reader:
+        line = raw.decode("utf-8").strip()
+        if line:
+            future = pool.submit(respond, line)
+            with in_flight_lock:
+                in_flight.add(future)
+            future.add_done_callback(done)
+
+    with in_flight_lock:
+        pending = set(in_flight)
+    wait(pending)
+
+
+# -- Transports --
+
+def serve_stdio(pool: ThreadPoolExecutor) -> None:
+    logger.info("worker_cli: serving on stdin/stdout")
+    protocol_out = sys.stdout.buffer
+    # Stray print() calls from libraries must not corrupt the protocol stream
+    sys.stdout = sys.stderr
+    serve_stream(sys.stdin.buffer, protocol_out, pool)
+
+
+def serve_socket(path: str, pool: ThreadPoolExecutor) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_stream(self.rfile, self.wfile, pool)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        logger.info("worker_cli: serving on unix socket %s", path)
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", help="listen on a Unix socket instead of stdin/stdout")
+    args = parser.parse_args()
+
+    warm_up()
+    pool = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="worker")
+    try:
+        if args.socket:
+            serve_socket(args.socket, pool)
+        else:
+            serve_stdio(pool)
+    finally:
+        # stdin closed: finish in-flight requests, then exit
+        pool.shutdown(wait=True)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()